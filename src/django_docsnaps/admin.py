@@ -1,66 +1,348 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-from . import models
-
-model_list = ['Company', 'Language']
-for model in model_list:
-    if hasattr(models, model):
-        admin.site.register(getattr(models, model))
+from . import caches, diff, models, paginators, settings
 
 
 class DocumentAdmin(admin.ModelAdmin):
 
-    list_display = ('service_name', 'name')
+    list_display = ('name', 'module')
+    list_filter = ('module',)
+    ordering = ('name',)
+    search_fields = ('name', 'module')
+
+
+class DocumentsLanguagesChangeList(ChangeList):
+    """
+    A changelist that loads only the displayed columns of jobs.
 
-    def service_name(self, model):
-        return model.service_id.name
-    service_name.short_description = 'service'
+    """
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+        return super().get_queryset(request).only(
+            'documents_languages_id',
+            'url',
+            'is_enabled',
+            'checked_datetime',
+            'document_id__name',
+            'language_id__name')
 
 
 class DocumentsLanguagesAdmin(admin.ModelAdmin):
+    """
+    Snapshot job admin with bulk enabling and disabling of jobs.
+
+    Each job's snapshot count and last changed datetime are computed by
+    correlated subqueries in the changelist's single query. Both are served by
+    the snapshot table's unique index on the job and datetime, and only for the
+    jobs on the page, so the snapshot table is never grouped as a whole. The
+    last checked datetime is recorded on the job by the run.
+
+    Actions update every selected job in a single query rather than saving
+    each job. Documents are chosen by autocompletion rather than from a select
+    of every document.
+
+    """
 
-    list_display = ('service_name', 'document_name', 'language_name')
+    actions = ('disable_jobs', 'enable_jobs')
+    autocomplete_fields = ('document_id',)
+    list_display = ('document_name', 'language_name', 'url', 'is_enabled',
+        'snapshot_count', 'last_changed', 'checked_datetime')
+    list_filter = ('is_enabled', 'language_id')
+    list_select_related = ('document_id', 'language_id')
+    ordering = ('document_id__name', 'language_id__name')
+    paginator = paginators.EstimatedCountPaginator
+    search_fields = ('document_id__name', 'url')
+    show_full_result_count = False
+
+    def disable_jobs(self, request, queryset):
+        self._update_jobs(request, queryset, False)
+    disable_jobs.short_description = 'Disable selected document instances'
 
     def document_name(self, model):
         return model.document_id.name
+    document_name.admin_order_field = 'document_id__name'
     document_name.short_description = 'document'
 
+    def enable_jobs(self, request, queryset):
+        self._update_jobs(request, queryset, True)
+    enable_jobs.short_description = 'Enable selected document instances'
+
     def language_name(self, model):
         return model.language_id.name
+    language_name.admin_order_field = 'language_id__name'
     language_name.short_description = 'language'
 
-    def service_name(self, model):
-        return model.document_id.service_id.name
-    service_name.short_description = 'service'
+    def last_changed(self, model):
+        return model.last_changed
+    last_changed.admin_order_field = 'last_changed'
+    last_changed.short_description = 'last changed'
+
+    def snapshot_count(self, model):
+        return model.snapshot_count
+    snapshot_count.admin_order_field = 'snapshot_count'
+    snapshot_count.short_description = 'snapshots'
+
+    def _update_jobs(self, request, queryset, is_enabled):
+        job_count = queryset.update(is_enabled=is_enabled)
+        self.message_user(
+            request,
+            '{!s} document instances {!s}.'.format(
+                job_count,
+                'enabled' if is_enabled else 'disabled'))
+
+    def get_changelist(self, request, **kwargs):
+        return DocumentsLanguagesChangeList
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+        snapshot_set = models.Snapshot.objects\
+            .filter(documents_languages_id=OuterRef('pk'))\
+            .order_by()
+        return super().get_queryset(request).annotate(
+            last_changed=Subquery(
+                snapshot_set.order_by('-datetime').values('datetime')[:1]),
+            snapshot_count=Coalesce(
+                Subquery(
+                    snapshot_set\
+                        .values('documents_languages_id')\
+                        .annotate(count=Count('*'))\
+                        .values('count'),
+                    output_field=IntegerField()),
+                0))
+
 
+class LanguageAdmin(admin.ModelAdmin):
 
-class ServiceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'code_iso_639_1')
+    ordering = ('name',)
+    search_fields = ('name', 'code_iso_639_1')
 
-    list_display = ('company_name', 'name')
 
-    def company_name(self, model):
-        return model.company_id.name
-    company_name.short_description = 'company'
+class JobListFilter(admin.SimpleListFilter):
+    """
+    A filter of snapshots by a job ID typed into a text input.
+
+    Unlike a filter on a related field, it neither queries nor renders a link
+    for every job or document.
+
+    """
+
+    parameter_name = 'job'
+    template = 'admin/django_docsnaps/snapshot/job_filter.html'
+    title = 'job ID'
+
+    def choices(self, changelist):
+        yield {
+            'hidden_params': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)],
+            'value': self.value() or ''}
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        try:
+            job_id = int(self.value())
+        except (TypeError, ValueError):
+            return queryset
+        return queryset.filter(documents_languages_id=job_id)
+
+
+class SnapshotChangeList(ChangeList):
+    """
+    A changelist that never loads snapshot texts.
+
+    """
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+        return super().get_queryset(request).defer('text', 'hunks')
 
 
 class SnapshotAdmin(admin.ModelAdmin):
+    """
+    Snapshot admin with a view of the differences between two snapshots.
+
+    The snapshot table grows without bound so every changelist query must be
+    served by an index and must not load texts. Texts are deferred, rows are
+    counted by the database's estimate or up to a limit rather than exactly,
+    and the filters use the indexed datetime and job columns. Jobs are filtered
+    by a typed ID and foreign keys are edited by ID rather than with a link or
+    select for every related row.
 
-    list_display = ('service_name', 'document_name', 'language_name',
-        'date_iso', 'time_iso')
+    Computed differences are cached, keyed by the pair of snapshot IDs, so
+    that paging back and forth through a job's history neither recomputes
+    differences nor reloads snapshot texts. Only the rows near changed lines
+    are cached, not the texts.
+
+    """
+
+    diff_cache = caches.get_cache(
+        settings.DJANGO_DOCSNAPS_DIFF_CACHE,
+        max_entries=256,
+        max_cost=settings.DJANGO_DOCSNAPS_DIFF_CACHE_SIZE,
+        timeout=settings.DJANGO_DOCSNAPS_DIFF_CACHE_TIMEOUT,
+        get_cost=lambda rows: sum(
+            len(row.old_text or '') + len(row.new_text or '')
+            for row in rows))
+    diff_modes = ('side-by-side', 'unified')
+    list_display = ('document_name', 'language_name', 'date_iso', 'time_iso',
+        'diff_link')
+    list_filter = (
+        ('datetime', admin.DateFieldListFilter),
+        JobListFilter)
+    list_select_related = (
+        'documents_languages_id__document_id',
+        'documents_languages_id__language_id')
+    ordering = ('-datetime',)
+    paginator = paginators.EstimatedCountPaginator
+    raw_id_fields = ('documents_languages_id', 'change_cluster_id')
+    show_full_result_count = False
 
     def date_iso(self, model):
         return model.date.isoformat()
     date_iso.short_description = 'date'
 
+    def diff_link(self, model):
+        return format_html(
+            '<a href="{}">diff</a>',
+            reverse(
+                'admin:django_docsnaps_snapshot_diff',
+                args=(model.snapshot_id,)))
+    diff_link.short_description = 'changes'
+
+    def diff_view(self, request, snapshot_id):
+        """
+        Show the differences between a snapshot and another of the same job.
+
+        The other snapshot is given by the "against" query parameter and
+        defaults to the job's previous snapshot, against which the snapshot's
+        stored hunks were computed. The "mode" query parameter selects a
+        side-by-side or unified rendering of the same rows.
+
+        """
+        snapshot_set = models.Snapshot.objects\
+            .defer('text')\
+            .select_related('documents_languages_id__document_id')
+        snapshot = get_object_or_404(snapshot_set, pk=snapshot_id)
+        if not self.has_view_permission(request, snapshot):
+            raise PermissionDenied
+
+        against_id = request.GET.get('against')
+        hunks = None
+        if against_id:
+            try:
+                against_id = int(against_id)
+            except ValueError:
+                raise Http404('The "against" snapshot ID is not an integer.')
+            other = get_object_or_404(
+                snapshot_set,
+                pk=against_id,
+                documents_languages_id=snapshot.documents_languages_id_id)
+        else:
+            other = self._get_adjacent_snapshot(snapshot, previous=True)
+            if other is not None:
+                hunks = snapshot.get_hunks()
+        if other is not None and other.datetime > snapshot.datetime:
+            older, newer = snapshot, other
+        else:
+            older, newer = other, snapshot
+
+        mode = request.GET.get('mode')
+        if mode not in self.diff_modes:
+            mode = self.diff_modes[0]
+
+        next_snapshot = self._get_adjacent_snapshot(newer, previous=False)
+        context = dict(
+            self.admin_site.each_context(request),
+            mode=mode,
+            modes=self.diff_modes,
+            newer=newer,
+            next_snapshot=next_snapshot,
+            older=older,
+            opts=self.model._meta,
+            rows=self.get_diff_rows(older, newer, hunks=hunks),
+            title='Changes to {!s}'.format(
+                newer.documents_languages_id.document_id))
+
+        return TemplateResponse(
+            request,
+            'admin/django_docsnaps/snapshot/diff.html',
+            context)
+
+    def _get_adjacent_snapshot(self, snapshot, previous=True):
+        """
+        Get the snapshot of the same job taken just before or after another.
+
+        Only an indexed range query is issued and the text is not loaded.
+
+        """
+        if previous:
+            snapshot_set = models.Snapshot.objects\
+                .filter(datetime__lt=snapshot.datetime)\
+                .order_by('-datetime')
+        else:
+            snapshot_set = models.Snapshot.objects\
+                .filter(datetime__gt=snapshot.datetime)\
+                .order_by('datetime')
+        adjacent = snapshot_set\
+            .filter(documents_languages_id=snapshot.documents_languages_id_id)\
+            .only('snapshot_id', 'datetime', 'documents_languages_id')[:1]
+
+        return adjacent[0] if adjacent else None
+
+    def get_diff_rows(self, older, newer, hunks=None):
+        """
+        Get the rows of the differences between two snapshots.
+
+        Rows are served from the diff cache when possible. Otherwise, both
+        texts are loaded in a single query and the rows built and cached. The
+        differences are only computed if no hunks are passed.
+
+        Args:
+            older (django_docsnaps.models.Snapshot): The older snapshot, or
+                None to show the newer snapshot's text as entirely added.
+            newer (django_docsnaps.models.Snapshot): The newer snapshot.
+            hunks (list): The hunks of newer's text against older's, as stored
+                by the run, or None.
+
+        Returns:
+            list: django_docsnaps.diff.DiffRow tuples.
+
+        """
+        older_id = older.snapshot_id if older is not None else None
+        cache_key = 'django_docsnaps.diff.{!s}.{!s}'.format(
+            older_id,
+            newer.snapshot_id)
+        rows = self.diff_cache.get(cache_key)
+        if rows is None:
+            texts = dict(
+                models.Snapshot.objects\
+                    .filter(pk__in=[older_id, newer.snapshot_id])\
+                    .values_list('snapshot_id', 'text'))
+            old_lines = (texts.get(older_id) or '').splitlines()
+            new_lines = (texts[newer.snapshot_id] or '').splitlines()
+            if hunks is None:
+                hunks = diff.diff_lines(
+                    old_lines,
+                    new_lines,
+                    time_limit=settings.DJANGO_DOCSNAPS_DIFF_TIME_LIMIT)
+            rows = diff.get_context_rows(old_lines, new_lines, hunks)
+            self.diff_cache.set(cache_key, rows)
+
+        return rows
+
     def document_name(self, model):
         return model.documents_languages_id.document_id.name
     document_name.short_description = 'document'
@@ -69,20 +351,24 @@ class SnapshotAdmin(admin.ModelAdmin):
         return model.documents_languages_id.language_id.name
     language_name.short_description = 'language'
 
-    def service_name(self, model):
-        return model.documents_languages_id.document_id.service_id.name
-    service_name.short_description = 'service'
-
     def time_iso(self, model):
         return model.time.isoformat()
     time_iso.short_description = 'time'
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).select_related()
+    def get_changelist(self, request, **kwargs):
+        return SnapshotChangeList
+
+    def get_urls(self):
+        urls = [
+            path(
+                '<int:snapshot_id>/diff/',
+                self.admin_site.admin_view(self.diff_view),
+                name='django_docsnaps_snapshot_diff')]
+        return urls + super().get_urls()
 
 
 admin.site.register(models.Document, DocumentAdmin)
 admin.site.register(models.DocumentsLanguages, DocumentsLanguagesAdmin)
-admin.site.register(models.Service, ServiceAdmin)
+admin.site.register(models.Language, LanguageAdmin)
 admin.site.register(models.Snapshot, SnapshotAdmin)
 
@@ -0,0 +1,135 @@
+"""
+Caches for values that are expensive to compute from snapshot texts.
+
+By default, values are cached in process by a bounded LRUCache. A cache may
+instead be configured to use one of Django's caches, such as memcached, by
+naming its alias in a setting so that the cache is shared between processes.
+Both implement the same subset of Django's cache API so callers need not know
+which is in use.
+
+See:
+    https://docs.djangoproject.com/en/dev/topics/cache/#the-low-level-cache-api
+
+"""
+
+import collections
+import threading
+import time
+
+import django.core.cache
+import django.core.cache.backends.base
+
+
+class LRUCache:
+    """
+    A thread-safe, in-process cache with size- and time-based eviction.
+
+    The least recently used entries are evicted when either the number of
+    entries or their total cost exceeds its maximum. Entries also expire after
+    a timeout. Expired entries are removed when accessed or evicted.
+
+    Implements get(), set(), delete(), and clear() as in Django's cache API.
+
+    """
+
+    def __init__(
+        self,
+        max_entries=128,
+        max_cost=None,
+        timeout=300,
+        get_cost=None):
+        """
+        Initialize an instance.
+
+        Args:
+            max_entries (int): The maximum number of entries.
+            max_cost (int): The maximum total cost of all entries. Unbounded
+                if None.
+            timeout (float): The default number of seconds after which an
+                entry expires. Entries never expire if None.
+            get_cost (callable): Returns the cost of a value. Each value costs
+                1 if None.
+
+        """
+        self._entries = collections.OrderedDict()
+        self._get_cost = get_cost or (lambda value: 1)
+        self._lock = threading.Lock()
+        self._max_cost = max_cost
+        self._max_entries = max_entries
+        self._timeout = timeout
+        self._total_cost = 0
+
+    def _evict(self):
+        now = time.monotonic()
+        for key, (value, expiry, cost) in list(self._entries.items()):
+            if expiry is not None and expiry <= now:
+                self._remove(key)
+        while self._entries and (
+            len(self._entries) > self._max_entries
+            or (
+                self._max_cost is not None
+                and self._total_cost > self._max_cost)):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value, expiry, cost = self._entries.pop(key)
+        self._total_cost -= cost
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_cost = 0
+
+    def delete(self, key, version=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def get(self, key, default=None, version=None):
+        with self._lock:
+            try:
+                value, expiry, cost = self._entries[key]
+            except KeyError:
+                return default
+            if expiry is not None and expiry <= time.monotonic():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(
+        self,
+        key,
+        value,
+        timeout=django.core.cache.backends.base.DEFAULT_TIMEOUT,
+        version=None):
+        if timeout is django.core.cache.backends.base.DEFAULT_TIMEOUT:
+            timeout = self._timeout
+        expiry = None
+        if timeout is not None:
+            expiry = time.monotonic() + timeout
+        cost = self._get_cost(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expiry, cost)
+            self._total_cost += cost
+            self._evict()
+
+
+def get_cache(alias=None, **kwargs):
+    """
+    Get a Django cache by alias or, if none, a new in-process LRUCache.
+
+    Args:
+        alias (string): The alias of a cache in Django's CACHES setting.
+        **kwargs: Passed to the LRUCache constructor when alias is None.
+
+    Returns:
+        A cache implementing get(), set(), delete(), and clear().
+
+    """
+    if alias is not None:
+        return django.core.cache.caches[alias]
+    return LRUCache(**kwargs)
@@ -0,0 +1,332 @@
+"""
+Line-level differences between snapshot texts.
+
+Lines are compared with Myers' O(ND) algorithm, which is fastest when the texts
+are similar, as consecutive snapshots almost always are. The cost is further
+reduced before the algorithm runs:
+
+- Common leading and trailing lines are trimmed.
+- Lines are interned to integers so that comparisons are of integers.
+- Lines occurring in only one of the texts are discarded. They cannot be part
+  of any common subsequence and are always additions or removals.
+
+Each step of the algorithm is checked against an optional time limit. When the
+limit is exceeded, every line in the trimmed middle of the texts is treated as
+changed. The result is then still a correct, though not minimal, difference.
+
+Differences are summarized as hunks. A hunk is a (old_start, old_count,
+new_start, new_count) tuple describing a maximal run of removed and added lines
+without context, with zero-based starts, much like a unified diff's hunk
+header.
+
+See:
+    http://www.xmailserver.org/diff2.pdf
+
+"""
+
+import collections
+import time
+
+
+# A summary of the differences between two texts.
+#
+# lines_added and lines_removed count lines. changed_ratio is the number of
+# bytes in changed lines divided by the number of bytes in both texts. hunks is
+# a list of (old_start, old_count, new_start, new_count) tuples.
+DiffSummary = collections.namedtuple(
+    'DiffSummary',
+    ['lines_added', 'lines_removed', 'changed_ratio', 'hunks'])
+
+# A row of a side-by-side difference. Also used to render unified differences.
+#
+# kind is one of "equal", "replace", "delete", "insert", or "skip", which marks
+# omitted unchanged lines. Line numbers are one-based. A side's number and text
+# are None when the row has no line on that side.
+DiffRow = collections.namedtuple(
+    'DiffRow',
+    ['kind', 'old_number', 'old_text', 'new_number', 'new_text'])
+
+
+def diff_lines(old_lines, new_lines, time_limit=None):
+    """
+    Find the hunks of lines removed from old_lines and added in new_lines.
+
+    Args:
+        old_lines (sequence): The old lines.
+        new_lines (sequence): The new lines.
+        time_limit (float): The maximum number of seconds to spend searching
+            for a minimal difference. Unlimited if None.
+
+    Returns:
+        list: (old_start, old_count, new_start, new_count) tuples in order.
+
+    """
+    deadline = None
+    if time_limit is not None:
+        deadline = time.monotonic() + time_limit
+
+    prefix = 0
+    max_prefix = min(len(old_lines), len(new_lines))
+    while prefix < max_prefix and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix \
+        and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+    if not (old_middle and new_middle):
+        return _get_hunks(
+            set(range(len(old_middle))),
+            set(range(len(new_middle))),
+            len(old_middle),
+            len(new_middle),
+            prefix)
+
+    # Intern lines and discard those that cannot match.
+    line_ids = {}
+    old_ids = [line_ids.setdefault(line, len(line_ids)) for line in old_middle]
+    new_ids = [line_ids.setdefault(line, len(line_ids)) for line in new_middle]
+    shared_ids = set(old_ids).intersection(new_ids)
+    old_indices = [
+        index for index, line_id in enumerate(old_ids)
+        if line_id in shared_ids]
+    new_indices = [
+        index for index, line_id in enumerate(new_ids)
+        if line_id in shared_ids]
+
+    edits = _myers(
+        [old_ids[index] for index in old_indices],
+        [new_ids[index] for index in new_indices],
+        deadline)
+    if edits is None:
+        removed = set(range(len(old_middle)))
+        added = set(range(len(new_middle)))
+    else:
+        removed = set(range(len(old_middle))).difference(old_indices)
+        removed.update(old_indices[index] for index in edits[0])
+        added = set(range(len(new_middle))).difference(new_indices)
+        added.update(new_indices[index] for index in edits[1])
+
+    return _get_hunks(removed, added, len(old_middle), len(new_middle), prefix)
+
+def get_context_rows(old_lines, new_lines, hunks, context=3):
+    """
+    Get the rows of a side-by-side difference with unchanged context lines.
+
+    Args:
+        old_lines (sequence): The old lines.
+        new_lines (sequence): The new lines.
+        hunks (iterable): As returned by diff_lines().
+        context (int): The number of unchanged lines shown around each hunk.
+
+    Returns:
+        list: DiffRow tuples in order.
+
+    """
+    rows = []
+
+    def add_equal_rows(old_start, old_end, delta):
+        for index in range(old_start, old_end):
+            rows.append(DiffRow(
+                'equal',
+                index + 1,
+                old_lines[index],
+                index + delta + 1,
+                new_lines[index + delta]))
+
+    previous_end = None
+    delta = 0
+    for old_start, old_count, new_start, new_count in hunks:
+        if previous_end is None:
+            leading_start = max(old_start - context, 0)
+            if leading_start > 0:
+                rows.append(DiffRow('skip', None, None, None, None))
+        elif old_start - previous_end > 2 * context:
+            add_equal_rows(previous_end, previous_end + context, delta)
+            rows.append(DiffRow('skip', None, None, None, None))
+            leading_start = old_start - context
+        else:
+            leading_start = previous_end
+        delta = new_start - old_start
+        add_equal_rows(leading_start, old_start, delta)
+
+        for offset in range(max(old_count, new_count)):
+            old_row = (None, None)
+            if offset < old_count:
+                old_row = (
+                    old_start + offset + 1,
+                    old_lines[old_start + offset])
+            new_row = (None, None)
+            if offset < new_count:
+                new_row = (
+                    new_start + offset + 1,
+                    new_lines[new_start + offset])
+            if offset < old_count and offset < new_count:
+                kind = 'replace'
+            elif offset < old_count:
+                kind = 'delete'
+            else:
+                kind = 'insert'
+            rows.append(DiffRow(kind, *(old_row + new_row)))
+
+        previous_end = old_start + old_count
+        delta = new_start + new_count - previous_end
+
+    if previous_end is not None:
+        trailing_end = min(previous_end + context, len(old_lines))
+        add_equal_rows(previous_end, trailing_end, delta)
+        if trailing_end < len(old_lines):
+            rows.append(DiffRow('skip', None, None, None, None))
+
+    return rows
+
+def _get_hunks(removed, added, old_length, new_length, offset):
+    """
+    Group removed and added line indices into hunks.
+
+    Unchanged lines are matched in order so walking both sequences together,
+    consuming changed lines from either and unchanged lines from both, aligns
+    them.
+
+    """
+    hunks = []
+    old_index = 0
+    new_index = 0
+    hunk_start = None
+    while old_index < old_length or new_index < new_length:
+        if old_index < old_length and old_index in removed:
+            if hunk_start is None:
+                hunk_start = (old_index, new_index)
+            old_index += 1
+        elif new_index < new_length and new_index in added:
+            if hunk_start is None:
+                hunk_start = (old_index, new_index)
+            new_index += 1
+        else:
+            if hunk_start is not None:
+                hunks.append(_make_hunk(
+                    hunk_start,
+                    old_index,
+                    new_index,
+                    offset))
+                hunk_start = None
+            old_index += 1
+            new_index += 1
+    if hunk_start is not None:
+        hunks.append(_make_hunk(hunk_start, old_index, new_index, offset))
+
+    return hunks
+
+def _make_hunk(hunk_start, old_end, new_end, offset):
+    return (
+        hunk_start[0] + offset,
+        old_end - hunk_start[0],
+        hunk_start[1] + offset,
+        new_end - hunk_start[1])
+
+def _myers(old_ids, new_ids, deadline):
+    """
+    Find a shortest edit script with Myers' greedy algorithm.
+
+    Only the furthest-reaching x for diagonals -d to d is kept for each edit
+    distance d so the trace takes O(D^2) memory.
+
+    Returns:
+        tuple: The set of removed indices of old_ids and the set of added
+            indices of new_ids, or None if the deadline passed.
+
+    """
+    old_length = len(old_ids)
+    new_length = len(new_ids)
+    furthest = {1: 0}
+    trace = []
+    for distance in range(old_length + new_length + 1):
+        if deadline is not None and time.monotonic() > deadline:
+            return None
+
+        current = {}
+        for diagonal in range(-distance, distance + 1, 2):
+            if diagonal == -distance or (
+                diagonal != distance
+                and furthest[diagonal - 1] < furthest[diagonal + 1]):
+                x = furthest[diagonal + 1]
+            else:
+                x = furthest[diagonal - 1] + 1
+            y = x - diagonal
+            while x < old_length and y < new_length \
+                and old_ids[x] == new_ids[y]:
+                x += 1
+                y += 1
+            current[diagonal] = x
+            if x >= old_length and y >= new_length:
+                trace.append(current)
+                return _backtrack(trace, old_length, new_length)
+        trace.append(current)
+        furthest = current
+
+def _backtrack(trace, x, y):
+    removed = set()
+    added = set()
+    for distance in range(len(trace) - 1, 0, -1):
+        furthest = trace[distance - 1]
+        diagonal = x - y
+        if diagonal == -distance or (
+            diagonal != distance
+            and furthest[diagonal - 1] < furthest[diagonal + 1]):
+            previous_diagonal = diagonal + 1
+        else:
+            previous_diagonal = diagonal - 1
+        previous_x = furthest[previous_diagonal]
+        previous_y = previous_x - previous_diagonal
+
+        if previous_diagonal == diagonal + 1:
+            added.add(previous_y)
+        else:
+            removed.add(previous_x)
+        x = previous_x
+        y = previous_y
+
+    return removed, added
+
+def summarize(old_text, new_text, time_limit=None):
+    """
+    Summarize the line-level differences between two texts.
+
+    Args:
+        old_text (string): The previous snapshot's text.
+        new_text (string): The new snapshot's text.
+        time_limit (float): As for diff_lines().
+
+    Returns:
+        DiffSummary: The summary.
+
+    """
+    old_lines = (old_text or '').splitlines(keepends=True)
+    new_lines = (new_text or '').splitlines(keepends=True)
+    hunks = diff_lines(old_lines, new_lines, time_limit=time_limit)
+
+    lines_added = 0
+    lines_removed = 0
+    changed_bytes = 0
+    for old_start, old_count, new_start, new_count in hunks:
+        lines_removed += old_count
+        lines_added += new_count
+        changed_bytes += sum(
+            len(line.encode('utf-8'))
+            for line in old_lines[old_start:old_start + old_count])
+        changed_bytes += sum(
+            len(line.encode('utf-8'))
+            for line in new_lines[new_start:new_start + new_count])
+
+    total_bytes = len((old_text or '').encode('utf-8')) \
+        + len((new_text or '').encode('utf-8'))
+    changed_ratio = changed_bytes / total_bytes if total_bytes else 0.0
+
+    return DiffSummary(
+        lines_added=lines_added,
+        lines_removed=lines_removed,
+        changed_ratio=changed_ratio,
+        hunks=hunks)
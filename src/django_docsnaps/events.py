@@ -0,0 +1,194 @@
+"""
+Change events and the sinks to which they are delivered.
+
+When a new snapshot is saved, a ChangeEvent is inserted in the same
+transaction. The deliver-events subcommand later delivers pending events to the
+sinks configured in DJANGO_DOCSNAPS_EVENT_SINKS, so notifying downstream systems
+adds a single insert to the run and no network latency.
+
+Events are delivered at least once. An event is deleted only after every sink
+accepted it. A failed delivery is retried, to every sink, so a sink may receive
+an event more than once and should deduplicate by change_event_id. Events are
+delivered in batches and batches may arrive in any order.
+
+Each sink is configured by a dictionary with a "type" key:
+
+    {'type': 'webhook', 'url': 'https://example.com/hook', 'headers': {}}
+        POSTs {"events": [...]} as JSON. Any 2xx response is success.
+    {'type': 'file', 'path': '/var/log/docsnaps/events.jsonl'}
+        Appends one JSON line per event and flushes it to disk.
+    {'type': 'callable', 'callable': 'package.module.function'}
+        Calls the function, or coroutine function, with the list of events.
+        Any exception is a failure.
+
+"""
+
+import asyncio
+import json
+import os
+
+import aiohttp
+import django.core.exceptions
+import django.utils.module_loading
+
+import django_docsnaps.models
+import django_docsnaps.settings
+
+
+class DeliveryError(Exception):
+    """
+    Raised when a sink fails to accept a batch of events.
+
+    """
+
+    pass
+
+
+class CallableSink:
+
+    def __init__(self, callable):
+        if isinstance(callable, str):
+            callable = django.utils.module_loading.import_string(callable)
+        self._callable = callable
+
+    def __str__(self):
+        return getattr(self._callable, '__qualname__', repr(self._callable))
+
+    async def deliver(self, client_session, events):
+        try:
+            result = self._callable(events)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as exception:
+            raise DeliveryError(str(exception)) from exception
+
+
+class FileSink:
+
+    def __init__(self, path):
+        self._path = path
+
+    def __str__(self):
+        return self._path
+
+    async def deliver(self, client_session, events):
+        try:
+            with open(self._path, 'a', encoding='utf-8') as event_file:
+                for event in events:
+                    event_file.write(json.dumps(event, sort_keys=True) + '\n')
+                event_file.flush()
+                os.fsync(event_file.fileno())
+        except OSError as exception:
+            raise DeliveryError(str(exception)) from exception
+
+
+class WebhookSink:
+
+    def __init__(self, url, headers=None, timeout=None):
+        self._headers = dict(headers or {})
+        self._headers.setdefault('Content-Type', 'application/json')
+        self._timeout = timeout
+        if timeout is None:
+            self._timeout = \
+                django_docsnaps.settings.DJANGO_DOCSNAPS_REQUEST_TIMEOUT
+        self._url = url
+
+    def __str__(self):
+        return self._url
+
+    async def deliver(self, client_session, events):
+        body = json.dumps({'events': events}).encode('utf-8')
+        try:
+            async with client_session.post(
+                self._url,
+                data=body,
+                headers=self._headers,
+                timeout=self._timeout) as response:
+                await response.read()
+                if not 200 <= response.status < 300:
+                    raise DeliveryError(
+                        'The webhook responded with status {!s}.'.format(
+                            response.status))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            raise DeliveryError(str(exception) or repr(exception)) \
+                from exception
+
+
+_SINK_TYPES = {
+    'callable': CallableSink,
+    'file': FileSink,
+    'webhook': WebhookSink,
+}
+
+
+def create_change_event(snapshot):
+    """
+    Insert a change event for a newly-saved snapshot.
+
+    Must be called in the transaction that saved the snapshot. No event is
+    created when no sinks are configured so that undeliverable events do not
+    accumulate.
+
+    Args:
+        snapshot (django_docsnaps.models.Snapshot): The new snapshot. Its job
+            and the job's document should have been loaded.
+
+    Returns:
+        django_docsnaps.models.ChangeEvent: The event or None.
+
+    """
+    if not django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_SINKS:
+        return None
+
+    job = snapshot.documents_languages_id
+    payload = {
+        'changed_ratio': snapshot.changed_ratio,
+        'datetime': snapshot.datetime.isoformat(),
+        'digest': snapshot.digest,
+        'document': job.document_id.name,
+        'document_id': job.document_id_id,
+        'documents_languages_id': job.documents_languages_id,
+        'language_id': job.language_id_id,
+        'lines_added': snapshot.lines_added,
+        'lines_removed': snapshot.lines_removed,
+        'snapshot_id': snapshot.snapshot_id,
+        'url': job.url,
+    }
+
+    return django_docsnaps.models.ChangeEvent.objects.create(
+        snapshot_id=snapshot,
+        payload=json.dumps(payload, separators=(',', ':')))
+
+def get_sinks(sink_configs=None):
+    """
+    Create the sinks described by sink configuration dictionaries.
+
+    Args:
+        sink_configs (iterable): Sink configuration dictionaries. Defaults to
+            DJANGO_DOCSNAPS_EVENT_SINKS.
+
+    Returns:
+        list: The sinks.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If a sink configuration
+            is invalid.
+
+    """
+    if sink_configs is None:
+        sink_configs = django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_SINKS
+
+    sinks = []
+    for sink_config in sink_configs:
+        sink_config = dict(sink_config)
+        sink_type = sink_config.pop('type', None)
+        if sink_type not in _SINK_TYPES:
+            raise django.core.exceptions.ImproperlyConfigured(
+                'Unknown event sink type: "{!s}".'.format(sink_type))
+        try:
+            sinks.append(_SINK_TYPES[sink_type](**sink_config))
+        except (ImportError, TypeError) as exception:
+            raise django.core.exceptions.ImproperlyConfigured(
+                'Invalid {!s} event sink: {!s}'.format(sink_type, exception))
+
+    return sinks
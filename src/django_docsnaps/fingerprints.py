@@ -0,0 +1,299 @@
+"""
+Similarity fingerprints of snapshot text.
+
+A SimHash fingerprint condenses a document into 64 bits such that similar
+documents have fingerprints differing in few bits. Two snapshots can therefore
+be compared for near-duplication in constant time, without loading either text,
+by counting the bits in which their fingerprints differ.
+
+The document is split into lowercase words and each run of SHINGLE_SIZE
+consecutive words is a feature. Word shingles, rather than single words, make
+the fingerprint sensitive to word order but insensitive to line breaks and
+other whitespace, so a reflowed document has the same fingerprint.
+
+Fingerprints are returned as signed integers so that they fit in a database's
+signed 64-bit integer column. A SimHasher computes the same fingerprint from a
+text received in chunks, such as the output of a streaming transform.
+
+A MinHash signature instead estimates the Jaccard similarity of two sets, such
+as the lines changed by two snapshots. Signatures are grouped by locality
+sensitive hashing (LSH) banding so that sets likely to be similar are found
+without comparing every pair. Both are vectorized with NumPy, an optional
+dependency. MinHash functions raise ImproperlyConfigured when it is missing.
+
+See:
+    https://en.wikipedia.org/wiki/SimHash
+    https://en.wikipedia.org/wiki/MinHash
+
+"""
+
+import collections
+import functools
+import hashlib
+import re
+
+import django.core.exceptions
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The number of bits in a fingerprint.
+FINGERPRINT_BITS = 64
+
+# The number of hash functions, and therefore values, in a MinHash signature.
+MINHASH_PERMUTATIONS = 128
+
+# The number of consecutive words in each feature.
+SHINGLE_SIZE = 3
+
+# The MinHash hash function parameters are fixed so that signatures computed by
+# separate runs are comparable.
+_MINHASH_SEED = 1729
+
+_MASK = (1 << FINGERPRINT_BITS) - 1
+_TRAILING_WORD_PATTERN = re.compile(r'\w+$')
+_WORD_PATTERN = re.compile(r'\w+')
+
+
+class SimHasher:
+    """
+    Computes a SimHash fingerprint of a text added in chunks.
+
+    The fingerprint is that of simhash() applied to the chunks' concatenation.
+    Memory use is bounded by the chunk size rather than the text's length since
+    only the feature weights, the last words, and a trailing partial word are
+    kept between chunks.
+
+    """
+
+    def __init__(self):
+        self._partial_word = ''
+        self._previous_words = []
+        self._weights = [0] * FINGERPRINT_BITS
+        self._word_count = 0
+
+    def _add_features(self, features):
+        for feature, count in features.items():
+            feature_hash = int.from_bytes(
+                hashlib.blake2b(
+                    feature.encode('utf-8'),
+                    digest_size=FINGERPRINT_BITS // 8).digest(),
+                'big')
+            for bit in range(FINGERPRINT_BITS):
+                if feature_hash >> bit & 1:
+                    self._weights[bit] += count
+                else:
+                    self._weights[bit] -= count
+
+    def _add_words(self, words):
+        words = self._previous_words + words
+        self._add_features(collections.Counter(
+            ' '.join(words[index:index + SHINGLE_SIZE])
+            for index in range(len(words) - SHINGLE_SIZE + 1)))
+        self._previous_words = words[len(words) - SHINGLE_SIZE + 1:]
+
+    def get_fingerprint(self):
+        """
+        Get the fingerprint of the text added. No text may be added after.
+
+        Returns:
+            int: The fingerprint as a signed 64-bit integer.
+
+        """
+        words = _WORD_PATTERN.findall(self._partial_word.lower())
+        self._partial_word = ''
+        self._word_count += len(words)
+        self._add_words(words)
+        if self._word_count < SHINGLE_SIZE:
+            # A text too short for a shingle is a single feature.
+            self._add_features({' '.join(self._previous_words): 1})
+            self._word_count = SHINGLE_SIZE
+
+        fingerprint = 0
+        for bit, weight in enumerate(self._weights):
+            if weight > 0:
+                fingerprint |= 1 << bit
+
+        return to_signed(fingerprint)
+
+    def update(self, text):
+        """
+        Add the next chunk of text.
+
+        A word at the end of the chunk may continue in the next chunk so it is
+        held back until then.
+
+        Args:
+            text (string): The chunk.
+
+        """
+        text = self._partial_word + text
+        match = _TRAILING_WORD_PATTERN.search(text)
+        if match:
+            self._partial_word = text[match.start():]
+            text = text[:match.start()]
+        else:
+            self._partial_word = ''
+        words = _WORD_PATTERN.findall(text.lower())
+        self._word_count += len(words)
+        self._add_words(words)
+
+
+def hamming_distance(first, second):
+    """
+    Count the bits in which two fingerprints differ.
+
+    Args:
+        first (int): A fingerprint as returned by simhash().
+        second (int): A fingerprint as returned by simhash().
+
+    Returns:
+        int: The number of differing bits, from 0 to FINGERPRINT_BITS.
+
+    """
+    return bin((first ^ second) & _MASK).count('1')
+
+def get_lsh_clusters(signatures, bands):
+    """
+    Group MinHash signatures likely to have similar sets.
+
+    Each signature is split into bands of equal width. Signatures with
+    identical values in any one band are candidates and candidates are joined
+    transitively into clusters. With r rows per band, sets with Jaccard
+    similarity s share a band with probability 1 - (1 - s^r)^bands, a steep
+    curve around (1 / bands)^(1 / r).
+
+    Bucketing and cluster labelling are vectorized. Labels are propagated as
+    the minimum label of each bucket, with pointer jumping, until stable. The
+    number of iterations is bounded by the logarithm of the largest cluster's
+    diameter in practice.
+
+    Args:
+        signatures (numpy.ndarray): A two-dimensional array of signatures as
+            returned by get_minhash_signature(), one per row.
+        bands (int): The number of bands. Must divide the signature length.
+
+    Returns:
+        numpy.ndarray: A cluster label for each signature. Signatures in the
+            same cluster have the same label, the lowest row index among them.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If NumPy is not installed.
+        ValueError: If bands does not divide the signature length.
+
+    """
+    _require_numpy()
+    count, length = signatures.shape
+    if bands < 1 or length % bands:
+        raise ValueError(
+            'A signature of length {!s} cannot be split into {!s} '
+            'bands.'.format(length, bands))
+
+    rows = length // bands
+    band_buckets = []
+    for band in range(bands):
+        band_values = numpy.ascontiguousarray(
+            signatures[:, band * rows:(band + 1) * rows])
+        band_keys = band_values.view(
+            numpy.dtype((numpy.void, band_values.dtype.itemsize * rows)))
+        band_buckets.append(
+            numpy.unique(band_keys.ravel(), return_inverse=True)[1].ravel())
+
+    labels = numpy.arange(count)
+    while True:
+        previous_labels = labels
+        for buckets in band_buckets:
+            bucket_labels = numpy.full(buckets.max() + 1, count)
+            numpy.minimum.at(bucket_labels, buckets, labels)
+            labels = bucket_labels[buckets]
+        labels = labels[labels]
+        if numpy.array_equal(labels, previous_labels):
+            return labels
+
+def get_minhash_signature(features, permutations=MINHASH_PERMUTATIONS):
+    """
+    Compute the MinHash signature of a set of strings.
+
+    Each feature is hashed once. The permutations are simulated by
+    multiply-shift hash functions applied to all features at once.
+
+    Args:
+        features (iterable): The set's string elements. Must not be empty.
+        permutations (int): The signature length.
+
+    Returns:
+        numpy.ndarray: The signature as a one-dimensional array of uint32.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If NumPy is not installed.
+
+    """
+    _require_numpy()
+    feature_hashes = numpy.fromiter(
+        (
+            int.from_bytes(
+                hashlib.blake2b(
+                    feature.encode('utf-8'),
+                    digest_size=4).digest(),
+                'big')
+            for feature in features),
+        dtype=numpy.uint64)
+    multipliers, increments = _get_minhash_parameters(permutations)
+
+    # Unsigned multiplication wraps modulo 2^64. The high 32 bits are the hash.
+    hashes = (
+        multipliers[:, numpy.newaxis] * feature_hashes[numpy.newaxis, :]
+        + increments[:, numpy.newaxis]) >> numpy.uint64(32)
+
+    return hashes.min(axis=1).astype(numpy.uint32)
+
+@functools.lru_cache()
+def _get_minhash_parameters(permutations):
+    # Multipliers must be odd. Both are random 64-bit integers.
+    random_state = numpy.random.RandomState(_MINHASH_SEED)
+    multipliers = random_state.randint(
+        0,
+        2 ** 63,
+        size=permutations,
+        dtype=numpy.uint64) * numpy.uint64(2) + numpy.uint64(1)
+    increments = random_state.randint(
+        0,
+        2 ** 63,
+        size=permutations,
+        dtype=numpy.uint64) * numpy.uint64(2)
+
+    return multipliers, increments
+
+def _require_numpy():
+    if numpy is None:
+        raise django.core.exceptions.ImproperlyConfigured(
+            'NumPy is required for MinHash signatures and clustering.')
+
+def simhash(text):
+    """
+    Compute the SimHash fingerprint of a text.
+
+    Args:
+        text (string): The text to fingerprint.
+
+    Returns:
+        int: The fingerprint as a signed 64-bit integer.
+
+    """
+    simhasher = SimHasher()
+    simhasher.update(text)
+
+    return simhasher.get_fingerprint()
+
+def to_signed(fingerprint):
+    """
+    Convert an unsigned fingerprint to a signed 64-bit integer.
+
+    """
+    fingerprint &= _MASK
+    if fingerprint >> (FINGERPRINT_BITS - 1):
+        fingerprint -= 1 << FINGERPRINT_BITS
+    return fingerprint
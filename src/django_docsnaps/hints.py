@@ -0,0 +1,60 @@
+"""
+Hints that documents have changed.
+
+Some origins notify subscribers, by a webhook or a feed, when a page changes. A
+hint names the URL of a changed document. Every enabled job with that URL is
+marked as requested and is checked by the next run even if its poll_interval
+has not elapsed. Jobs of such origins can therefore be given a long fallback
+interval so that their documents are fetched only when they have changed.
+
+Hints are received by the hint view and the hint subcommand. URLs are matched
+exactly, after surrounding whitespace and any fragment are removed, against the
+indexed DocumentsLanguages.url column.
+
+"""
+
+import urllib.parse
+
+import django.utils.timezone
+
+import django_docsnaps.models
+
+
+def normalize_url(url):
+    """
+    Normalize a hinted URL for comparison with job URLs.
+
+    Args:
+        url (string): The URL.
+
+    Returns:
+        string: The URL without surrounding whitespace or fragment.
+
+    """
+    return urllib.parse.urldefrag(url.strip())[0]
+
+def request_fetches(urls):
+    """
+    Mark the enabled jobs of the hinted URLs for a check by the next run.
+
+    The jobs are updated in a single query. A URL that matches no job is
+    ignored.
+
+    Args:
+        urls (iterable): The URLs of changed documents.
+
+    Returns:
+        int: The number of jobs marked.
+
+    Raises:
+        django.db.Error: If the jobs could not be updated.
+
+    """
+    urls = {normalize_url(url) for url in urls}
+    urls.discard('')
+    if not urls:
+        return 0
+
+    return django_docsnaps.models.DocumentsLanguages.objects\
+        .filter(is_enabled=True, url__in=urls)\
+        .update(fetch_requested_datetime=django.utils.timezone.now())
@@ -0,0 +1,391 @@
+"""
+A Django admin command that groups similar document changes into clusters.
+
+A change is a snapshot that has a previous snapshot of the same job. It is
+represented by the set of lines it added and removed, each prefixed with "+" or
+"-" and with whitespace normalized. The lines are read from the texts at the
+ranges of the snapshot's hunks, which the run command saved with the snapshot,
+so no texts are diffed again. Changes whose hunks are empty are skipped without
+loading their texts. Snapshots saved without hunks, such as those of streamed
+documents, fall back to comparing all of their texts' lines. Either way, lines
+are compared as sets so that a line removed and added again is not a change.
+
+Each change's set is condensed into a MinHash signature. All signatures in the
+time window are then grouped at once with NumPy-vectorized LSH banding so that
+no pair of changes is ever compared directly. Cluster assignments are written
+back to the snapshots. A cluster is only created if its changes were made to
+at least two different documents since the purpose of clustering is to find
+changes shared across documents. Running the command again over an overlapping
+window replaces the previous assignments of the window's snapshots. Earlier
+clusters that kept snapshots from before the window have their snapshot counts
+and datetimes recomputed from those snapshots.
+
+Snapshot texts are loaded in batches so that memory use is bounded by the
+batch size and the signatures, which take 512 bytes per change.
+
+NumPy is an optional dependency required by this command only.
+
+"""
+
+import datetime
+
+import django.conf
+import django.core.management.base
+import django.db
+import django.db.models
+import django.utils.dateparse
+import django.utils.timezone
+
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+import django_docsnaps.routers
+
+
+class Command(django.core.management.base.BaseCommand):
+
+    help = 'Groups similar changes made to different documents.'
+
+    # The number of changes whose snapshot texts are loaded at once.
+    _batch_size = 500
+
+    def _assign_clusters(self, since, changes, labels, min_size):
+        """
+        Replace the cluster assignments of the window's snapshots.
+
+        Args:
+            since (datetime.datetime): The start of the time window.
+            changes (list): (snapshot_id, datetime, document_id) tuples.
+            labels (sequence): A cluster label for each change.
+            min_size (int): The smallest number of changes forming a cluster.
+                Changes made to a single document never form a cluster.
+
+        Returns:
+            int: The number of clusters created.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        clusters = {}
+        for change, label in zip(changes, labels):
+            clusters.setdefault(int(label), []).append(change)
+
+        cluster_count = 0
+        try:
+            with django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
+                window_snapshot_set = django_docsnaps.models.Snapshot.objects\
+                    .filter(datetime__gte=since)
+                previous_cluster_ids = set(
+                    window_snapshot_set\
+                        .filter(change_cluster_id__isnull=False)\
+                        .values_list('change_cluster_id', flat=True))
+                window_snapshot_set.update(change_cluster_id=None)
+                django_docsnaps.models.ChangeCluster.objects\
+                    .filter(snapshot__isnull=True)\
+                    .delete()
+                self._update_cluster_counts(previous_cluster_ids)
+
+                for cluster_changes in clusters.values():
+                    document_ids = set(change[2] for change in cluster_changes)
+                    if len(cluster_changes) < min_size \
+                        or len(document_ids) < 2:
+                        continue
+                    datetimes = [change[1] for change in cluster_changes]
+                    change_cluster = \
+                        django_docsnaps.models.ChangeCluster.objects.create(
+                            snapshot_count=len(cluster_changes),
+                            first_datetime=min(datetimes),
+                            last_datetime=max(datetimes))
+                    snapshot_ids = [change[0] for change in cluster_changes]
+                    django_docsnaps.models.Snapshot.objects\
+                        .filter(pk__in=snapshot_ids)\
+                        .update(change_cluster_id=change_cluster)
+                    cluster_count += 1
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
+        return cluster_count
+
+    def _get_changed_lines(self, previous_text, text, hunks):
+        """
+        Get the set of lines added and removed by a change.
+
+        A line both removed and added, such as one whose whitespace alone
+        changed, is not a change.
+
+        Args:
+            previous_text (string): The previous snapshot's text.
+            text (string): The snapshot's text.
+            hunks (list): The snapshot's hunks as returned by
+                django_docsnaps.models.Snapshot.get_hunks(), or None if it has
+                none, in which case every line of the texts is compared.
+
+        Returns:
+            set: Added lines prefixed with "+" and removed lines with "-".
+
+        """
+        previous_lines = (previous_text or '').splitlines()
+        lines = (text or '').splitlines()
+        if hunks is not None:
+            previous_lines = [
+                line
+                for old_start, old_count, new_start, new_count in hunks
+                for line in previous_lines[old_start:old_start + old_count]]
+            lines = [
+                line
+                for old_start, old_count, new_start, new_count in hunks
+                for line in lines[new_start:new_start + new_count]]
+        previous_lines = self._get_lines(previous_lines)
+        lines = self._get_lines(lines)
+
+        changed_lines = set('+' + line for line in lines - previous_lines)
+        changed_lines.update('-' + line for line in previous_lines - lines)
+
+        return changed_lines
+
+    def _get_changes(self, since):
+        """
+        Query the snapshots taken since the start of the window.
+
+        Each snapshot's previous snapshot is found by a correlated subquery
+        served by the unique index on the job and datetime. First snapshots
+        have no previous snapshot and are not changes, nor are snapshots whose
+        hunks are empty. As in the run command, raw() is used so that the text
+        field is deferred and never loaded.
+
+        Args:
+            since (datetime.datetime): The start of the time window.
+
+        Returns:
+            list: (snapshot_id, datetime, previous_snapshot_id, document_id,
+                hunks) tuples. hunks is as returned by
+                django_docsnaps.models.Snapshot.get_hunks().
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        change_sql = '''
+            SELECT
+                {Snapshot}.snapshot_id
+                ,{Snapshot}.datetime
+                ,{Snapshot}.hunks
+                ,{DocumentsLanguages}.document_id
+                ,(
+                    SELECT snapshot_2.snapshot_id
+                    FROM {Snapshot} AS snapshot_2
+                    WHERE
+                        snapshot_2.documents_languages_id = {Snapshot}.documents_languages_id
+                        AND snapshot_2.datetime < {Snapshot}.datetime
+                    ORDER BY snapshot_2.datetime DESC
+                    LIMIT 1
+                ) AS previous_snapshot_id
+            FROM
+                {Snapshot}
+                INNER JOIN {DocumentsLanguages} ON
+                    {DocumentsLanguages}.documents_languages_id = {Snapshot}.documents_languages_id
+            WHERE
+                {Snapshot}.datetime >= %s
+            ORDER BY
+                {Snapshot}.datetime'''
+        change_sql = change_sql.format(
+            DocumentsLanguages=(
+                django_docsnaps.models.DocumentsLanguages._meta.db_table),
+            Snapshot=django_docsnaps.models.Snapshot._meta.db_table)
+
+        changes = []
+        try:
+            snapshot_set = django_docsnaps.models.Snapshot.objects.raw(
+                change_sql,
+                [since])
+            for snapshot in snapshot_set:
+                hunks = snapshot.get_hunks()
+                if snapshot.previous_snapshot_id is None or hunks == []:
+                    continue
+                changes.append((
+                    snapshot.snapshot_id,
+                    snapshot.datetime,
+                    snapshot.previous_snapshot_id,
+                    snapshot.document_id,
+                    hunks))
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
+        return changes
+
+    def _get_lines(self, lines):
+        lines = (' '.join(line.split()) for line in lines)
+        return set(line for line in lines if line)
+
+    def _get_signatures(self, changes):
+        """
+        Compute the MinHash signature of each change.
+
+        Args:
+            changes (list): As returned by _get_changes().
+
+        Returns:
+            tuple: A list of the (snapshot_id, datetime, document_id) tuples
+                of the changes that changed at least one line and a list of
+                their signatures.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        signed_changes = []
+        signatures = []
+        for start in range(0, len(changes), self._batch_size):
+            batch = changes[start:start + self._batch_size]
+            snapshot_ids = set(change[0] for change in batch)
+            snapshot_ids.update(change[2] for change in batch)
+            try:
+                texts = dict(
+                    django_docsnaps.models.Snapshot.objects\
+                        .filter(pk__in=snapshot_ids)\
+                        .values_list('snapshot_id', 'text'))
+            except django.db.Error as exception:
+                command_utils.raise_command_error(
+                    self.stdout,
+                    'A database error occurred: ' + str(exception))
+
+            for change in batch:
+                snapshot_id, snapshot_datetime, previous_id, document_id, \
+                    hunks = change
+                changed_lines = self._get_changed_lines(
+                    texts[previous_id],
+                    texts[snapshot_id],
+                    hunks)
+                if changed_lines:
+                    signed_changes.append(
+                        (snapshot_id, snapshot_datetime, document_id))
+                    signatures.append(
+                        django_docsnaps.fingerprints.get_minhash_signature(
+                            changed_lines))
+
+        return signed_changes, signatures
+
+    def _parse_since(self, since):
+        """
+        Parse the start of the time window.
+
+        Args:
+            since (string): An ISO 8601 date or datetime. Defaults to 24 hours
+                before now.
+
+        Returns:
+            datetime.datetime: The start of the window.
+
+        Raises:
+            django.core.management.base.CommandError: If since is invalid.
+
+        """
+        if since is None:
+            return django.utils.timezone.now() - datetime.timedelta(days=1)
+
+        since_datetime = django.utils.dateparse.parse_datetime(since)
+        if since_datetime is None:
+            since_date = django.utils.dateparse.parse_date(since)
+            if since_date is None:
+                command_utils.raise_command_error(
+                    self.stdout,
+                    'Invalid date or datetime: "{!s}".'.format(since))
+            since_datetime = datetime.datetime.combine(
+                since_date,
+                datetime.time())
+        if django.conf.settings.USE_TZ \
+            and django.utils.timezone.is_naive(since_datetime):
+            since_datetime = django.utils.timezone.make_aware(since_datetime)
+
+        return since_datetime
+
+    def _update_cluster_counts(self, cluster_ids):
+        """
+        Recompute the denormalized fields of clusters from their snapshots.
+
+        Must be called in the transaction that reassigned the snapshots.
+
+        Args:
+            cluster_ids (iterable): The primary keys of the clusters, which
+                must still have snapshots.
+
+        """
+        cluster_aggregates = django_docsnaps.models.Snapshot.objects\
+            .filter(change_cluster_id__in=cluster_ids)\
+            .values('change_cluster_id')\
+            .annotate(
+                snapshot_count=django.db.models.Count('snapshot_id'),
+                first_datetime=django.db.models.Min('datetime'),
+                last_datetime=django.db.models.Max('datetime'))
+        for cluster_aggregate in cluster_aggregates:
+            django_docsnaps.models.ChangeCluster.objects\
+                .filter(pk=cluster_aggregate.pop('change_cluster_id'))\
+                .update(**cluster_aggregate)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-s', '--since',
+            help=(
+                'Cluster changes made since this ISO 8601 date or datetime. '
+                'Defaults to the last 24 hours.'),
+            type=str)
+        parser.add_argument(
+            '-b', '--bands',
+            default=16,
+            help=(
+                'The number of LSH bands. More bands find less similar '
+                'changes. Must divide {!s}.').format(
+                    django_docsnaps.fingerprints.MINHASH_PERMUTATIONS),
+            type=int)
+        parser.add_argument(
+            '-m', '--min-size',
+            default=2,
+            help='The smallest number of changes forming a cluster.',
+            type=int)
+
+    def handle(self, *args, **options):
+        """
+        Cluster the changes in the time window and save the assignments.
+
+        """
+        numpy = django_docsnaps.fingerprints.numpy
+        if numpy is None:
+            command_utils.raise_command_error(
+                self.stdout,
+                'NumPy must be installed to cluster changes.')
+
+        since = self._parse_since(options.get('since'))
+        bands = options.get('bands', 16)
+        min_size = options.get('min_size', 2)
+
+        self.stdout.write('Querying changes: ', ending='')
+        changes = self._get_changes(since)
+        self.stdout.write(self.style.SUCCESS(str(len(changes))))
+
+        signed_changes, signatures = self._get_signatures(changes)
+        labels = []
+        if signatures:
+            try:
+                labels = django_docsnaps.fingerprints.get_lsh_clusters(
+                    numpy.vstack(signatures),
+                    bands)
+            except ValueError as exception:
+                command_utils.raise_command_error(self.stdout, str(exception))
+
+        cluster_count = self._assign_clusters(
+            since,
+            signed_changes,
+            labels,
+            min_size)
+        self.stdout.write(
+            'Change clustering complete: ' + self.style.SUCCESS(
+                '{!s} clusters created.'.format(cluster_count)))
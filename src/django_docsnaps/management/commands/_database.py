@@ -0,0 +1,223 @@
+"""
+Database access for the run's coroutines.
+
+Django's ORM is synchronous. Called directly from a coroutine, a query blocks
+the event loop, stalling every request in flight, and uses the connection of
+the loop's thread, which Django only checks and closes between the requests of
+a web process. A long run therefore holds a single connection that is never
+checked and is left broken by a database failover.
+
+A DatabaseExecutor runs ORM calls in a dedicated pool of threads instead. Each
+thread keeps its own connection between calls for as long as the database's
+CONN_MAX_AGE allows, as a web process does between requests. Set CONN_MAX_AGE
+for persistent connections. Before each call:
+
+- connections that have outlived CONN_MAX_AGE, or that raised errors and are no
+  longer usable, are closed, and
+- connections idle for longer than the health check interval are pinged and
+  closed if unusable.
+
+A closed connection is reopened by the next query. A call that fails because
+its connection was lost is retried once, on a new connection, if it was marked
+idempotent.
+
+A call may be given a timeout, after which it is abandoned by its caller but
+left to complete in its thread since a thread cannot be interrupted. Once
+abandoned calls occupy every thread, the executor is stalled: further calls
+with a timeout fail immediately rather than queue behind them, until one of the
+abandoned calls completes.
+
+With no threads, calls are made directly in the calling thread. Run methods
+called outside of a run, by tests for example, use such an executor.
+
+See:
+    https://docs.djangoproject.com/en/dev/ref/databases/#persistent-connections
+
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import django.db
+
+
+class DatabaseExecutor:
+
+    # The number of seconds that close() waits for each thread.
+    _close_timeout = 10
+
+    def __init__(self, max_workers=0, health_check_interval=60, loop=None):
+        """
+        Initialize an instance.
+
+        Args:
+            max_workers (int): The number of threads and so the maximum number
+                of connections to each database. When 0, calls are made in the
+                calling thread.
+            health_check_interval (float): The number of seconds a connection
+                may be idle before it is checked.
+            loop: The asyncio event loop. Defaults to the current event loop.
+
+        """
+        self._abandoned = set()
+        self._executor = None
+        if max_workers:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='docsnaps-db')
+        self._health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._loop = loop
+        self._max_workers = max_workers
+
+    def _call(self, function, args, idempotent):
+        """
+        Call a function in a worker thread with checked connections.
+
+        """
+        self._check_connections()
+        try:
+            try:
+                return function(*args)
+            except (django.db.InterfaceError, django.db.OperationalError):
+                if not self._close_unusable_connections() or not idempotent:
+                    raise
+            return function(*args)
+        finally:
+            self._local.last_call_time = time.monotonic()
+            django.db.close_old_connections()
+
+    def _check_connections(self):
+        """
+        Close the thread's obsolete connections and those found unusable.
+
+        """
+        django.db.close_old_connections()
+        last_call_time = getattr(self._local, 'last_call_time', None)
+        if last_call_time is not None and \
+            time.monotonic() - last_call_time > self._health_check_interval:
+            self._close_unusable_connections()
+
+    def _close_unusable_connections(self):
+        """
+        Ping the thread's open connections and close those that are unusable.
+
+        Returns:
+            bool: True if any connection was closed.
+
+        """
+        closed = False
+        for connection in django.db.connections.all():
+            if connection.connection is not None \
+                and not connection.in_atomic_block \
+                and not connection.is_usable():
+                connection.close()
+                closed = True
+
+        return closed
+
+    def close(self):
+        """
+        Close every thread's connections and stop the threads.
+
+        Each thread must close its own connections. A barrier holds each
+        thread that receives a closing call until every thread has received
+        one. If abandoned calls are still running, the threads are stopped
+        without waiting and their connections are left to be closed on exit.
+
+        """
+        if self._executor is None:
+            return
+        if self._abandoned:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            return
+
+        barrier = threading.Barrier(self._max_workers)
+
+        def close_connections():
+            try:
+                barrier.wait(timeout=self._close_timeout)
+            except threading.BrokenBarrierError:
+                pass
+            django.db.connections.close_all()
+
+        for _ in range(self._max_workers):
+            self._executor.submit(close_connections)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    def is_stalled(self):
+        """
+        Determine if abandoned calls occupy every thread.
+
+        """
+        return self._executor is not None \
+            and len(self._abandoned) >= self._max_workers
+
+    async def run(self, function, *args, idempotent=False, timeout=None):
+        """
+        Call a function that uses the ORM without blocking the event loop.
+
+        Transactions must begin and end within the function since successive
+        calls may be made in different threads.
+
+        Args:
+            function (callable): The function.
+            *args: Positional arguments passed to the function. Use
+                functools.partial() to pass keyword arguments.
+            idempotent (bool): Whether the call may safely be repeated if its
+                connection is lost.
+            timeout (float): The number of seconds after which the call is
+                abandoned. Unlimited if None. Ignored without threads.
+
+        Returns:
+            The function's return value.
+
+        Raises:
+            asyncio.TimeoutError: If the call was abandoned or the executor
+                is stalled.
+
+        """
+        if self._executor is None:
+            return function(*args)
+        if timeout is not None and self.is_stalled():
+            raise asyncio.TimeoutError()
+
+        loop = self._loop or asyncio.get_event_loop()
+        future = loop.run_in_executor(
+            self._executor,
+            self._call,
+            function,
+            args,
+            idempotent)
+        if timeout is None:
+            return await future
+
+        return await self.wait_for(future, timeout)
+
+    async def wait_for(self, future, timeout):
+        """
+        Wait for a call already made, abandoning it after a timeout.
+
+        Args:
+            future (asyncio.Future): The call, as made by run().
+            timeout (float): The number of seconds after which the call is
+                abandoned.
+
+        Returns:
+            The function's return value.
+
+        Raises:
+            asyncio.TimeoutError: If the call was abandoned.
+
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if self._executor is not None:
+                self._abandoned.add(future)
+                future.add_done_callback(self._abandoned.discard)
+            raise
@@ -0,0 +1,306 @@
+"""
+A Django admin command that delivers pending change events to their sinks.
+
+Due events are loaded in rounds of up to the batch size times the concurrency
+and split into batches. The batches of a round are delivered concurrently and
+each batch is delivered to every sink concurrently. A batch that every sink
+accepted is deleted in a single query. A batch that any sink rejected is
+postponed with an exponential backoff and delivered again, to every sink, by a
+later run. Rounds continue, in order of event ID, until no events are due.
+
+Events are deleted only after delivery so an interrupted worker delivers them
+again on its next run. Delivery is therefore at least once. Running a single
+worker at a time avoids most duplicates but workers do not coordinate.
+
+An event whose delivery failed DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS times is
+abandoned. It is no longer delivered but is kept, and counted after each round,
+until it is purged with the --purge-abandoned option.
+
+As in the run command, the queries of the delivering coroutines are made
+through a DatabaseExecutor so that they do not block the event loop.
+
+See:
+    django_docsnaps.events
+
+"""
+
+import asyncio
+import datetime
+import json
+import time
+
+import aiohttp
+import django.core.exceptions
+import django.core.management.base
+import django.db
+import django.db.models
+import django.utils.timezone
+
+import django_docsnaps.events
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+import django_docsnaps.routers
+import django_docsnaps.settings
+
+
+class Command(django.core.management.base.BaseCommand):
+
+    help = 'Delivers pending change events to the configured sinks.'
+
+    # The maximum number of seconds by which a failed delivery is postponed.
+    _max_retry_delay = 3600
+
+    # Set by handle() for the duration of the command. Every database query
+    # made by a coroutine passes through it when set.
+    _database = None
+
+    def _delete_events(self, change_events):
+        django_docsnaps.models.ChangeEvent.objects\
+            .filter(pk__in=[event.pk for event in change_events])\
+            .delete()
+
+    async def _deliver_batch(self, sinks, client_session, change_events):
+        """
+        Deliver a batch of events to every sink and record the outcome.
+
+        Args:
+            sinks (list): The sinks.
+            client_session (aiohttp.ClientSession): The session shared by
+                webhook sinks.
+            change_events (list): ChangeEvent model instances.
+
+        Returns:
+            bool: True if every sink accepted the batch.
+
+        """
+        events = []
+        for change_event in change_events:
+            event = json.loads(change_event.payload)
+            event['change_event_id'] = change_event.change_event_id
+            events.append(event)
+
+        results = await asyncio.gather(
+            *[sink.deliver(client_session, events) for sink in sinks],
+            return_exceptions=True)
+        errors = []
+        for sink, result in zip(sinks, results):
+            if isinstance(result, django_docsnaps.events.DeliveryError):
+                errors.append('{!s}: {!s}'.format(sink, result))
+            elif isinstance(result, Exception):
+                raise result
+
+        if errors:
+            await self._get_database().run(
+                self._postpone_events,
+                change_events,
+                '\n'.join(errors))
+        else:
+            await self._get_database().run(
+                self._delete_events,
+                change_events,
+                idempotent=True)
+
+        return not errors
+
+    async def _deliver_due_events(self, sinks, batch_size, concurrency):
+        """
+        Deliver rounds of due events until none remain.
+
+        Returns:
+            tuple: The number of events delivered and the number of events
+                whose delivery failed and was postponed.
+
+        """
+        delivered_count = 0
+        failed_count = 0
+        last_event_id = 0
+        async with aiohttp.ClientSession() as client_session:
+            while True:
+                change_events = await self._get_database().run(
+                    self._get_due_events,
+                    last_event_id,
+                    batch_size * concurrency,
+                    idempotent=True)
+                if not change_events:
+                    break
+                last_event_id = change_events[-1].change_event_id
+
+                batches = [
+                    change_events[start:start + batch_size]
+                    for start in range(0, len(change_events), batch_size)]
+                results = await asyncio.gather(*[
+                    self._deliver_batch(sinks, client_session, batch)
+                    for batch in batches])
+                for batch, is_delivered in zip(batches, results):
+                    if is_delivered:
+                        delivered_count += len(batch)
+                    else:
+                        failed_count += len(batch)
+
+        return delivered_count, failed_count
+
+    def _deliver_round(
+        self,
+        loop,
+        sinks,
+        batch_size,
+        concurrency,
+        purge_abandoned):
+        """
+        Deliver the due events and report the outcome and abandoned events.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        self.stdout.write('Delivering change events: ', ending='')
+        try:
+            delivered_count, failed_count = loop.run_until_complete(
+                self._deliver_due_events(sinks, batch_size, concurrency))
+            with django_docsnaps.routers.use_primary():
+                abandoned_events = self._get_abandoned_events()
+                if purge_abandoned:
+                    abandoned_count = abandoned_events.delete()[0]
+                else:
+                    abandoned_count = abandoned_events.count()
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+        status = self.style.SUCCESS('{!s} delivered'.format(delivered_count))
+        if failed_count:
+            status += ', ' + self.style.WARNING(
+                '{!s} postponed'.format(failed_count))
+        if abandoned_count and purge_abandoned:
+            status += ', {!s} abandoned purged'.format(abandoned_count)
+        elif abandoned_count:
+            status += ', ' + self.style.WARNING(
+                '{!s} abandoned'.format(abandoned_count))
+        self.stdout.write(status)
+
+    def _get_abandoned_events(self):
+        """
+        Get the events whose delivery will no longer be attempted.
+
+        """
+        return django_docsnaps.models.ChangeEvent.objects\
+            .filter(
+                attempts__gte=(
+                    django_docsnaps.settings\
+                        .DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS))
+
+    def _get_database(self):
+        """
+        Get the command's database executor or, outside of handle(), one that
+        makes calls directly.
+
+        """
+        return self._database or command_database.DatabaseExecutor()
+
+    def _get_due_events(self, last_event_id, limit):
+        """
+        Get the events after an ID that are due and have not been abandoned.
+
+        Events are read from the primary so that events deleted moments ago
+        are not read from a lagging replica. use_primary() is entered here
+        since the executor's threads do not inherit the caller's context.
+
+        """
+        with django_docsnaps.routers.use_primary():
+            return list(
+                django_docsnaps.models.ChangeEvent.objects\
+                    .filter(
+                        change_event_id__gt=last_event_id,
+                        attempts__lt=(
+                            django_docsnaps.settings\
+                                .DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS),
+                        next_attempt_datetime__lte=(
+                            django.utils.timezone.now()))\
+                    .order_by('change_event_id')\
+                    .only('change_event_id', 'payload', 'attempts')[:limit])
+
+    def _postpone_events(self, change_events, error):
+        """
+        Record a failed delivery and postpone the events' next attempt.
+
+        Events are updated with one query for each distinct number of previous
+        attempts, on which the delay depends.
+
+        """
+        event_ids = {}
+        for change_event in change_events:
+            event_ids.setdefault(change_event.attempts, []).append(
+                change_event.pk)
+
+        now = django.utils.timezone.now()
+        for attempts, ids in event_ids.items():
+            retry_delay = min(
+                django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_RETRY_DELAY
+                    * 2 ** attempts,
+                self._max_retry_delay)
+            django_docsnaps.models.ChangeEvent.objects\
+                .filter(pk__in=ids)\
+                .update(
+                    attempts=django.db.models.F('attempts') + 1,
+                    last_error=error,
+                    next_attempt_datetime=(
+                        now + datetime.timedelta(seconds=retry_delay)))
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-w', '--watch',
+            default=None,
+            help=(
+                'Keep delivering events, checking for due events every this '
+                'many seconds.'),
+            type=float)
+        parser.add_argument(
+            '--purge-abandoned',
+            action='store_true',
+            default=False,
+            help=(
+                'Delete the events whose delivery failed '
+                'DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS times.'))
+
+    def handle(self, *args, **options):
+        """
+        Deliver due events, once or repeatedly.
+
+        """
+        try:
+            sinks = django_docsnaps.events.get_sinks()
+        except django.core.exceptions.ImproperlyConfigured as exception:
+            command_utils.raise_command_error(self.stdout, exception)
+        if not sinks:
+            command_utils.raise_command_error(
+                self.stdout,
+                'No event sinks are configured in DJANGO_DOCSNAPS_EVENT_SINKS.')
+
+        batch_size = django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_BATCH_SIZE
+        concurrency = \
+            django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_CONCURRENCY
+        watch = options.get('watch')
+        purge_abandoned = options.get('purge_abandoned', False)
+        health_check_interval = \
+            django_docsnaps.settings.DJANGO_DOCSNAPS_DB_HEALTH_CHECK_INTERVAL
+        loop = asyncio.get_event_loop()
+        self._database = command_database.DatabaseExecutor(
+            max_workers=django_docsnaps.settings.DJANGO_DOCSNAPS_DB_THREADS,
+            health_check_interval=health_check_interval,
+            loop=loop)
+        try:
+            while True:
+                self._deliver_round(
+                    loop,
+                    sinks,
+                    batch_size,
+                    concurrency,
+                    purge_abandoned)
+                if watch is None:
+                    break
+                time.sleep(watch)
+        finally:
+            self._database.close()
+            self._database = None
@@ -0,0 +1,56 @@
+"""
+A Django admin command that hints that documents have changed.
+
+Marks the enabled jobs with the given URLs so that the next run checks them
+regardless of their poll intervals. Intended for local use and for scripts,
+such as feed readers, that can pipe changed URLs to the command.
+
+See:
+    django_docsnaps.hints
+
+"""
+
+import sys
+
+import django.core.management.base
+import django.db
+
+import django_docsnaps.hints
+import django_docsnaps.management.commands._utils as command_utils
+
+
+class Command(django.core.management.base.BaseCommand):
+
+    help = 'Marks the jobs of changed URLs to be checked by the next run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls',
+            help=(
+                'The URLs of changed documents. Pass "-" to read one URL per '
+                'line from standard input.'),
+            metavar='url',
+            nargs='+',
+            type=str)
+
+    def handle(self, *args, **options):
+        urls = []
+        for url in options.get('urls', []):
+            if url == '-':
+                urls.extend(sys.stdin.read().splitlines())
+            else:
+                urls.append(url)
+
+        self.stdout.write('Requesting fetches: ', ending='')
+        try:
+            job_count = django_docsnaps.hints.request_fetches(urls)
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
+        status = '{!s} jobs marked'.format(job_count)
+        if job_count:
+            self.stdout.write(self.style.SUCCESS(status))
+        else:
+            self.stdout.write(self.style.WARNING(status))
@@ -0,0 +1,232 @@
+"""
+A module that applies the database's ignore rules on behalf of the run command.
+
+Much of what looks like a document change is noise such as rotating CSRF tokens,
+timestamps, and session IDs in links. IgnoreRule records describe this noise
+once, for a single job or for every job using a module, so that plugins need
+not each re-implement scrubbing.
+
+Rules are loaded and compiled once per run. Each regex rule is compiled on its
+own, so that its inline flags and numbered backreferences mean what they do in
+IgnoreRule.clean(), and the rules are applied in turn. Jobs with identical
+rules share a single compiled IgnoreRuleSet. Selector rules remove matching
+HTML elements in a single pass of the standard library's incremental HTML
+parser.
+
+A rule whose pattern cannot be compiled, such as one saved before validation
+existed, is skipped for its jobs and reported. The run and the jobs' other
+rules are unaffected.
+
+Rules are applied to the decoded document before it is passed to the transform
+pipeline. Noise therefore never reaches plugins, stage cache lookups hit when
+only noise has changed, and the snapshot digest is unaffected. Documents large
+enough to be streamed are not scrubbed since a match may span chunk boundaries.
+
+"""
+
+import collections
+import html.parser
+import re
+
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+import django_docsnaps.transforms.html_content as html_content
+
+
+class IgnoreRuleSet:
+    """
+    The compiled ignore rules of a job.
+
+    Attributes:
+        invalid_patterns (list): (pattern, error message) tuples of the rules
+            that could not be compiled and are skipped.
+        version (string): A digest of the rules. Changes whenever the rules do
+            so that documents skipped as unchanged are scrubbed again.
+
+    """
+
+    def __init__(self, rules):
+        """
+        Compile the rules, skipping those that are invalid.
+
+        Args:
+            rules (iterable): IgnoreRule model instances.
+
+        """
+        regex_rule_type = django_docsnaps.models.IgnoreRule.RULE_TYPE_REGEX
+        patterns = sorted(set(
+            rule.pattern for rule in rules
+            if rule.rule_type == regex_rule_type))
+        selectors = sorted(set(
+            rule.pattern for rule in rules
+            if rule.rule_type != regex_rule_type))
+
+        self.invalid_patterns = []
+        self._regexes = []
+        for pattern in patterns:
+            try:
+                self._regexes.append(re.compile(pattern))
+            except re.error as exception:
+                self.invalid_patterns.append((pattern, str(exception)))
+        self._selectors = []
+        for selector in selectors:
+            try:
+                self._selectors.append(html_content.Selector(selector))
+            except ValueError as exception:
+                self.invalid_patterns.append((selector, str(exception)))
+        self.version = command_utils.get_digest(repr((patterns, selectors)))
+
+    def apply(self, doc_text):
+        """
+        Remove all noise matched by the rules from a document.
+
+        Args:
+            doc_text (string): The decoded document.
+
+        Returns:
+            string: The document without the matched elements and text.
+
+        """
+        if self._selectors:
+            stripper = _ElementStripper(self._selectors)
+            stripper.feed(doc_text)
+            stripper.close()
+            doc_text = stripper.get_text()
+        for regex in self._regexes:
+            doc_text = regex.sub('', doc_text)
+
+        return doc_text
+
+
+class _ElementStripper(html.parser.HTMLParser):
+    """
+    Reproduces an HTML document without the elements matching selectors.
+
+    Character references are not converted so that the rest of the document is
+    reproduced as it was received.
+
+    """
+
+    def __init__(self, selectors):
+        super().__init__(convert_charrefs=False)
+        self._output = []
+        self._selectors = selectors
+        self._skip_depth = None
+        self._stack = []
+
+    def _matches(self, tag, attrs):
+        attributes = dict(attrs)
+        return any(
+            selector.matches(tag, attributes) for selector in self._selectors)
+
+    def _write(self, text):
+        if self._skip_depth is None:
+            self._output.append(text)
+
+    def get_text(self):
+        return ''.join(self._output)
+
+    def handle_charref(self, name):
+        self._write('&#{!s};'.format(name))
+
+    def handle_comment(self, data):
+        self._write('<!--{!s}-->'.format(data))
+
+    def handle_data(self, data):
+        self._write(data)
+
+    def handle_decl(self, decl):
+        self._write('<!{!s}>'.format(decl))
+
+    def handle_endtag(self, tag):
+        try:
+            index = len(self._stack) - 1 - self._stack[::-1].index(tag)
+        except ValueError:
+            self._write('</{!s}>'.format(tag))
+            return
+        del self._stack[index:]
+
+        if self._skip_depth is not None and len(self._stack) < self._skip_depth:
+            self._skip_depth = None
+            return
+        self._write('</{!s}>'.format(tag))
+
+    def handle_entityref(self, name):
+        self._write('&{!s};'.format(name))
+
+    def handle_pi(self, data):
+        self._write('<?{!s}>'.format(data))
+
+    def handle_startendtag(self, tag, attrs):
+        if self._skip_depth is None and not self._matches(tag, attrs):
+            self._write(self.get_starttag_text())
+
+    def handle_starttag(self, tag, attrs):
+        if tag in html_content.VOID_ELEMENTS:
+            self.handle_startendtag(tag, attrs)
+            return
+
+        self._stack.append(tag)
+        if self._skip_depth is None and self._matches(tag, attrs):
+            self._skip_depth = len(self._stack)
+        self._write(self.get_starttag_text())
+
+    def unknown_decl(self, data):
+        self._write('<![{!s}]>'.format(data))
+
+
+def load_ignore_rules(jobs):
+    """
+    Load and compile the enabled ignore rules of each job.
+
+    Rules are queried once for all jobs. Each job's rules are its own and
+    those of every module in its transform pipeline. Each job's Transform
+    records are expected to have been prefetched.
+
+    Args:
+        jobs (iterable): DocumentsLanguages model instances.
+
+    Returns:
+        dict: IgnoreRuleSet instances keyed by documents_languages_id. Jobs
+            without rules are omitted.
+
+    Raises:
+        django.db.Error: If the query fails.
+
+    """
+    job_rules = collections.defaultdict(list)
+    module_rules = collections.defaultdict(list)
+    for rule in django_docsnaps.models.IgnoreRule.objects.filter(
+        is_enabled=True):
+        if rule.documents_languages_id_id is not None:
+            job_rules[rule.documents_languages_id_id].append(rule)
+        if rule.module:
+            module_rules[rule.module].append(rule)
+
+    if not (job_rules or module_rules):
+        return {}
+
+    rule_sets = {}
+    compiled = {}
+    for job in jobs:
+        module_names = set(
+            transform.module
+            for transform in job.document_id.transform_set.all())
+        module_names.add(job.document_id.module)
+
+        rules = {
+            rule.ignore_rule_id: rule
+            for rule in job_rules[job.documents_languages_id]}
+        for module_name in module_names:
+            rules.update(
+                (rule.ignore_rule_id, rule)
+                for rule in module_rules[module_name])
+        if not rules:
+            continue
+
+        key = frozenset(rules)
+        if key not in compiled:
+            compiled[key] = IgnoreRuleSet(rules.values())
+        rule_sets[job.documents_languages_id] = compiled[key]
+
+    return rule_sets
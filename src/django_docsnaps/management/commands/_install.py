@@ -25,6 +25,7 @@ import django.core.management.base
 
 import django_docsnaps.management.commands._utils as command_utils
 import django_docsnaps.models
+import django_docsnaps.routers
 
 
 class Command(django.core.management.base.BaseCommand):
@@ -77,7 +78,8 @@ class Command(django.core.management.base.BaseCommand):
         self.stdout.write('Attempting to load module data: ', ending='')
         command_error_message = None
         try:
-            with django.db.transaction.atomic():
+            with django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
                 for model in module.get_models():
                     model_loader = ModelLoader(
                         model,
@@ -103,6 +105,9 @@ class Command(django.core.management.base.BaseCommand):
         """
         Check module interface of imported module.
 
+        transform_many and transform_stream are optional but, if present, must
+        be callable.
+
         The goal in validating the module is not to attempt to circumvent
         Pythonic duck typing, but to generate helpful error messages for plugin
         developers.
@@ -129,6 +134,15 @@ class Command(django.core.management.base.BaseCommand):
                     module.__name__)
                 command_utils.raise_command_error(self.stdout, error_message)
 
+        optional_callables = ['transform_many', 'transform_stream']
+        for callable_name in optional_callables:
+            if (hasattr(module, callable_name)
+                and not callable(getattr(module, callable_name))):
+                error_message = '"{!s}" is not callable in {!s}.'.format(
+                    callable_name,
+                    module.__name__)
+                command_utils.raise_command_error(self.stdout, error_message)
+
         self.stdout.write(self.style.SUCCESS('success'))
 
     def _validate_module_models(self, module):
@@ -394,15 +408,16 @@ class ModelLoader:
             self.warnings.append(warning)
 
         # Transform
-        # transform, created = django_docsnaps.models.Transform.objects\
-            # .get_or_create(
-                # document_id=document,
-                # module=self._module_name)
-        # if not created:
-            # self.warnings.append(
-                # transform.__class__.__name__ + ': '
-                # 'Module ' + self._module_name + ' already registered '
-                # 'transform for ' + str(document) + '.')
+        # The installing module is registered as the first pipeline stage.
+        transform, created = django_docsnaps.models.Transform.objects\
+            .get_or_create(
+                document_id=document,
+                module=new_document.module)
+        if not created:
+            self.warnings.append(
+                transform.__class__.__name__ + ': '
+                'Module ' + new_document.module + ' already registered '
+                'transform for ' + str(document) + '.')
 
         self.load_successful = True
 
@@ -0,0 +1,189 @@
+"""
+A Django admin command that loads the snapshots spooled by runs.
+
+Reads the spool file locked against concurrent runs, loads its snapshots in
+order, and empties it. A spooled snapshot is skipped if its write was recorded
+as committed, if a snapshot of its job already exists at its datetime, or if
+the job's previous snapshot has the same digest. A replay interrupted before
+the spool was emptied may therefore be repeated without duplicating snapshots.
+
+See:
+    django_docsnaps.management.commands._spool
+
+"""
+
+import fcntl
+import os
+
+import django.core.management.base
+import django.db
+import django.utils.dateparse
+import django.utils.timezone
+
+import django_docsnaps.events
+import django_docsnaps.management.commands._spool as command_spool
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+import django_docsnaps.routers
+import django_docsnaps.settings
+import django_docsnaps.views
+
+
+class Command(django.core.management.base.BaseCommand):
+
+    help = 'Loads the snapshots spooled by runs into the database.'
+
+    # The number of snapshots loaded in each transaction.
+    _batch_size = 100
+
+    def _load_record(self, record, job):
+        """
+        Insert a spooled snapshot unless it has already been loaded.
+
+        The snapshot's date and time fields are set after its insertion since
+        they are updated automatically on save.
+
+        Args:
+            record (dict): The spooled snapshot record.
+            job (django_docsnaps.models.DocumentsLanguages): The snapshot's job,
+                with its document loaded, or None if the job was deleted.
+
+        Returns:
+            bool: True if the snapshot was inserted.
+
+        """
+        if job is None:
+            return False
+
+        snapshot_datetime = django.utils.dateparse.parse_datetime(
+            record['datetime'])
+        previous_snapshot = django_docsnaps.models.Snapshot.objects\
+            .filter(
+                documents_languages_id=job,
+                datetime__lte=snapshot_datetime)\
+            .order_by('-datetime')\
+            .values_list('datetime', 'digest')\
+            .first()
+        if previous_snapshot is not None \
+            and (previous_snapshot[0] == snapshot_datetime
+                or previous_snapshot[1] == record['digest']):
+            return False
+
+        snapshot = django_docsnaps.models.Snapshot(
+            changed_ratio=record['changed_ratio'],
+            digest=record['digest'],
+            documents_languages_id=job,
+            hunks=record['hunks'],
+            lines_added=record['lines_added'],
+            lines_removed=record['lines_removed'],
+            simhash=record['simhash'],
+            text=record['text'])
+        snapshot.save()
+
+        local_datetime = snapshot_datetime
+        if django.utils.timezone.is_aware(snapshot_datetime):
+            local_datetime = django.utils.timezone.localtime(snapshot_datetime)
+        snapshot.date = local_datetime.date()
+        snapshot.time = local_datetime.time()
+        snapshot.datetime = snapshot_datetime
+        django_docsnaps.models.Snapshot.objects\
+            .filter(pk=snapshot.pk)\
+            .update(
+                date=snapshot.date,
+                time=snapshot.time,
+                datetime=snapshot.datetime)
+        django_docsnaps.events.create_change_event(snapshot)
+
+        return True
+
+    def _load_records(self, records):
+        """
+        Load the spooled snapshots whose writes were not committed.
+
+        Args:
+            records (list): The spool's records, in order.
+
+        Returns:
+            tuple: The numbers of loaded and skipped snapshots.
+
+        """
+        committed_ids = {
+            record['id'] for record in records
+            if record.get('type') == 'committed'}
+        snapshot_records = [
+            record for record in records
+            if record.get('type') == 'snapshot'
+            and record['id'] not in committed_ids]
+        jobs = django_docsnaps.models.DocumentsLanguages.objects\
+            .select_related('document_id')\
+            .in_bulk({
+                record['documents_languages_id']
+                for record in snapshot_records})
+
+        loaded_count = 0
+        loaded_jobs = set()
+        skipped_count = 0
+        for start in range(0, len(snapshot_records), self._batch_size):
+            with django_docsnaps.routers.use_primary(), \
+                django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
+                for record in snapshot_records[start:start + self._batch_size]:
+                    job = jobs.get(record['documents_languages_id'])
+                    if self._load_record(record, job):
+                        loaded_jobs.add(job)
+                        loaded_count += 1
+                    else:
+                        skipped_count += 1
+
+        for job in loaded_jobs:
+            django_docsnaps.views.invalidate_latest_snapshot(job)
+
+        return loaded_count, skipped_count
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help=(
+                'The path of the spool file. Defaults to '
+                'DJANGO_DOCSNAPS_SPOOL_PATH.'),
+            type=str)
+
+    def handle(self, *args, **options):
+        path = options.get('path') \
+            or django_docsnaps.settings.DJANGO_DOCSNAPS_SPOOL_PATH
+        if not path:
+            command_utils.raise_command_error(
+                self.stdout,
+                'No spool path was given and DJANGO_DOCSNAPS_SPOOL_PATH is '
+                'not set.')
+
+        self.stdout.write('Replaying spool: ', ending='')
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING('no spool file'))
+            return
+
+        with open(path, 'r+b') as spool_file:
+            fcntl.flock(spool_file, fcntl.LOCK_EX)
+            try:
+                records, trailing_length = command_spool.read_records(
+                    spool_file)
+                try:
+                    loaded_count, skipped_count = self._load_records(records)
+                except django.db.Error as exception:
+                    command_utils.raise_command_error(
+                        self.stdout,
+                        'A database error occurred: ' + str(exception))
+                spool_file.truncate(0)
+                spool_file.flush()
+                os.fsync(spool_file.fileno())
+            finally:
+                fcntl.flock(spool_file, fcntl.LOCK_UN)
+
+        self.stdout.write(self.style.SUCCESS(
+            '{!s} snapshots loaded, {!s} skipped'.format(
+                loaded_count,
+                skipped_count)))
+        if trailing_length:
+            self.stdout.write(self.style.WARNING(
+                'Discarded {!s} bytes of an incomplete record.'.format(
+                    trailing_length)))
@@ -18,32 +18,88 @@ TODO: Remove database exception handling? handlers don't do anything but throw
 """
 
 import asyncio
+import collections
+import datetime
+import functools
+import hashlib
 import importlib
+import json
+import tempfile
 
 import aiohttp
 import django.conf
 import django.core.management.base
 import django.db
+import django.utils.timezone
 
+import django_docsnaps.diff
+import django_docsnaps.events
+import django_docsnaps.fingerprints
 import django_docsnaps.models
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._ignore as command_ignore
+import django_docsnaps.management.commands._spool as command_spool
+import django_docsnaps.management.commands._transform as command_transform
 import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.routers
 import django_docsnaps.settings
+import django_docsnaps.views
+
+
+# The undecoded body of a fetched document and the charset, if any, that the
+# server declared in the response's Content-Type header. fresh_until is when the
+# response stops being fresh or None if it declared no freshness lifetime.
+DocumentResponse = collections.namedtuple(
+    'DocumentResponse',
+    ['body', 'charset', 'fresh_until'],
+    defaults=[None])
+
+# A fetched document whose body was streamed to a temporary file rather than
+# read into memory. digest is the SHA-256 hex digest of the body.
+DocumentFile = collections.namedtuple(
+    'DocumentFile',
+    ['body_file', 'charset', 'digest', 'fresh_until', 'size'],
+    defaults=[None, None])
 
 
 class Command(django.core.management.base.BaseCommand):
 
     help = 'Executes active jobs and saves snapshots of changed documents.'
 
-    def _get_active_jobs(self):
+    # Set for the duration of a run by _execute_enabled_jobs(). Every request
+    # issued by _request_document() passes through it when set.
+    _request_limiter = None
+
+    # Set for the duration of a run by _execute_enabled_jobs(). Every database
+    # query made by a coroutine passes through it when set.
+    _database = None
+
+    # Set for the duration of a run by _execute_enabled_jobs() when
+    # DJANGO_DOCSNAPS_SPOOL_PATH is set.
+    _spool = None
+
+    def _get_active_jobs(self, force=False, run=None):
         """
-        Query the database for active snapshot jobs.
+        Query the database for active snapshot jobs that are due.
 
         Each DocumentsLanguages record corresponds to a snpashot "job." Each job
         may have zero or more Snapshot records which are queried and returned
         in a separate method.
 
+        Each job's Document and its Transform records, in execution order, are
+        loaded with the jobs rather than queried separately for each job.
+
+        An enabled job is due if a fetch has been requested for it by a hint.
+        Otherwise, it is not due while its last response is fresh or until its
+        poll interval has elapsed since it was last checked.
+
+        Args:
+            force (bool): Whether every enabled job is due.
+            run (django_docsnaps.models.Run): A resumed run, whose checkpointed
+                jobs are excluded.
+
         Returns:
-            iterable: When not empty, elements are DocumentsLanguages model
+            list: When not empty, elements are DocumentsLanguages model
             instances.
 
         Raises:
@@ -52,20 +108,93 @@ class Command(django.core.management.base.BaseCommand):
 
         See:
             https://docs.djangoproject.com/en/dev/topics/db/sql/#adding-annotations
+            django_docsnaps.hints
 
         """
         self.stdout.write('Querying enabled snapshot jobs: ', ending='')
 
         try:
             docsnaps_set = django_docsnaps.models.DocumentsLanguages.objects\
-                .filter(is_enabled=True)
+                .filter(is_enabled=True)\
+                .select_related('document_id')\
+                .prefetch_related(
+                    django.db.models.Prefetch(
+                        'document_id__transform_set',
+                        queryset=django_docsnaps.models.Transform.objects\
+                            .order_by('execution_priority')))
+            if run is not None:
+                docsnaps_set = docsnaps_set.exclude(runcheckpoint__run_id=run)
+            now = django.utils.timezone.now()
+            due_jobs = [
+                job for job in docsnaps_set
+                if force or self._is_due(job, now)]
         except django.db.Error as exception:
             command_utils.raise_command_error(
                 self.stdout,
                 'A database error occurred: ' + str(exception))
 
         self.stdout.write(self.style.SUCCESS('success'))
-        return docsnaps_set
+        return due_jobs
+
+    def _get_resumable_run(self):
+        """
+        Query the database for the latest run if it is unfinished.
+
+        The primary is queried so that no checkpoint is missed.
+
+        Returns:
+            django_docsnaps.models.Run: The run or None.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        try:
+            with django_docsnaps.routers.use_primary():
+                run = django_docsnaps.models.Run.objects.latest()
+        except django_docsnaps.models.Run.DoesNotExist:
+            return None
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
+        if run.finished_datetime is not None:
+            return None
+
+        return run
+
+    def _get_database(self):
+        """
+        Get the run's database executor or, outside of a run, one that makes
+        calls directly.
+
+        """
+        return self._database or command_database.DatabaseExecutor()
+
+    def _get_fresh_until(self, headers):
+        """
+        Get when a response stops being fresh.
+
+        The freshness lifetime declared by the response is capped by
+        DJANGO_DOCSNAPS_MAX_FRESHNESS.
+
+        Args:
+            headers: The response's headers.
+
+        Returns:
+            datetime.datetime: The datetime or None if the response is not
+                fresh or freshness is disabled.
+
+        """
+        max_freshness = django_docsnaps.settings.DJANGO_DOCSNAPS_MAX_FRESHNESS
+        now = django.utils.timezone.now()
+        lifetime = command_utils.get_freshness_lifetime(headers, now=now)
+        if not lifetime or not max_freshness:
+            return None
+
+        return now + datetime.timedelta(seconds=min(lifetime, max_freshness))
 
     async def _get_latest_snapshots(self):
         """
@@ -93,9 +222,14 @@ class Command(django.core.management.base.BaseCommand):
         raw(), I can get the simple integer documents_languages_id without
         loading an entire DocumentsLanguages instance data from the database.
 
+        The text field is deliberately omitted from the SELECT. The ORM defers
+        it and only loads it if accessed. Changes are detected by comparing
+        digests and fingerprints so the text of most snapshots is never
+        needed.
+
         Returns:
-            dict: A dictionary of the latest Snapshot text for each
-            Documentslanguages record, keyed by the snapshot's
+            dict: A dictionary of the latest Snapshot, with deferred text, for
+            each Documentslanguages record, keyed by the snapshot's
             documents_languages_id.
 
         """
@@ -106,7 +240,8 @@ class Command(django.core.management.base.BaseCommand):
                 ,{Snapshot}.date
                 ,{Snapshot}.time
                 ,{Snapshot}.datetime
-                ,{Snapshot}.text
+                ,{Snapshot}.digest
+                ,{Snapshot}.simhash
                 ,{Snapshot}.documents_languages_id AS raw_documents_languages_id
             FROM
                 {Snapshot}
@@ -124,24 +259,57 @@ class Command(django.core.management.base.BaseCommand):
             DocumentsLanguages=dl_db_table,
             Snapshot=s_db_table)
 
-        try:
+        def query_snapshots():
             snapshot_set = django_docsnaps.models.Snapshot.objects.raw(
                 snapshot_sql)
+            return {
+                snapshot.raw_documents_languages_id: snapshot \
+                for snapshot in snapshot_set}
+
+        try:
+            snapshot_dict = await self._get_database().run(
+                query_snapshots,
+                idempotent=True)
         except django.db.Error as exception:
             command_utils.raise_command_error(
                 self.stdout,
                 'A database error occurred: ' + str(exception))
 
-        snapshot_dict = {
-            snapshot.raw_documents_languages_id: snapshot \
-            for snapshot in snapshot_set}
-
         return snapshot_dict
 
-    async def _execute_single_job(self, job, client_session, snapshot=None):
+    async def _execute_single_job(
+        self,
+        job,
+        client_session,
+        snapshot=None,
+        context=None,
+        batcher=None,
+        stage_cache=None,
+        ignore_rules=None):
         """
         Execute a single snapshot job.
 
+        The plugin module's transform is skipped entirely when the raw response
+        body and the module version both match those recorded on the job by
+        the previous run. Most fetched documents are byte-identical from run to
+        run and transforms, usually HTML parsing, dominate the run's CPU time.
+
+        The transformed text's digest is compared to the latest snapshot's.
+        Identical text is never saved as a new snapshot, regardless of what the
+        plugin reports. When the job has a similarity threshold, text whose
+        fingerprint is within the threshold of the latest snapshot's is not
+        saved either.
+
+        The job's ignore rules, if any, are applied to the decoded document
+        before it is transformed. Their version is recorded with the module
+        version so that a change to the rules invalidates the skip above.
+
+        When the job's single plugin module implements the streaming
+        interface, the response is streamed to a temporary file. Responses
+        larger than DJANGO_DOCSNAPS_STREAM_THRESHOLD are handed off to
+        _execute_streaming_job(), without ignore rules. Smaller responses are
+        read back into memory and processed as any other.
+
         Args:
             job (django_docsnaps.models.DocumentsLanguages): A
                 DocumentsLanguages model instance. This model class represents
@@ -152,55 +320,630 @@ class Command(django.core.management.base.BaseCommand):
             snapshot (django_docsnaps.models.Snapshot): The latest
                 Snapshot record created by the job. When None, no Snapshot
                 record yet exists.
+            context (django_docsnaps.management.commands._transform.TransformContext):
+                The run's resources shared with plugin transforms. Created from
+                client_session if None.
+            batcher (django_docsnaps.management.commands._transform.TransformBatcher):
+                The run's transform batcher. Documents are transformed one at a
+                time if None.
+            stage_cache (django_docsnaps.management.commands._transform.StageCache):
+                The run's pipeline stage cache. Stages are always run if None.
+            ignore_rules (django_docsnaps.management.commands._ignore.IgnoreRuleSet):
+                The job's compiled ignore rules or None.
 
         """
-        doc_text = await self._request_document(client_session, job.url)
-        job_module = self._import_job_module(job)
-        transformed_doc_text, doc_is_changed = job_module.transform(doc_text)
-        if doc_is_changed:
-            await self._save_new_snapshot(job, transformed_doc_text)
+        if context is None:
+            context = command_transform.TransformContext(
+                client_session,
+                self._request_limiter,
+                self._request_document)
+
+        stages = self._import_job_pipeline(job)
+        module_version = command_transform.get_pipeline_version(stages)
+        previous = None
+        if snapshot:
+            previous = command_transform.PreviousSnapshot(snapshot)
+            if not previous.has_fingerprints:
+                await self._get_database().run(
+                    previous.load_fingerprints,
+                    idempotent=True)
+
+        if len(stages) == 1 and command_transform.is_streaming(stages[0][0]):
+            document_file = await self._request_document_file(
+                client_session,
+                job.url)
+            if document_file.size is None or document_file.size \
+                > django_docsnaps.settings.DJANGO_DOCSNAPS_STREAM_THRESHOLD:
+                await self._execute_streaming_job(
+                    job,
+                    stages[0][0],
+                    module_version,
+                    document_file,
+                    previous=previous,
+                    context=context)
+                return
+            with document_file.body_file as body_file:
+                document_response = DocumentResponse(
+                    body=body_file.read(),
+                    charset=document_file.charset,
+                    fresh_until=document_file.fresh_until)
+        else:
+            document_response = await self._request_document(
+                client_session,
+                job.url)
+
+        if ignore_rules:
+            module_version = command_utils.get_digest(
+                module_version + ignore_rules.version)
+
+        job.fresh_until_datetime = document_response.fresh_until
+        response_digest = command_utils.get_digest(document_response.body)
+        if self._is_response_unchanged(job, response_digest, module_version):
+            # Do something here. Status message.
+            return
+
+        doc_text = await self._decode_document(job, document_response)
+        if ignore_rules:
+            doc_text = ignore_rules.apply(doc_text)
+        transformed_doc_text, doc_is_changed = \
+            await command_transform.transform_pipeline(
+                stages,
+                doc_text,
+                previous=previous,
+                context=context,
+                batcher=batcher,
+                stage_cache=stage_cache)
+
+        snapshot_digest = command_utils.get_digest(transformed_doc_text)
+        if self._is_snapshot_changed(previous, snapshot_digest, doc_is_changed):
+            # Fingerprinting is pure Python and linear in the text's length
+            # so it is kept off the event loop, as is diffing.
+            snapshot_simhash = await asyncio.get_event_loop().run_in_executor(
+                None,
+                django_docsnaps.fingerprints.simhash,
+                transformed_doc_text)
+            if self._is_near_duplicate(job, previous, snapshot_simhash):
+                self._report_near_duplicate(job, previous, snapshot_simhash)
+            else:
+                await self._save_new_snapshot(
+                    job,
+                    transformed_doc_text,
+                    digest=snapshot_digest,
+                    simhash=snapshot_simhash,
+                    previous=previous)
         else:
             # Do something here. Status message.
             pass
 
-    async def _execute_enabled_jobs(self, active_jobs, loop=None):
+        await self._try_database(
+            job,
+            'response digest',
+            self._save_job_response,
+            job,
+            response_digest,
+            module_version,
+            idempotent=True)
+
+    async def _execute_streaming_job(
+        self,
+        job,
+        job_module,
+        module_version,
+        document_file,
+        previous=None,
+        context=None):
+        """
+        Execute a snapshot job whose plugin module transforms streams.
+
+        Peak memory use is independent of document size until a changed
+        snapshot is inserted. The response body has been streamed to a
+        temporary file while being hashed, so the unchanged response check
+        costs no more than in _execute_single_job(). The body is then decoded
+        incrementally and passed to the plugin in chunks. The plugin's output
+        chunks are hashed and fingerprinted as they are written to a second
+        temporary file. Only if the digest differs from the latest
+        snapshot's and the output is not a near-duplicate is the file read to
+        insert a new snapshot.
+
+        The body is decoded with the declared or cached charset and with
+        replacement of undecodable bytes since a failure cannot be detected
+        until the plugin has already consumed part of the document. Detection,
+        when needed, stops as soon as chardet is confident.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): A
+                DocumentsLanguages model instance. This model class represents
+                a snapshot job on which is_enabled=True.
+            job_module: The job's imported plugin module.
+            module_version (string): The plugin module's version.
+            document_file (DocumentFile): The fetched document, which is
+                closed once the job is done.
+            previous (django_docsnaps.management.commands._transform.PreviousSnapshot):
+                The job's latest snapshot or None.
+            context (django_docsnaps.management.commands._transform.TransformContext):
+                The run's resources shared with plugin transforms.
+
+        """
+        chunk_size = django_docsnaps.settings.DJANGO_DOCSNAPS_STREAM_CHUNK_SIZE
+        job.fresh_until_datetime = document_file.fresh_until
+
+        with document_file.body_file as body_file, \
+            tempfile.TemporaryFile('w+', encoding='utf-8') as text_file:
+            if self._is_response_unchanged(
+                job,
+                document_file.digest,
+                module_version):
+                # Do something here. Status message.
+                return
+
+            charset = None
+            for candidate in (document_file.charset, job.charset):
+                if command_utils.is_known_charset(candidate):
+                    charset = candidate
+                    break
+            if charset is None:
+                charset = command_utils.detect_file_charset(
+                    body_file,
+                    chunk_size)
+                if charset != job.charset:
+                    job.charset = charset
+                    await self._try_database(
+                        job,
+                        'detected charset',
+                        functools.partial(job.save, update_fields=['charset']),
+                        idempotent=True)
+
+            snapshot_digest, snapshot_simhash = \
+                await command_transform.transform_stream(
+                    job_module,
+                    command_utils.iter_decoded_chunks(
+                        body_file,
+                        charset,
+                        chunk_size),
+                    text_file,
+                    previous=previous,
+                    context=context)
+
+            if self._is_snapshot_changed(previous, snapshot_digest, None):
+                if self._is_near_duplicate(job, previous, snapshot_simhash):
+                    self._report_near_duplicate(
+                        job,
+                        previous,
+                        snapshot_simhash)
+                else:
+                    text_file.seek(0)
+                    await self._save_new_snapshot_stream(
+                        job,
+                        text_file,
+                        snapshot_digest,
+                        snapshot_simhash)
+            else:
+                # Do something here. Status message.
+                pass
+
+        await self._try_database(
+            job,
+            'response digest',
+            self._save_job_response,
+            job,
+            document_file.digest,
+            module_version,
+            idempotent=True)
+
+    async def _decode_document(self, job, document_response):
+        """
+        Decode the fetched document's body into text.
+
+        The charset declared by the server is always preferred. When the server
+        omits it, the charset cached on the job from a previous run is tried
+        before falling back to chardet. Detection is expensive so, once run,
+        its result is saved on the job and detection is only repeated if
+        decoding with the cached charset fails.
+
+        Decoding and detection run in the loop's default executor rather than
+        on the event loop or in a database thread. Saving the detected charset
+        is best-effort.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): A
+                DocumentsLanguages model instance. This model class represents
+                a snapshot job on which is_enabled=True.
+            document_response (DocumentResponse): The fetched document.
+
+        Returns:
+            string: The decoded document text.
+
+        """
+        doc_text, charset, detected = \
+            await asyncio.get_event_loop().run_in_executor(
+                None,
+                command_utils.decode_body,
+                document_response.body,
+                (document_response.charset, job.charset))
+        if detected and charset != job.charset:
+            job.charset = charset
+            await self._try_database(
+                job,
+                'detected charset',
+                functools.partial(job.save, update_fields=['charset']),
+                idempotent=True)
+
+        return doc_text
+
+    async def _execute_enabled_jobs(self, active_jobs, loop=None, run=None):
         """
         Execute each job in the passed iterable of snapshot jobs.
 
         This method manages the creation of coroutines, task objects, task
-        scheduling, and the creation of the aiohttp session.
+        scheduling, and the creation of the aiohttp session and the request
+        limiter. Both are shared with plugin transforms through a single
+        TransformContext so that sub-document requests issued by plugins are
+        subject to the same limits as the jobs' own requests.
 
         Defined in own function to reduce nested block levels in the handle()
         method. In addition, I find it more semantic to separate domain logic
         from generic argparse interface methods such as handle().
 
-        Defined as a coroutine to shut aiohttp up. aiohttp apparently issues
-        warnings directly to stdout when one tries to use a ClientSession
-        while loop is not running. I have yet to find documentation on the
-        technical reasons for this requirement.
+        Defined as a coroutine since aiohttp 3 requires that a ClientSession
+        be created with the loop running and closed with "async with". The
+        session uses the running loop.
+
+        As jobs complete without an exception, they are checkpointed in
+        batches of DJANGO_DOCSNAPS_CHECKPOINT_BATCH_SIZE. Each batch's checked
+        datetimes are updated, and the fetches requested for its jobs before
+        the jobs started are cleared, in the checkpoint's transaction.
+
+        The run's database queries are made through a DatabaseExecutor, which
+        is closed once the jobs are done, after every spooled snapshot, if any,
+        has been synced to disk.
 
         Args:
             active_jobs (iterable): An iterable of DocumentsLanguages model
                 instances representing records in which is_enabled is True.
+            run (django_docsnaps.models.Run): The run to which the completed
+                jobs are checkpointed. When None, checked jobs are saved
+                without checkpoints.
 
         """
         if not loop:
             loop = asyncio.get_event_loop()
 
+        self._database = command_database.DatabaseExecutor(
+            max_workers=django_docsnaps.settings.DJANGO_DOCSNAPS_DB_THREADS,
+            health_check_interval=(
+                django_docsnaps.settings.DJANGO_DOCSNAPS_DB_HEALTH_CHECK_INTERVAL),
+            loop=loop)
+        if django_docsnaps.settings.DJANGO_DOCSNAPS_SPOOL_PATH:
+            self._spool = command_spool.Spool(
+                django_docsnaps.settings.DJANGO_DOCSNAPS_SPOOL_PATH,
+                loop=loop)
+        try:
+            return await self._execute_jobs(active_jobs, loop, run)
+        finally:
+            if self._spool is not None:
+                await self._spool.close()
+                self._spool = None
+            self._database.close()
+            self._database = None
+
+    async def _execute_jobs(self, active_jobs, loop, run):
+        """
+        Execute the jobs with the run's database executor.
+
+        See:
+            _execute_enabled_jobs
+
+        """
+        started_datetime = django.utils.timezone.now()
+        batch_size = \
+            django_docsnaps.settings.DJANGO_DOCSNAPS_CHECKPOINT_BATCH_SIZE
         snapshots = await self._get_latest_snapshots()
+        try:
+            ignore_rules = await self._database.run(
+                self._load_ignore_rules,
+                active_jobs,
+                idempotent=True)
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+        self._report_invalid_ignore_rules(ignore_rules)
+
+        self._request_limiter = command_utils.RequestLimiter(
+            max_requests=django_docsnaps.settings.DJANGO_DOCSNAPS_MAX_REQUESTS,
+            max_host_requests=(
+                django_docsnaps.settings.DJANGO_DOCSNAPS_MAX_HOST_REQUESTS),
+            host_delay=django_docsnaps.settings.DJANGO_DOCSNAPS_HOST_REQUEST_DELAY,
+            loop=loop)
+        try:
+            async with aiohttp.ClientSession() as client_session:
+                context = command_transform.TransformContext(
+                    client_session,
+                    self._request_limiter,
+                    self._request_document)
+                batcher = command_transform.TransformBatcher(
+                    django_docsnaps.settings.DJANGO_DOCSNAPS_TRANSFORM_BATCH_SIZE,
+                    django_docsnaps.settings.DJANGO_DOCSNAPS_TRANSFORM_BATCH_DELAY,
+                    context=context,
+                    loop=loop)
+                stage_cache = command_transform.StageCache(
+                    database=self._database,
+                    loop=loop,
+                    timeout=self._get_write_timeout())
+                checkpoint_jobs = []
+                checkpoint_tasks = []
+
+                def checkpoint(task):
+                    if task.cancelled() or task.exception() is not None:
+                        return
+                    checkpoint_jobs.append(tasks[task])
+                    if len(checkpoint_jobs) >= batch_size:
+                        checkpoint_tasks.append(loop.create_task(
+                            self._checkpoint_jobs(
+                                run,
+                                checkpoint_jobs[:],
+                                started_datetime)))
+                        del checkpoint_jobs[:]
+
+                tasks = {}
+                for job in active_jobs:
+                    snapshot = snapshots.get(job.documents_languages_id, None)
+                    task = loop.create_task(
+                        self._execute_single_job(
+                            job,
+                            client_session,
+                            snapshot=snapshot,
+                            context=context,
+                            batcher=batcher,
+                            stage_cache=stage_cache,
+                            ignore_rules=ignore_rules.get(
+                                job.documents_languages_id)))
+                    task.add_done_callback(checkpoint)
+                    tasks[task] = job
+
+                await asyncio.wait(list(tasks))
+        finally:
+            self._request_limiter = None
+
+        failed_count = self._report_failed_jobs(tasks)
+        checkpoint_tasks.append(
+            self._checkpoint_jobs(run, checkpoint_jobs, started_datetime))
+        await asyncio.gather(*checkpoint_tasks)
+        await self._prune_stage_cache(stage_cache)
+
+        return failed_count
+
+    async def _checkpoint_jobs(self, run, jobs, requested_before):
+        """
+        Checkpoint completed jobs and save them as checked in a transaction.
+
+        Args:
+            run (django_docsnaps.models.Run): The run, or None.
+            jobs (list): DocumentsLanguages model instances.
+            requested_before (datetime.datetime): When the jobs started.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        try:
+            await self._database.run(
+                functools.partial(
+                    self._save_checkpoint,
+                    run,
+                    jobs,
+                    requested_before),
+                idempotent=True,
+                timeout=self._get_write_timeout())
+        except (asyncio.TimeoutError, django.db.Error) as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: '
+                + (str(exception) or 'the write timed out.'))
+
+    def _insert_snapshot(self, new_snapshot):
+        """
+        Insert a new snapshot and its change event in a transaction.
+
+        """
+        with django.db.transaction.atomic(
+                using=django_docsnaps.routers.get_primary_alias()):
+            new_snapshot.save()
+            django_docsnaps.events.create_change_event(new_snapshot)
+
+    def _insert_snapshot_stream(self, new_snapshot, text_file):
+        """
+        Insert a new snapshot, with its text read from a file, and its change
+        event in a transaction.
+
+        The text is inserted by a single parameterized query. Appending it in
+        chunks would instead rewrite the growing value once per chunk. The text
+        is released once inserted.
+
+        """
+        new_snapshot.text = text_file.read()
+        try:
+            with django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
+                new_snapshot.save()
+                django_docsnaps.events.create_change_event(new_snapshot)
+        finally:
+            new_snapshot.text = None
+
+    async def _invalidate_latest_snapshot(self, job):
+        """
+        Remove the job's cached latest snapshots once a new one is saved.
+
+        The cache backend is called synchronously so the call is made through
+        the database executor. Readers see a stale snapshot until the cache
+        timeout if the call times out during a run with a spool.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+
+        """
+        try:
+            await self._get_database().run(
+                django_docsnaps.views.invalidate_latest_snapshot,
+                job,
+                idempotent=True,
+                timeout=self._get_write_timeout())
+        except asyncio.TimeoutError:
+            self.stdout.write(self.style.WARNING(
+                'The cached latest snapshot of job {!s} could not be '
+                'invalidated: the call timed out.'.format(
+                    job.documents_languages_id)))
+
+    def _is_due(self, job, now):
+        """
+        Determine whether a job should be checked by the current run.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+            now (datetime.datetime): The datetime of the run.
+
+        Returns:
+            bool: True if a fetch was requested or, if the last response is
+                no longer fresh, the job has no poll interval, has never been
+                checked, or the interval has elapsed.
+
+        """
+        if job.fetch_requested_datetime is not None:
+            return True
+        if job.fresh_until_datetime is not None \
+            and job.fresh_until_datetime > now:
+            return False
+        if job.poll_interval is None \
+            or job.checked_datetime is None:
+            return True
+
+        return job.checked_datetime \
+            + datetime.timedelta(seconds=job.poll_interval) <= now
+
+    def _load_ignore_rules(self, active_jobs):
+        """
+        Load and compile the ignore rules of the active jobs.
+
+        Args:
+            active_jobs (iterable): An iterable of DocumentsLanguages model
+                instances representing records in which is_enabled is True.
+
+        Returns:
+            dict: IgnoreRuleSet instances keyed by documents_languages_id.
+
+        Raises:
+            django.db.Error: If exception is raised by underlying database
+                library. It is left to the calling coroutine to report since
+                this method is called in the run's database threads.
+
+        """
+        return command_ignore.load_ignore_rules(active_jobs)
+
+    def _is_response_unchanged(self, job, response_digest, module_version):
+        """
+        Determine if the job's response and plugin are unchanged since last run.
+
+        A byte-identical body transformed by the same module version cannot
+        produce a different snapshot so decoding and transforming are skipped.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+            response_digest (string): The digest of the fetched body.
+            module_version (string): The version of the job's plugin module.
+
+        Returns:
+            bool: True if both match the values saved by the previous run.
+
+        """
+        return (
+            job.response_digest == response_digest
+            and job.module_version == module_version)
+
+    def _is_snapshot_changed(self, previous, snapshot_digest, doc_is_changed):
+        """
+        Decide whether transformed text warrants a new snapshot.
+
+        Text identical to the latest snapshot is never saved. Otherwise, the
+        plugin's is_changed flag is respected if it returned one.
+
+        Args:
+            previous (django_docsnaps.management.commands._transform.PreviousSnapshot):
+                The job's latest snapshot or None.
+            snapshot_digest (string): The digest of the transformed text.
+            doc_is_changed (bool): The plugin's flag or None.
+
+        Returns:
+            bool: True if a new snapshot should be saved.
+
+        """
+        if previous and previous.digest == snapshot_digest:
+            return False
+
+        return doc_is_changed is None or bool(doc_is_changed)
+
+    def _is_near_duplicate(self, job, previous, snapshot_simhash):
+        """
+        Determine if changed text is too similar to the latest snapshot to save.
+
+        Only the fingerprints are compared, in constant time. Since suppressed
+        text is never saved, successive small changes accumulate against the
+        latest saved snapshot until they exceed the threshold.
 
-        with aiohttp.ClientSession(loop=loop) as client_session:
-            tasks = []
-            for job in active_jobs:
-                snapshot = snapshots.get(job.documents_languages_id, None)
-                task = loop.create_task(
-                    self._execute_single_job(
-                        job, client_session, snapshot=snapshot))
-                tasks.append(task)
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+            previous (django_docsnaps.management.commands._transform.PreviousSnapshot):
+                The job's latest snapshot or None.
+            snapshot_simhash (int): The fingerprint of the transformed text.
+
+        Returns:
+            bool: True if the job has a similarity threshold and the
+                fingerprints differ in no more bits than it allows.
+
+        """
+        if previous is None or job.similarity_threshold is None:
+            return False
+
+        distance = django_docsnaps.fingerprints.hamming_distance(
+            previous.simhash,
+            snapshot_simhash)
+        return distance <= job.similarity_threshold
+
+    def _finish_run(self, run):
+        """
+        Record that a run is finished and delete its checkpoints.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        try:
+            with django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
+                django_docsnaps.models.RunCheckpoint.objects\
+                    .filter(run_id=run)\
+                    .delete()
+                run.finished_datetime = django.utils.timezone.now()
+                run.save(update_fields=['finished_datetime'])
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
+    def _get_write_timeout(self):
+        """
+        Get the number of seconds after which a database call of a job is
+        abandoned: DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT during a run with a
+        spool, or None for no limit.
+
+        """
+        if self._spool is None:
+            return None
 
-            done, pending = await asyncio.wait(tasks)
+        return django_docsnaps.settings.DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT
 
-    def _import_job_module(self, job):
+    def _import_job_module(self, job, module_name=None):
         """
         Attempt to import the job's module.
 
@@ -213,6 +956,8 @@ class Command(django.core.management.base.BaseCommand):
             job (django_docsnaps.models.DocumentsLanguages): A
                 DocumentsLanguages model instance. This model class represents
                 a snapshot job on which is_enabled=True.
+            module_name (string): The name of the module to import. Defaults
+                to the module of the job's document.
 
         Returns:
             module: The Python module object returned by importlib.
@@ -222,19 +967,119 @@ class Command(django.core.management.base.BaseCommand):
                 imported.
 
         """
+        if module_name is None:
+            module_name = job.document_id.module
         try:
-            module = importlib.import_module(job.document_id.module)
+            module = importlib.import_module(module_name)
         except ImportError as exception:
             exception_message = (
                 'The module "{!s}" for snapshot job "{!s}" could not be '
                 'imported.')
             exception_message = exception_message.format(
-                job.document_id.module,
+                module_name,
                 job.document_id.name)
             command_utils.raise_command_error(self.stdout, exception_message)
 
         return module
 
+    def _import_job_pipeline(self, job):
+        """
+        Import each module in the job's transform pipeline.
+
+        The pipeline is defined by the Transform records of the job's document
+        in execution order. A document without Transform records, such as one
+        added manually, is transformed by its own module alone.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): A
+                DocumentsLanguages model instance. This model class represents
+                a snapshot job on which is_enabled=True.
+
+        Returns:
+            list: (module, module_version) tuples in execution order.
+
+        Raises:
+            django.core.management.base.CommandError: If a module cannot be
+                imported.
+
+        """
+        module_names = [
+            transform.module
+            for transform in job.document_id.transform_set.all()]
+        if not module_names:
+            module_names = [job.document_id.module]
+
+        stages = []
+        for module_name in module_names:
+            module = self._import_job_module(job, module_name=module_name)
+            stages.append((module, command_utils.get_module_version(module)))
+
+        return stages
+
+    def _report_failed_jobs(self, tasks):
+        """
+        Warn of each job whose task raised an exception or was cancelled.
+
+        Args:
+            tasks (dict): The jobs keyed by their done tasks.
+
+        Returns:
+            int: The number of failed jobs.
+
+        """
+        failed_count = 0
+        for task, job in tasks.items():
+            if task.cancelled():
+                reason = 'the job was cancelled.'
+            elif task.exception() is not None:
+                reason = str(task.exception()) \
+                    or type(task.exception()).__name__
+            else:
+                continue
+            failed_count += 1
+            self.stdout.write(self.style.WARNING(
+                'Job {!s} failed: {!s}'.format(
+                    job.documents_languages_id,
+                    reason)))
+
+        return failed_count
+
+    def _report_invalid_ignore_rules(self, rule_sets):
+        """
+        Warn once of each ignore rule skipped because it is invalid.
+
+        Args:
+            rule_sets (dict): IgnoreRuleSet instances as returned by
+                _load_ignore_rules().
+
+        """
+        invalid_patterns = set()
+        for rule_set in rule_sets.values():
+            invalid_patterns.update(rule_set.invalid_patterns)
+        for pattern, message in sorted(invalid_patterns):
+            self.stdout.write(self.style.WARNING(
+                'The ignore rule "{!s}" is invalid and was skipped: '
+                '{!s}'.format(pattern, message)))
+
+    def _report_near_duplicate(self, job, previous, snapshot_simhash):
+        """
+        Write a status line for text not saved as a near-duplicate.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+            previous (django_docsnaps.management.commands._transform.PreviousSnapshot):
+                The job's latest snapshot.
+            snapshot_simhash (int): The fingerprint of the transformed text.
+
+        """
+        self.stdout.write(
+            'Job {!s}: near duplicate of snapshot {!s}, distance {!s}'.format(
+                job.documents_languages_id,
+                previous.snapshot_id,
+                django_docsnaps.fingerprints.hamming_distance(
+                    previous.simhash,
+                    snapshot_simhash)))
+
     async def _request_document(self, client_session, url):
         """
         Request the document from the remote source.
@@ -242,21 +1087,27 @@ class Command(django.core.management.base.BaseCommand):
         May need more robust response handling than raise_for_status().
         Note that aiohttp's ClientSession will follow redirects by default.
 
+        The body is returned undecoded. Decoding is left to the caller so that
+        a charset cached from a previous run can be used instead of letting the
+        HTTP library guess the encoding on every request.
+
+        Plugin transforms issue their requests through this method as well so
+        a slot is held from the run's request limiter, if any, for the duration
+        of the request.
+
         Possible errors:
-            aiohttp.errors.ClientError
-                Client connection errors.
-            aiohttp.errors.HttpProcessingError
-                From response.raise_for_status().
-            aiohttp.errors.ClientTimeoutError
-                ClientTimeoutError inherits from both ClientError (ancestor to
-                parent ClientConnectionError) and asyncio.TimeoutError.
-                aiohttp.errors.TimeoutError is a passthrough of
-                asyncio.TimeoutError.
+            aiohttp.ClientError
+                The base of all client errors, including connection errors and
+                the aiohttp.ClientResponseError raised by
+                response.raise_for_status().
+            asyncio.TimeoutError
+                Raised when the request timeout expires, including while the
+                body is read. aiohttp.ServerTimeoutError inherits from both
+                ClientError and asyncio.TimeoutError.
 
         See:
-            https://github.com/aio-libs/aiohttp/blob/1.3/aiohttp/errors.py
-            https://github.com/aio-libs/aiohttp/blob/1.3/aiohttp/client_reqrep.py
-            https://aiohttp.readthedocs.io/en/stable/client_reference.html#aiohttp.ClientResponse.raise_for_status
+            https://docs.aiohttp.org/en/stable/client_reference.html#client-exceptions
+            https://docs.aiohttp.org/en/stable/client_reference.html#aiohttp.ClientResponse.raise_for_status
 
         Args:
             client_session: An HTTP request session. In aiohttp, for
@@ -265,7 +1116,9 @@ class Command(django.core.management.base.BaseCommand):
             url (string): The URL to which a GET request will be issued.
 
         Returns:
-            string: A string of the fetched document.
+            DocumentResponse: The raw body of the fetched document, the
+                charset declared in the response headers, if any, and when the
+                response stops being fresh.
 
         Raises:
             django.core.management.base.CommandError: If any HTTP request
@@ -273,72 +1126,535 @@ class Command(django.core.management.base.BaseCommand):
 
         """
         timeout = django_docsnaps.settings.DJANGO_DOCSNAPS_REQUEST_TIMEOUT
-        response_text = None
+        document_response = None
         try:
-            async with client_session.get(url, timeout=timeout) as response:
-                response.raise_for_status()
-                response_text = await response.text()
-        except (
-            asyncio.errors.ClientError,
-            aiohttp.errors.HttpProcessingError) as exception:
-            exception_message = (
-                'The request for the document at URL "{!s}" failed with the '
-                'following exception: ')
-            exception_message.format(url)
-            comamnd_utils.raise_commend_error(
-                self.stdout,
-                exception_message + str(exception))
+            request_limiter = \
+                self._request_limiter or command_utils.RequestLimiter()
+            async with request_limiter.limit(url):
+                async with client_session.get(url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    document_response = DocumentResponse(
+                        body=await response.read(),
+                        charset=command_utils.get_content_type_charset(
+                            response.headers.get(aiohttp.hdrs.CONTENT_TYPE)),
+                        fresh_until=self._get_fresh_until(response.headers))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            self._raise_request_error(url, exception)
+
+        return document_response
+
+    async def _request_document_file(self, client_session, url):
+        """
+        Request the document, streaming its body to a temporary file.
+
+        Behaves as _request_document() but the body is never held in memory
+        in full. It is read in chunks, hashed, and written to an anonymous
+        temporary file.
+
+        Args:
+            client_session: An HTTP request session.
+            url (string): The URL to which a GET request will be issued.
+
+        Returns:
+            DocumentFile: The temporary file, positioned at its start, the
+                declared charset, the digest and size of the body, and when
+                the response stops being fresh. The caller is responsible for
+                closing the file.
+
+        Raises:
+            django.core.management.base.CommandError: If any HTTP request
+                exceptions are raised by underlying HTTP library.
+
+        """
+        chunk_size = django_docsnaps.settings.DJANGO_DOCSNAPS_STREAM_CHUNK_SIZE
+        timeout = django_docsnaps.settings.DJANGO_DOCSNAPS_REQUEST_TIMEOUT
+        body_file = tempfile.TemporaryFile()
+        body_hash = hashlib.sha256()
+        body_size = 0
+        charset = None
+        fresh_until = None
+        try:
+            request_limiter = \
+                self._request_limiter or command_utils.RequestLimiter()
+            async with request_limiter.limit(url):
+                async with client_session.get(url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    charset = command_utils.get_content_type_charset(
+                        response.headers.get(aiohttp.hdrs.CONTENT_TYPE))
+                    fresh_until = self._get_fresh_until(response.headers)
+                    while True:
+                        chunk = await response.content.read(chunk_size)
+                        if not chunk:
+                            break
+                        body_hash.update(chunk)
+                        body_file.write(chunk)
+                        body_size += len(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            body_file.close()
+            self._raise_request_error(url, exception)
+        except BaseException:
+            # Cancellation must not leak the temporary file either.
+            body_file.close()
+            raise
+
+        body_file.seek(0)
+
+        return DocumentFile(
+            body_file=body_file,
+            charset=charset,
+            digest=body_hash.hexdigest(),
+            fresh_until=fresh_until,
+            size=body_size)
+
+    async def _prune_stage_cache(self, stage_cache):
+        """
+        Delete the expired outputs of the run's stage cache.
+
+        Pruning is best-effort. A failure is reported but does not fail the
+        run since the outputs are deleted by the next run instead. The stage
+        cache queries that failed during the run, if any, are reported too.
 
-        return response_text
+        """
+        if stage_cache.failed_count:
+            self.stdout.write(self.style.WARNING(
+                '{!s} stage cache queries failed and were skipped.'.format(
+                    stage_cache.failed_count)))
+        try:
+            await self._database.run(
+                stage_cache.prune,
+                idempotent=True,
+                timeout=self._get_write_timeout())
+        except (asyncio.TimeoutError, django.db.Error) as exception:
+            self.stdout.write(self.style.WARNING(
+                'Expired stage outputs could not be deleted: '
+                + (str(exception) or 'the query timed out.')))
+
+    def _raise_request_error(self, url, exception):
+        """
+        Raise a CommandError describing a failed document request.
+
+        Raises:
+            django.core.management.base.CommandError
 
-    async def _save_new_snapshot(self, job, snapshot_text):
+        """
+        exception_message = (
+            'The request for the document at URL "{!s}" failed with the '
+            'following exception: ')
+        exception_message = exception_message.format(url)
+        command_utils.raise_command_error(
+            self.stdout,
+            exception_message + (str(exception) or repr(exception)))
+
+    async def _save_new_snapshot(
+        self,
+        job,
+        snapshot_text,
+        digest=None,
+        simhash=None,
+        previous=None):
         """
         Save a new document snapshot in the database for the passed job.
 
+        When the job has a previous snapshot, the line-level differences from
+        it are summarized and saved with the new snapshot. This loads the
+        previous snapshot's text, once, and the search for a minimal
+        difference is bounded by DJANGO_DOCSNAPS_DIFF_TIME_LIMIT.
+
+        A change event is inserted in the snapshot's transaction for later
+        delivery by the deliver-events subcommand. The job's cached latest
+        snapshot is invalidated once the new snapshot is saved.
+
+        During a run with a spool, a snapshot whose write fails or exceeds
+        DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT is appended to the spool instead
+        and the write, if still in progress, is left to complete. Once such
+        writes occupy every database thread, snapshots are spooled without
+        attempting a write. The diff summary is only an optimization for
+        readers so it is omitted if the previous text cannot be loaded.
+
         Args:
             job (django_docsnaps.models.DocumentsLanguages): A
                 DocumentsLanguages model instance. This model class represents
                 a snapshot job on which is_enabled=True.
             snapshot_text (string): The text of the new document snapshot.
+            digest (string): The SHA-256 hex digest of snapshot_text, if
+                already computed by the caller.
+            simhash (int): The SimHash fingerprint of snapshot_text, if
+                already computed by the caller.
+            previous (django_docsnaps.management.commands._transform.PreviousSnapshot):
+                The job's latest snapshot or None.
 
         Returns:
             django_docsnaps.models.Snapshot: The new Snapshot model instance
                 after save() has been called.
 
         Raises:
-            Raises:
             django.core.management.base.CommandError: If exception is raised by
                 underlying database library.
 
+        """
+        if digest is None:
+            digest = command_utils.get_digest(snapshot_text)
+        if simhash is None:
+            simhash = await asyncio.get_event_loop().run_in_executor(
+                None,
+                django_docsnaps.fingerprints.simhash,
+                snapshot_text)
+        new_snapshot = django_docsnaps.models.Snapshot(
+            documents_languages_id=job,
+            text=snapshot_text,
+            digest=digest,
+            simhash=simhash)
+        previous_text = None
+        if previous is not None:
+            # The previous text is loaded on first access.
+            try:
+                previous_text = await self._get_database().run(
+                    getattr,
+                    previous,
+                    'text',
+                    idempotent=True,
+                    timeout=self._get_write_timeout())
+            except (asyncio.TimeoutError, django.db.Error) as exception:
+                previous = None
+                self.stdout.write(self.style.WARNING(
+                    'The diff summary of job {!s} was skipped: {!s}'.format(
+                        job.documents_languages_id,
+                        str(exception) or 'the query timed out.')))
+        if previous is not None:
+            # Diffing may take up to the time limit so it is kept off the
+            # event loop.
+            time_limit = \
+                django_docsnaps.settings.DJANGO_DOCSNAPS_DIFF_TIME_LIMIT
+            diff_summary = await asyncio.get_event_loop().run_in_executor(
+                None,
+                functools.partial(
+                    django_docsnaps.diff.summarize,
+                    previous_text,
+                    snapshot_text,
+                    time_limit=time_limit))
+            new_snapshot.lines_added = diff_summary.lines_added
+            new_snapshot.lines_removed = diff_summary.lines_removed
+            new_snapshot.changed_ratio = diff_summary.changed_ratio
+            new_snapshot.hunks = json.dumps(
+                diff_summary.hunks,
+                separators=(',', ':'))
+        if self._spool is None:
+            await self._get_database().run(self._insert_snapshot, new_snapshot)
+        elif self._get_database().is_stalled():
+            await self._spool_snapshot(new_snapshot, None)
+            self.stdout.write(self.style.WARNING(
+                'The snapshot of job {!s} was spooled: the database is '
+                'stalled.'.format(job.documents_languages_id)))
+            return new_snapshot
+        else:
+            insert_future = asyncio.ensure_future(
+                self._get_database().run(self._insert_snapshot, new_snapshot))
+            try:
+                await self._get_database().wait_for(
+                    insert_future,
+                    django_docsnaps.settings.DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT)
+            except (asyncio.TimeoutError, django.db.Error) as exception:
+                await self._spool_snapshot(new_snapshot, insert_future)
+                self.stdout.write(self.style.WARNING(
+                    'The snapshot of job {!s} was spooled: {!s}'.format(
+                        job.documents_languages_id,
+                        str(exception) or 'the write timed out.')))
+                return new_snapshot
+        await self._invalidate_latest_snapshot(job)
+
+        return new_snapshot
+
+    async def _save_new_snapshot_stream(self, job, text_file, digest, simhash):
+        """
+        Save a new document snapshot from a file.
+
+        No diff summary is saved since it would require both texts in memory.
+        Nor is the snapshot spooled if the write fails, for the same reason.
+
+        The file is only read by the database thread that inserts the
+        snapshot, in a single transaction with the snapshot's change event.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+            text_file (file): A text file positioned at the start of the
+                snapshot text.
+            digest (string): The SHA-256 hex digest of the snapshot text.
+            simhash (int): The SimHash fingerprint of the snapshot text.
+
+        Returns:
+            django_docsnaps.models.Snapshot: The new Snapshot model instance.
+                Its text attribute is not populated.
+
         """
         new_snapshot = django_docsnaps.models.Snapshot(
             documents_languages_id=job,
-            text=snapshot_text)
-        new_snapshot.save()
+            digest=digest,
+            simhash=simhash)
+        await self._get_database().run(
+            self._insert_snapshot_stream,
+            new_snapshot,
+            text_file)
+        await self._invalidate_latest_snapshot(job)
 
         return new_snapshot
 
+    async def _spool_snapshot(self, new_snapshot, insert_future):
+        """
+        Append a snapshot that could not be saved in time to the run's spool.
+
+        If the snapshot's write is still in progress, its completion is
+        recorded in the spool as well so that the snapshot is not loaded twice.
+
+        Args:
+            new_snapshot (django_docsnaps.models.Snapshot): The unsaved
+                snapshot.
+            insert_future (asyncio.Future): The snapshot's database write or
+                None if no write was attempted.
+
+        Raises:
+            OSError: If the spool could not be written.
+
+        """
+        record_id = command_spool.create_record_id()
+        await self._spool.append({
+            'changed_ratio': new_snapshot.changed_ratio,
+            'datetime': django.utils.timezone.now().isoformat(),
+            'digest': new_snapshot.digest,
+            'documents_languages_id': new_snapshot.documents_languages_id_id,
+            'hunks': new_snapshot.hunks,
+            'id': record_id,
+            'lines_added': new_snapshot.lines_added,
+            'lines_removed': new_snapshot.lines_removed,
+            'simhash': new_snapshot.simhash,
+            'text': new_snapshot.text,
+            'type': 'snapshot',
+        })
+        if insert_future is not None and not insert_future.done():
+            self._spool.track(record_id, insert_future)
+
+    def _save_checkpoint(self, run, jobs, requested_before):
+        """
+        Insert a run's checkpoints of completed jobs and save the jobs as
+        checked in a transaction.
+
+        Checkpoints that already exist are ignored so that the call may be
+        repeated.
+
+        Raises:
+            django.db.Error: If exception is raised by underlying database
+                library. It is left to _checkpoint_jobs() to report since this
+                method is called in the run's database threads.
+
+        See:
+            _checkpoint_jobs
+
+        """
+        if not jobs:
+            return
+
+        with django.db.transaction.atomic(
+                using=django_docsnaps.routers.get_primary_alias()):
+            if run is not None:
+                django_docsnaps.models.RunCheckpoint.objects.bulk_create(
+                    [
+                        django_docsnaps.models.RunCheckpoint(
+                            run_id=run,
+                            documents_languages_id=job)
+                        for job in jobs],
+                    ignore_conflicts=True)
+            self._save_checked_jobs(
+                jobs,
+                requested_before=requested_before)
+
+    def _save_checked_jobs(self, jobs, requested_before=None):
+        """
+        Record the current datetime as the checked datetime of the jobs.
+
+        Fetches requested for the jobs are cleared in the same query, except
+        those requested after the jobs started, which may have been missed.
+        The freshness of each job's last response, set on the model instance by
+        the job, is saved as well.
+
+        Args:
+            jobs (iterable): DocumentsLanguages model instances.
+            requested_before (datetime.datetime): When the jobs started.
+                Defaults to the current datetime.
+
+        Raises:
+            django.db.Error: If exception is raised by underlying database
+                library.
+
+        """
+        job_ids = [job.documents_languages_id for job in jobs]
+        if not job_ids:
+            return
+
+        now = django.utils.timezone.now()
+        if requested_before is None:
+            requested_before = now
+        fresh_until_whens = [
+            django.db.models.When(
+                pk=job.documents_languages_id,
+                then=django.db.models.Value(
+                    job.fresh_until_datetime,
+                    output_field=django.db.models.DateTimeField()))
+            for job in jobs if job.fresh_until_datetime is not None]
+        django_docsnaps.models.DocumentsLanguages.objects\
+            .filter(pk__in=job_ids)\
+            .update(
+                checked_datetime=now,
+                fetch_requested_datetime=django.db.models.Case(
+                    django.db.models.When(
+                        fetch_requested_datetime__lte=requested_before,
+                        then=django.db.models.Value(None)),
+                    default=django.db.models.F('fetch_requested_datetime'),
+                    output_field=django.db.models.DateTimeField()),
+                fresh_until_datetime=django.db.models.Case(
+                    *fresh_until_whens,
+                    default=django.db.models.Value(None),
+                    output_field=django.db.models.DateTimeField()))
+
+    def _save_job_response(self, job, response_digest, module_version):
+        """
+        Record the fetched body's digest and the plugin version on the job.
+
+        Called only after the job's snapshot, if any, has been saved so that a
+        failed save is retried on the next run rather than skipped.
+
+        """
+        job.response_digest = response_digest
+        job.module_version = module_version
+        job.save(update_fields=['response_digest', 'module_version'])
+
+    def _start_run(self, force):
+        """
+        Insert a new run and finish the earlier unfinished runs.
+
+        A run started without --resume supersedes the runs left unfinished
+        before it, which could otherwise never be resumed, so their
+        checkpoints are deleted.
+
+        Raises:
+            django.core.management.base.CommandError: If exception is raised by
+                underlying database library.
+
+        """
+        try:
+            with django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
+                unfinished_runs = django_docsnaps.models.Run.objects\
+                    .filter(finished_datetime__isnull=True)
+                django_docsnaps.models.RunCheckpoint.objects\
+                    .filter(run_id__in=unfinished_runs)\
+                    .delete()
+                unfinished_runs.update(
+                    finished_datetime=django.utils.timezone.now())
+                return django_docsnaps.models.Run.objects.create(
+                    is_forced=force)
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
     def add_arguments(self, parser):
         """
         Add arguments to the argparse parser object.
 
-        Currently no need for arguments.
-
         Add a dry-run flag?
 
         """
-        pass
+        parser.add_argument(
+            '-f', '--force',
+            action='store_true',
+            default=False,
+            help=(
+                'Check every enabled job, even those whose poll intervals have '
+                'not elapsed or whose last responses are still fresh.'))
+        parser.add_argument(
+            '-r', '--resume',
+            action='store_true',
+            default=False,
+            help=(
+                'Continue the last run if it was interrupted, executing only '
+                'the jobs that it did not complete. Otherwise, start a new '
+                'run.'))
+
+    async def _try_database(
+        self,
+        job,
+        description,
+        function,
+        *args,
+        idempotent=False):
+        """
+        Make a database write that the job can do without.
+
+        A failure, or a timeout during a run with a spool, is reported but
+        does not fail the job.
+
+        Args:
+            job (django_docsnaps.models.DocumentsLanguages): The job.
+            description (string): What the write saves, for the report.
+            function (callable): The function making the write.
+            *args: Positional arguments passed to the function.
+            idempotent (bool): As for DatabaseExecutor.run().
+
+        Returns:
+            bool: True if the write succeeded.
+
+        """
+        try:
+            await self._get_database().run(
+                function,
+                *args,
+                idempotent=idempotent,
+                timeout=self._get_write_timeout())
+        except (asyncio.TimeoutError, django.db.Error) as exception:
+            self.stdout.write(self.style.WARNING(
+                'The {!s} of job {!s} was not saved: {!s}'.format(
+                    description,
+                    job.documents_languages_id,
+                    str(exception) or 'the write timed out.')))
+            return False
+
+        return True
 
     def handle(self, *args, **options):
-        enabled_jobs = self._get_active_jobs()
+        force = options.get('force', False)
+        run = None
+        if options.get('resume', False):
+            run = self._get_resumable_run()
+        if run is None:
+            enabled_jobs = self._get_active_jobs(force=force)
+            if enabled_jobs:
+                run = self._start_run(force)
+        else:
+            self.stdout.write('Resuming run {!s}.'.format(run.run_id))
+            with django_docsnaps.routers.use_primary():
+                enabled_jobs = self._get_active_jobs(
+                    force=force or run.is_forced,
+                    run=run)
+
+        failed_count = 0
         if enabled_jobs:
             loop = asyncio.get_event_loop()
-            loop.run_until_complete(
-                self._execute_enabled_jobs(enabled_jobs, loop=loop))
+            failed_count = loop.run_until_complete(
+                self._execute_enabled_jobs(enabled_jobs, loop=loop, run=run))
             loop.close()
             run_status = self.style.SUCCESS(
                 'Active jobs completed successfully.')
         else:
-            run_status = self.style.WARNING('No active jobs found.')
+            run_status = self.style.WARNING('No active jobs are due.')
+        if failed_count:
+            # The run is left unfinished so that its failed jobs may be
+            # retried with --resume.
+            run_status = self.style.WARNING(
+                '{!s} of {!s} active jobs failed.'.format(
+                    failed_count,
+                    len(enabled_jobs)))
+            if run is not None:
+                run_status += ' Retry them with --resume.'
+        elif run is not None:
+            self._finish_run(run)
 
         self.stdout.write('Job execution complete: ' + run_status)
@@ -0,0 +1,114 @@
+"""
+A Django admin command that searches the full text of all snapshots.
+
+The full-text index must first be created with the --create-index option. It is
+then maintained by the database as snapshots are saved.
+
+See:
+    django_docsnaps.search
+
+"""
+
+import django.core.exceptions
+import django.core.management.base
+import django.db
+
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.search
+
+
+class Command(django.core.management.base.BaseCommand):
+
+    help = 'Finds the snapshots containing words or a phrase.'
+
+    def _change_index(self, drop):
+        """
+        Create or drop the full-text index.
+
+        Raises:
+            django.core.management.base.CommandError: If the database does not
+                support full-text search or the index could not be changed.
+
+        """
+        if drop:
+            self.stdout.write('Dropping full-text index: ', ending='')
+            change_index = django_docsnaps.search.drop_index
+        else:
+            self.stdout.write('Creating full-text index: ', ending='')
+            change_index = django_docsnaps.search.create_index
+
+        try:
+            change_index()
+        except django.core.exceptions.ImproperlyConfigured as exception:
+            command_utils.raise_command_error(self.stdout, exception)
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred: ' + str(exception))
+
+        self.stdout.write(self.style.SUCCESS('success'))
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'query',
+            help='The words to find.',
+            nargs='?',
+            type=str)
+        parser.add_argument(
+            '-p', '--phrase',
+            action='store_true',
+            default=False,
+            help='Find the words only when they occur in order.')
+        parser.add_argument(
+            '-l', '--limit',
+            default=100,
+            help='The maximum number of snapshots listed.',
+            type=int)
+        index_group = parser.add_mutually_exclusive_group()
+        index_group.add_argument(
+            '--create-index',
+            action='store_true',
+            default=False,
+            help='Create the full-text index of existing and future snapshots.')
+        index_group.add_argument(
+            '--drop-index',
+            action='store_true',
+            default=False,
+            help='Drop the full-text index.')
+
+    def handle(self, *args, **options):
+        """
+        List the matching job and snapshot IDs, most relevant first.
+
+        """
+        if options.get('create_index') or options.get('drop_index'):
+            self._change_index(options.get('drop_index'))
+            return
+
+        query = options.get('query')
+        if not query:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A query or an index option is required.')
+
+        try:
+            results = django_docsnaps.search.search(
+                query,
+                phrase=options.get('phrase', False),
+                limit=options.get('limit', 100))
+        except django.core.exceptions.ImproperlyConfigured as exception:
+            command_utils.raise_command_error(self.stdout, exception)
+        except django.db.Error as exception:
+            command_utils.raise_command_error(
+                self.stdout,
+                'A database error occurred. Has the full-text index been '
+                'created? ' + str(exception))
+
+        for result in results:
+            self.stdout.write(
+                'document instance {!s}\tsnapshot {!s}\trank {:.4f}'.format(
+                    result.documents_languages_id,
+                    result.snapshot_id,
+                    result.rank))
+        self.stdout.write(
+            'Matching snapshots: ' + self.style.SUCCESS(str(len(results))))
@@ -0,0 +1,219 @@
+"""
+A local, append-only spool of snapshots that could not be saved in time.
+
+When the database fails or exceeds DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT while
+saving a new snapshot, the run appends the snapshot to the spool file named by
+DJANGO_DOCSNAPS_SPOOL_PATH instead and moves on to its next job. The
+replay-spool subcommand later loads the spooled snapshots into the database.
+
+Each record is a header of the payload's length and CRC-32, as two unsigned
+32-bit big-endian integers, followed by the payload, a UTF-8 JSON object. A
+record whose header or payload is incomplete or does not match its CRC was torn
+by a crash while being written and ends the spool. A run removes such a record
+before appending its own.
+
+Records are written in batches. A record is appended once every record in its
+batch has been written and the file has been synced to disk. The batch is
+written when it is full or a short delay after its first record, so that
+concurrent jobs share each fsync. Writers and the replay-spool subcommand hold
+an exclusive lock on the file.
+
+A snapshot whose database write timed out may still be saved by that write.
+If it is, a "committed" record with the snapshot record's ID is appended and
+the replay skips the snapshot.
+
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import struct
+import threading
+import uuid
+import zlib
+
+
+_HEADER = struct.Struct('>II')
+
+
+def _encode_record(record):
+    payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def create_record_id():
+    """
+    Create a unique ID for a spooled snapshot.
+
+    Returns:
+        string: The ID.
+
+    """
+    return uuid.uuid4().hex
+
+def read_records(spool_file):
+    """
+    Read the complete records of a spool file from its current position.
+
+    Args:
+        spool_file (file): The spool file, opened in binary mode.
+
+    Returns:
+        tuple: A list of the record dictionaries and the number of trailing
+            bytes that were not a complete record.
+
+    """
+    records = []
+    while True:
+        position = spool_file.tell()
+        header = spool_file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            break
+        length, crc = _HEADER.unpack(header)
+        payload = spool_file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(json.loads(payload.decode('utf-8')))
+
+    spool_file.seek(0, os.SEEK_END)
+    return records, spool_file.tell() - position
+
+
+class Spool:
+
+    def __init__(self, path, sync_batch_size=100, sync_delay=0.05, loop=None):
+        """
+        Initialize an instance. The file is created on the first write.
+
+        Args:
+            path (string): The path of the spool file.
+            sync_batch_size (int): The maximum number of records written and
+                synced at once.
+            sync_delay (float): The number of seconds that the first record of
+                a batch waits for others.
+            loop: The asyncio event loop. Defaults to the current event loop.
+
+        """
+        self._batch = []
+        self._batch_future = None
+        self._flush_handle = None
+        self._is_checked = False
+        self._loop = loop or asyncio.get_event_loop()
+        self._path = path
+        self._pending = set()
+        self._sync_batch_size = sync_batch_size
+        self._sync_delay = sync_delay
+        self._write_lock = threading.Lock()
+
+    def _flush(self):
+        """
+        Start writing the current batch in a thread.
+
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, batch_future = self._batch, self._batch_future
+        self._batch, self._batch_future = [], None
+
+        def set_result(write_future):
+            if batch_future.done():
+                return
+            if write_future.exception() is None:
+                batch_future.set_result(None)
+            else:
+                batch_future.set_exception(write_future.exception())
+
+        write_future = self._loop.run_in_executor(None, self._write, batch)
+        write_future.add_done_callback(set_result)
+
+    def _write(self, batch):
+        """
+        Append encoded records to the file and sync it.
+
+        Before the first write, a record torn by an earlier crash is removed
+        from the end of the file so that it does not hide the new records.
+
+        """
+        is_new = not os.path.exists(self._path)
+        with self._write_lock, open(self._path, 'a+b') as spool_file:
+            fcntl.flock(spool_file, fcntl.LOCK_EX)
+            try:
+                if not self._is_checked:
+                    spool_file.seek(0)
+                    trailing_length = read_records(spool_file)[1]
+                    if trailing_length:
+                        spool_file.truncate(
+                            spool_file.tell() - trailing_length)
+                    self._is_checked = True
+                spool_file.write(b''.join(batch))
+                spool_file.flush()
+                os.fsync(spool_file.fileno())
+            finally:
+                fcntl.flock(spool_file, fcntl.LOCK_UN)
+
+        if is_new:
+            # Sync the new file's directory entry as well.
+            directory_fd = os.open(
+                os.path.dirname(os.path.abspath(self._path)),
+                os.O_RDONLY)
+            try:
+                os.fsync(directory_fd)
+            finally:
+                os.close(directory_fd)
+
+    async def append(self, record):
+        """
+        Append a record, returning once it has been synced to disk.
+
+        Args:
+            record (dict): The JSON-serializable record.
+
+        Raises:
+            OSError: If the record could not be written.
+
+        """
+        self._batch.append(_encode_record(record))
+        if self._batch_future is None:
+            self._batch_future = self._loop.create_future()
+            self._flush_handle = self._loop.call_later(
+                self._sync_delay,
+                self._flush)
+        batch_future = self._batch_future
+        if len(self._batch) >= self._sync_batch_size:
+            self._flush()
+
+        # Shielded since the future is shared by the batch's writers.
+        await asyncio.shield(batch_future)
+
+    async def close(self):
+        """
+        Wait for tracked writes and for every appended record to be synced.
+
+        """
+        while self._pending:
+            await asyncio.wait(list(self._pending))
+        if self._batch_future is not None:
+            batch_future = self._batch_future
+            self._flush()
+            await asyncio.shield(batch_future)
+
+    def track(self, record_id, write_future):
+        """
+        Record that a spooled snapshot was saved if its write completes.
+
+        Args:
+            record_id (string): The ID of the spooled snapshot's record.
+            write_future (asyncio.Future): The snapshot's database write.
+
+        """
+        async def mark_committed():
+            try:
+                await write_future
+            except Exception:
+                return
+            await self.append({'type': 'committed', 'id': record_id})
+
+        task = self._loop.create_task(mark_committed())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
@@ -0,0 +1,768 @@
+"""
+A module that invokes plugin module transforms on behalf of the run command.
+
+Plugin modules have always provided a transform with the signature:
+
+    transform(doc_text) -> (transformed_text, is_changed)
+
+This forces each plugin to decide on its own whether a document has changed,
+which it cannot do without querying the database for the latest snapshot.
+
+A plugin may instead declare a "previous" parameter:
+
+    transform(doc_text, previous=None) -> transformed_text
+
+The previous argument is None for a job's first snapshot and a PreviousSnapshot
+otherwise. The return value may be the transformed text alone or, as before, a
+(transformed_text, is_changed) tuple. When is_changed is omitted, the core
+decides by comparing digests. In either case, the core never saves a snapshot
+with the same digest as the latest one, so plugins only need to normalize.
+
+A transform may also be a coroutine function:
+
+    async def transform(doc_text, previous=None, context=None)
+
+A transform that declares a "context" parameter receives a TransformContext
+through which it may fetch linked sub-documents or further pages. These
+requests share the run's HTTP session and are subject to the same concurrency
+and per-host rate limits as the run's own requests. Blocking I/O inside a
+transform stalls every other job in the run and should be avoided.
+
+Finally, a plugin may additionally define a batched entry point:
+
+    transform_many(batch, context=None) -> results
+
+batch is a list of TransformItem tuples from jobs of the same module and
+results is a sequence of the same length containing, in order, the same values
+transform() would return for each item. It may also be a coroutine function.
+When defined, the run collects documents into batches and calls it instead of
+transform() so that the plugin may amortize parser setup, lookup tables, and
+compiled patterns across documents. transform() is still required.
+
+Plugins that handle very large documents may opt in to streaming:
+
+    async def transform_stream(chunks, previous=None, context=None)
+
+chunks is an asynchronous iterator of decoded text chunks and transform_stream
+must be an asynchronous generator that yields transformed text chunks. The core
+hashes and fingerprints the output incrementally and writes it to a temporary
+file so that the whole document is only read into memory to insert a changed
+snapshot. The core alone decides whether the document has changed.
+
+Streaming is only used for responses larger than
+DJANGO_DOCSNAPS_STREAM_THRESHOLD. Smaller documents are transformed in memory
+by transform_many or transform, which is still required, so that ignore rules,
+diff summaries, and spooling apply to them.
+
+A document may be transformed by a pipeline of several plugin modules, defined
+by its Transform records, each stage receiving the previous stage's output. In
+a pipeline, stage outputs are cached by stage identity and input digest so that
+only the stages downstream of a changed output are re-run. A stage is cached
+unless its transform declares "previous" or "context", since its output then
+depends on more than its input. A module may override this by defining a
+boolean transform_cacheable attribute. Cached stages' is_changed flags are
+ignored. Streaming is only used for single-stage pipelines.
+
+"""
+
+import asyncio
+import collections
+import datetime
+import hashlib
+import inspect
+
+import django.db
+import django.utils.timezone
+
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+import django_docsnaps.routers
+import django_docsnaps.settings
+
+
+# A single document passed to a plugin's transform_many(). Fields correspond to
+# the arguments of transform().
+TransformItem = collections.namedtuple('TransformItem', ['doc_text', 'previous'])
+
+
+class PreviousSnapshot:
+    """
+    A lazy, read-only handle to a job's latest snapshot.
+
+    The latest snapshots are queried without their text. The digest is
+    available immediately while the text is only loaded from the database when
+    first accessed. Since loading is a synchronous query, a coroutine must call
+    load_fingerprints() through the run's DatabaseExecutor before reading the
+    digest or fingerprint of a snapshot without has_fingerprints.
+
+    Attributes:
+        datetime (datetime.datetime): When the snapshot was taken.
+        snapshot_id (int): The snapshot's primary key.
+
+    """
+
+    def __init__(self, snapshot):
+        """
+        Initialize an instance.
+
+        Args:
+            snapshot (django_docsnaps.models.Snapshot): The latest Snapshot
+                model instance, ideally with its text field deferred.
+
+        """
+        self._digest = snapshot.digest
+        self._simhash = snapshot.simhash
+        self._snapshot = snapshot
+
+        self.datetime = snapshot.datetime
+        self.snapshot_id = snapshot.snapshot_id
+
+    @property
+    def digest(self):
+        """
+        The SHA-256 hex digest of the snapshot text.
+
+        Snapshots saved before digests were stored have none so the digest is
+        computed from the text, loading it, in that case only.
+
+        """
+        if self._digest is None:
+            self._digest = command_utils.get_digest(self.text or '')
+        return self._digest
+
+    @property
+    def has_fingerprints(self):
+        """
+        Whether the digest and fingerprint are stored, so that neither needs
+        the text to be loaded.
+
+        """
+        return self._digest is not None and self._simhash is not None
+
+    @property
+    def simhash(self):
+        """
+        The SimHash fingerprint of the snapshot text.
+
+        As with the digest, it is computed from the text only for snapshots
+        saved before fingerprints were stored.
+
+        """
+        if self._simhash is None:
+            self._simhash = django_docsnaps.fingerprints.simhash(
+                self.text or '')
+        return self._simhash
+
+    @property
+    def text(self):
+        """
+        The snapshot text. Loaded from the database on first access.
+
+        """
+        return self._snapshot.text
+
+    def load_fingerprints(self):
+        """
+        Compute the digest and fingerprint that are not stored, loading the
+        text if either is missing.
+
+        Returns:
+            tuple: The digest and the fingerprint.
+
+        """
+        return self.digest, self.simhash
+
+
+class TransformContext:
+    """
+    The run's shared resources, made available to plugin transforms.
+
+    Attributes:
+        client_session: The run's HTTP request session. In aiohttp, this is a
+            ClientSession object, an abstraction of a connection pool.
+        request_limiter (django_docsnaps.management.commands._utils.RequestLimiter):
+            The run's request limiter. Plugins using client_session directly
+            should hold a slot from it for the duration of each request.
+
+    """
+
+    def __init__(self, client_session, request_limiter, request_document):
+        """
+        Initialize an instance.
+
+        Args:
+            client_session: The run's HTTP request session.
+            request_limiter (django_docsnaps.management.commands._utils.RequestLimiter):
+                The run's request limiter.
+            request_document (coroutine function): The run command's own
+                request coroutine function. Accepts the session and a URL and
+                returns a DocumentResponse.
+
+        """
+        self._request_document = request_document
+
+        self.client_session = client_session
+        self.request_limiter = request_limiter
+
+    async def fetch(self, url):
+        """
+        Fetch and decode a document through the run's session and limits.
+
+        Args:
+            url (string): The URL to which a GET request will be issued.
+
+        Returns:
+            string: The decoded document text.
+
+        Raises:
+            django.core.management.base.CommandError: If the request fails.
+
+        """
+        document_response = await self._request_document(
+            self.client_session,
+            url)
+        doc_text, charset, detected = command_utils.decode_body(
+            document_response.body,
+            (document_response.charset,))
+
+        return doc_text
+
+    async def fetch_many(self, urls):
+        """
+        Concurrently fetch and decode several documents.
+
+        Args:
+            urls (iterable): The URLs to which GET requests will be issued.
+
+        Returns:
+            list: The decoded document texts in the same order as urls.
+
+        """
+        return await asyncio.gather(*[self.fetch(url) for url in urls])
+
+
+class StageCache:
+    """
+    Caches the outputs of transform pipeline stages.
+
+    Outputs are keyed by (module name, module version, input digest) and
+    persisted in the TransformResult table so that they survive between runs.
+    A small in-process LRU cache fronts the table and concurrent requests for
+    the same key within a run share a single computation. Outputs unused for
+    longer than DJANGO_DOCSNAPS_STAGE_CACHE_TTL are deleted by prune().
+
+    The table is only a cache. A lookup that fails or times out is treated as a
+    miss and a failed insert is skipped, so that a database outage slows jobs
+    down rather than failing them.
+
+    Attributes:
+        failed_count (int): The number of queries that failed or timed out.
+
+    """
+
+    def __init__(self, max_size=128, database=None, loop=None, timeout=None):
+        """
+        Initialize an instance.
+
+        Args:
+            max_size (int): The maximum number of outputs held in memory.
+            database (django_docsnaps.management.commands._database.DatabaseExecutor):
+                The run's database executor. Queries are made directly if None.
+            loop: The asyncio event loop. Defaults to the current event loop.
+            timeout (float): The number of seconds after which a query is
+                abandoned. Unlimited if None.
+
+        """
+        self._database = database or command_database.DatabaseExecutor()
+        self._loop = loop or asyncio.get_event_loop()
+        self._max_size = max_size
+        self._memory = collections.OrderedDict()
+        self._pending = {}
+        self._timeout = timeout
+
+        self.failed_count = 0
+
+    def _load(self, key):
+        """
+        Load a persisted stage output, marking it as used.
+
+        The output's timestamp is only refreshed once at least half of its
+        TTL has elapsed so that most hits do not write.
+
+        """
+        module_name, module_version, input_digest = key
+        result_set = django_docsnaps.models.TransformResult.objects.filter(
+            module=module_name,
+            module_version=module_version,
+            input_digest=input_digest)
+        result_list = list(
+            result_set.values_list('text', 'updated_timestamp')[:1])
+        if not result_list:
+            return None
+
+        text, updated_timestamp = result_list[0]
+        ttl = django_docsnaps.settings.DJANGO_DOCSNAPS_STAGE_CACHE_TTL
+        if ttl is not None:
+            now = django.utils.timezone.now()
+            if updated_timestamp < now - datetime.timedelta(seconds=ttl / 2):
+                result_set.update(updated_timestamp=now)
+
+        return text
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_size:
+            self._memory.popitem(last=False)
+
+    async def _run_query(self, function, *args):
+        """
+        Make an idempotent query, returning None if it fails or times out.
+
+        """
+        try:
+            return await self._database.run(
+                function,
+                *args,
+                idempotent=True,
+                timeout=self._timeout)
+        except (asyncio.TimeoutError, django.db.Error):
+            self.failed_count += 1
+            return None
+
+    def prune(self):
+        """
+        Delete the persisted outputs unused for longer than their TTL.
+
+        Returns:
+            int: The number of outputs deleted.
+
+        Raises:
+            django.db.Error: If the query fails.
+
+        """
+        ttl = django_docsnaps.settings.DJANGO_DOCSNAPS_STAGE_CACHE_TTL
+        if ttl is None:
+            return 0
+
+        expired_before = django.utils.timezone.now() \
+            - datetime.timedelta(seconds=ttl)
+        deleted_count, deleted_counts = \
+            django_docsnaps.models.TransformResult.objects\
+                .filter(updated_timestamp__lt=expired_before)\
+                .delete()
+
+        return deleted_count
+
+    def _store(self, key, text):
+        """
+        Persist a stage output. A concurrent insert by another run wins.
+
+        """
+        module_name, module_version, input_digest = key
+        try:
+            with django.db.transaction.atomic(
+                    using=django_docsnaps.routers.get_primary_alias()):
+                django_docsnaps.models.TransformResult.objects.create(
+                    module=module_name,
+                    module_version=module_version,
+                    input_digest=input_digest,
+                    text=text)
+        except django.db.IntegrityError:
+            pass
+
+    async def get_or_compute(self, key, compute):
+        """
+        Get a cached stage output, computing and caching it if absent.
+
+        Args:
+            key (tuple): The module name, module version, and input digest.
+            compute (coroutine function): Called without arguments to compute
+                the output on a cache miss.
+
+        Returns:
+            string: The stage output.
+
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        future = self._loop.create_future()
+        self._pending[key] = future
+        try:
+            text = await self._run_query(self._load, key)
+            if text is None:
+                text = await compute()
+                # Idempotent since a repeated insert is ignored.
+                await self._run_query(self._store, key, text)
+        except Exception as exception:
+            future.set_exception(exception)
+            # Mark the exception retrieved. The caller re-raises it.
+            future.exception()
+            raise
+        else:
+            future.set_result(text)
+        finally:
+            del self._pending[key]
+
+        self._remember(key, text)
+
+        return text
+
+
+class TransformBatcher:
+    """
+    Collects documents into per-module batches for plugins' transform_many().
+
+    Each job awaits the result for its own document. A module's batch is passed
+    to the plugin when it reaches the batch size or when the delay has elapsed
+    since the first document was added, whichever comes first. The delay
+    bounds the latency added to any one job.
+
+    """
+
+    def __init__(self, batch_size, delay, context=None, loop=None):
+        """
+        Initialize an instance.
+
+        Args:
+            batch_size (int): The maximum number of documents per batch.
+            delay (float): The maximum number of seconds to wait for a batch
+                to fill.
+            context (TransformContext): The run's shared resources, passed to
+                plugins that declare a "context" parameter.
+            loop: The asyncio event loop. Defaults to the current event loop.
+
+        """
+        self._batch_size = batch_size
+        self._batches = {}
+        self._context = context
+        self._delay = delay
+        self._loop = loop or asyncio.get_event_loop()
+        self._tasks = set()
+        self._timers = {}
+
+    def _flush(self, module):
+        """
+        Schedule the transform of a module's pending batch.
+
+        """
+        timer = self._timers.pop(module, None)
+        if timer:
+            timer.cancel()
+        batch = self._batches.pop(module, None)
+        if batch:
+            # Referenced until done since the loop only keeps weak references.
+            task = self._loop.create_task(self._transform_batch(module, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _transform_batch(self, module, batch):
+        """
+        Pass a batch to the plugin and resolve each job's future.
+
+        An exception raised by the plugin is set on every future in the batch.
+        If the transform is cancelled or interrupted, the futures still pending
+        are cancelled so that no job waits forever.
+
+        """
+        items = [item for item, future in batch]
+        kwargs = {}
+        if accepts_argument(module.transform_many, 'context'):
+            kwargs['context'] = self._context
+        try:
+            try:
+                results = module.transform_many(items, **kwargs)
+                if inspect.isawaitable(results):
+                    results = await results
+                results = list(results)
+                if len(results) != len(items):
+                    raise ValueError(
+                        '{!s}.transform_many() returned {!s} results for a '
+                        'batch of {!s} documents.'.format(
+                            module.__name__,
+                            len(results),
+                            len(items)))
+            except Exception as exception:
+                for item, future in batch:
+                    if not future.done():
+                        future.set_exception(exception)
+                return
+
+            for (item, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(_unpack_result(result))
+        finally:
+            for item, future in batch:
+                if not future.done():
+                    future.cancel()
+
+    async def transform(self, module, doc_text, previous=None):
+        """
+        Add a document to its module's batch and wait for its result.
+
+        Args:
+            module: The imported plugin module. Must define transform_many().
+            doc_text (string): The decoded document text.
+            previous (PreviousSnapshot): The job's latest snapshot or None.
+
+        Returns:
+            tuple: The transformed text and the plugin's is_changed flag, as
+                returned by transform_document().
+
+        """
+        future = self._loop.create_future()
+        batch = self._batches.setdefault(module, [])
+        batch.append((TransformItem(doc_text, previous), future))
+        if len(batch) >= self._batch_size:
+            self._flush(module)
+        elif module not in self._timers:
+            self._timers[module] = self._loop.call_later(
+                self._delay,
+                self._flush,
+                module)
+
+        return await future
+
+
+def accepts_argument(function, argument_name):
+    """
+    Determine if a callable explicitly declares a named parameter.
+
+    Variadic keyword parameters are deliberately not counted. A legacy
+    transform wrapped in a generic decorator should not suddenly be passed
+    arguments it does not know about.
+
+    Args:
+        function (callable): The callable to inspect.
+        argument_name (string): The parameter name.
+
+    Returns:
+        bool: True if the parameter is declared.
+
+    """
+    try:
+        parameters = inspect.signature(function).parameters
+    except (TypeError, ValueError):
+        return False
+
+    return argument_name in parameters
+
+def get_pipeline_version(stages):
+    """
+    Get a single version string for a transform pipeline.
+
+    A single-stage pipeline's version is simply its module's version so that
+    versions recorded before pipelines existed remain valid.
+
+    Args:
+        stages (sequence): (module, module_version) tuples in execution order.
+
+    Returns:
+        string: The pipeline version.
+
+    """
+    if len(stages) == 1:
+        return stages[0][1]
+
+    return command_utils.get_digest(';'.join(
+        '{!s}={!s}'.format(module.__name__, module_version)
+        for module, module_version in stages))
+
+def is_cacheable(module):
+    """
+    Determine if a pipeline stage's output depends only on its input.
+
+    Args:
+        module: The imported plugin module as returned by importlib.
+
+    Returns:
+        bool: True if the stage's output may be cached.
+
+    """
+    cacheable = getattr(module, 'transform_cacheable', None)
+    if cacheable is None:
+        cacheable = not (
+            accepts_argument(module.transform, 'previous')
+            or accepts_argument(module.transform, 'context'))
+
+    return bool(cacheable)
+
+def is_streaming(module):
+    """
+    Determine if a plugin module implements the streaming interface.
+
+    Args:
+        module: The imported plugin module as returned by importlib.
+
+    Returns:
+        bool: True if the module defines a callable transform_stream.
+
+    """
+    return callable(getattr(module, 'transform_stream', None))
+
+async def transform_document(
+    module,
+    doc_text,
+    previous=None,
+    context=None,
+    batcher=None):
+    """
+    Call a plugin module's transform using whichever interface it implements.
+
+    If the module defines transform_many() and a batcher is passed, the
+    document is transformed as part of a batch. Otherwise, transform() is
+    called. Only the optional arguments that the transform declares are
+    passed. If the transform returns an awaitable, it is awaited.
+
+    Args:
+        module: The imported plugin module as returned by importlib.
+        doc_text (string): The decoded document text.
+        previous (PreviousSnapshot): The job's latest snapshot or None.
+        context (TransformContext): The run's shared resources.
+        batcher (TransformBatcher): The run's batcher, if batching is enabled.
+
+    Returns:
+        tuple: The transformed text and the plugin's is_changed flag. The flag
+            is None if the plugin left the decision to the core.
+
+    """
+    if batcher and callable(getattr(module, 'transform_many', None)):
+        return await batcher.transform(module, doc_text, previous=previous)
+
+    kwargs = {}
+    if accepts_argument(module.transform, 'previous'):
+        kwargs['previous'] = previous
+    if accepts_argument(module.transform, 'context'):
+        kwargs['context'] = context
+
+    result = module.transform(doc_text, **kwargs)
+    if inspect.isawaitable(result):
+        result = await result
+
+    return _unpack_result(result)
+
+async def transform_pipeline(
+    stages,
+    doc_text,
+    previous=None,
+    context=None,
+    batcher=None,
+    stage_cache=None):
+    """
+    Pass a document through each stage of a transform pipeline in order.
+
+    A single-stage pipeline is equivalent to transform_document(). In longer
+    pipelines, cacheable stages' outputs are taken from stage_cache when
+    available. The plugins' is_changed flags are combined: False if any stage
+    returned False, True if any stage returned True, None otherwise.
+
+    Args:
+        stages (sequence): (module, module_version) tuples in execution order.
+        doc_text (string): The decoded document text.
+        previous (PreviousSnapshot): The job's latest snapshot or None.
+        context (TransformContext): The run's shared resources.
+        batcher (TransformBatcher): The run's batcher, if batching is enabled.
+        stage_cache (StageCache): The run's stage cache. Stages are never
+            cached if None.
+
+    Returns:
+        tuple: The final transformed text and the combined is_changed flag.
+
+    """
+    if len(stages) == 1:
+        return await transform_document(
+            stages[0][0],
+            doc_text,
+            previous=previous,
+            context=context,
+            batcher=batcher)
+
+    text = doc_text
+    is_changed = None
+    for module, module_version in stages:
+        if stage_cache and is_cacheable(module):
+            async def _compute(module=module, text=text):
+                stage_text, stage_is_changed = await transform_document(
+                    module,
+                    text,
+                    previous=previous,
+                    context=context,
+                    batcher=batcher)
+                return stage_text
+            key = (
+                module.__name__,
+                module_version,
+                command_utils.get_digest(text))
+            text = await stage_cache.get_or_compute(key, _compute)
+        else:
+            text, stage_is_changed = await transform_document(
+                module,
+                text,
+                previous=previous,
+                context=context,
+                batcher=batcher)
+            if stage_is_changed is not None and not stage_is_changed:
+                is_changed = False
+            elif stage_is_changed and is_changed is None:
+                is_changed = True
+
+    return text, is_changed
+
+async def transform_stream(
+    module,
+    chunks,
+    output_file,
+    previous=None,
+    context=None):
+    """
+    Pass a document through a plugin module's streaming transform.
+
+    Output chunks are hashed, fingerprinted, and written to output_file as they
+    are yielded. Each chunk is fingerprinted in the loop's default executor
+    since SimHasher is pure Python.
+
+    Args:
+        module: The imported plugin module. Must define transform_stream().
+        chunks: An asynchronous iterator of decoded document text chunks.
+        output_file (file): A text file to which output chunks are written.
+        previous (PreviousSnapshot): The job's latest snapshot or None.
+        context (TransformContext): The run's shared resources.
+
+    Returns:
+        tuple: The SHA-256 hex digest and the SimHash fingerprint of the
+            transformed text.
+
+    """
+    kwargs = {}
+    if accepts_argument(module.transform_stream, 'previous'):
+        kwargs['previous'] = previous
+    if accepts_argument(module.transform_stream, 'context'):
+        kwargs['context'] = context
+
+    loop = asyncio.get_event_loop()
+    simhasher = django_docsnaps.fingerprints.SimHasher()
+    text_hash = hashlib.sha256()
+    async for chunk in module.transform_stream(chunks, **kwargs):
+        await loop.run_in_executor(None, simhasher.update, chunk)
+        text_hash.update(chunk.encode('utf-8'))
+        output_file.write(chunk)
+
+    return text_hash.hexdigest(), simhasher.get_fingerprint()
+
+def _unpack_result(result):
+    """
+    Normalize a transform's return value to a (text, is_changed) tuple.
+
+    """
+    if isinstance(result, tuple):
+        transformed_text, is_changed = result
+    else:
+        transformed_text, is_changed = result, None
+
+    return transformed_text, is_changed
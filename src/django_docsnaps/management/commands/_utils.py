@@ -3,13 +3,194 @@ A module that provides a few utility functions and/or classes.
 
 """
 
+import asyncio
+import codecs
 import collections
+import datetime
+import email.message
+import email.utils
+import functools
+import hashlib
+import urllib.parse
+
+import chardet
+import chardet.universaldetector
 
 import django.core.management.base
 import django.core.management.color
 import django.db.models.fields.related
 
 
+class RequestLimiter:
+    """
+    Limits the concurrency and rate of HTTP requests issued during a run.
+
+    A global limit caps the number of requests in flight. A per-host limit and
+    a minimum delay between the starts of requests to the same host keep the
+    run polite to each origin. All requests issued by a run, including those
+    issued by plugin transforms, should pass through a single instance.
+
+    Usage:
+        async with request_limiter.limit(url):
+            ...
+
+    """
+
+    def __init__(
+        self,
+        max_requests=None,
+        max_host_requests=None,
+        host_delay=0,
+        loop=None):
+        """
+        Initialize an instance.
+
+        Args:
+            max_requests (int): The maximum number of concurrent requests. None
+                for no limit.
+            max_host_requests (int): The maximum number of concurrent requests
+                to a single host. None for no limit.
+            host_delay (float): The minimum number of seconds between the
+                starts of requests to the same host.
+            loop: The asyncio event loop. Defaults to the current event loop.
+
+        """
+        self._host_delay = host_delay
+        self._host_next_start = {}
+        self._host_semaphores = {}
+        self._loop = loop or asyncio.get_event_loop()
+        self._max_host_requests = max_host_requests
+        self._semaphore = None
+        if max_requests:
+            self._semaphore = asyncio.Semaphore(max_requests)
+
+    def _get_host_semaphore(self, host):
+        semaphore = None
+        if self._max_host_requests:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self._max_host_requests)
+                self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def _wait_for_host(self, host):
+        """
+        Sleep until a new request to the host may start.
+
+        Start times are reserved before sleeping so that concurrent waiters are
+        spaced out rather than all waking at once.
+
+        """
+        if self._host_delay:
+            now = self._loop.time()
+            start = max(now, self._host_next_start.get(host, now))
+            self._host_next_start[host] = start + self._host_delay
+            if start > now:
+                await asyncio.sleep(start - now)
+
+    def limit(self, url):
+        """
+        Get an asynchronous context manager that holds a request slot for a URL.
+
+        Args:
+            url (string): The URL that will be requested.
+
+        Returns:
+            _RequestSlot: The context manager.
+
+        """
+        return _RequestSlot(self, urllib.parse.urlsplit(url).netloc.lower())
+
+
+class _RequestSlot:
+    """
+    An asynchronous context manager returned by RequestLimiter.limit().
+
+    """
+
+    def __init__(self, request_limiter, host):
+        self._acquired = []
+        self._host = host
+        self._request_limiter = request_limiter
+
+    async def __aenter__(self):
+        semaphores = (
+            self._request_limiter._semaphore,
+            self._request_limiter._get_host_semaphore(self._host))
+        try:
+            for semaphore in semaphores:
+                if semaphore:
+                    await semaphore.acquire()
+                    self._acquired.append(semaphore)
+            await self._request_limiter._wait_for_host(self._host)
+        except BaseException:
+            self._release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._release()
+
+    def _release(self):
+        while self._acquired:
+            self._acquired.pop().release()
+
+
+def decode_body(body, charsets=()):
+    """
+    Decode a document body, detecting its encoding only when necessary.
+
+    Each candidate charset is tried in order. If none is given or none decodes
+    the body, chardet is used. Detection examines the entire body and is by
+    far the most CPU-intensive part of decoding.
+
+    Args:
+        body (bytes): The raw document body.
+        charsets (iterable): Candidate charset names. None values are skipped.
+
+    Returns:
+        tuple: The decoded text, the charset used, and a boolean that is True
+            if the charset was detected rather than taken from the candidates.
+
+    """
+    for charset in charsets:
+        if charset:
+            try:
+                return body.decode(charset), charset, False
+            except (LookupError, UnicodeDecodeError):
+                pass
+
+    charset = chardet.detect(body)['encoding']
+    charset = charset.lower() if charset else 'utf-8'
+
+    return body.decode(charset, errors='replace'), charset, True
+
+def detect_file_charset(body_file, chunk_size):
+    """
+    Detect the charset of a file's contents, reading as little as possible.
+
+    The file is fed to chardet in chunks and reading stops as soon as chardet
+    is confident. The file is returned to its start afterward.
+
+    Args:
+        body_file (file): A binary file positioned at its start.
+        chunk_size (int): The number of bytes to read at a time.
+
+    Returns:
+        string: The lowercase charset name. Defaults to utf-8.
+
+    """
+    detector = chardet.universaldetector.UniversalDetector()
+    for chunk in iter(lambda: body_file.read(chunk_size), b''):
+        detector.feed(chunk)
+        if detector.done:
+            break
+    detector.close()
+    body_file.seek(0)
+
+    charset = detector.result['encoding']
+
+    return charset.lower() if charset else 'utf-8'
+
 def flatten_model_graph(model):
     """
     Recursively yield related model instances in a relationship graph.
@@ -56,6 +237,192 @@ def flatten_model_graph(model):
                 model_queue.append(getattr(current_model, field.name))
         yield current_model
 
+def get_content_type_charset(content_type):
+    """
+    Get the charset parameter from a Content-Type header value.
+
+    The standard library's email package already implements the header parameter
+    parsing rules so it is used here rather than a hand-rolled regex.
+
+    Args:
+        content_type (string): The value of a Content-Type HTTP header. May be
+            None.
+
+    Returns:
+        string: The lowercase charset name or None if the header is absent or
+            has no charset parameter.
+
+    """
+    charset = None
+    if content_type:
+        message = email.message.Message()
+        message['content-type'] = content_type
+        charset = message.get_content_charset()
+
+    return charset
+
+def get_digest(data):
+    """
+    Get the SHA-256 hex digest of a document body or text.
+
+    Args:
+        data (bytes or string): The data to hash. Strings are encoded as UTF-8.
+
+    Returns:
+        string: The 64-character hex digest.
+
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    return hashlib.sha256(data).hexdigest()
+
+def get_freshness_lifetime(headers, now=None):
+    """
+    Get the number of seconds for which a response's body remains fresh.
+
+    Only explicit freshness is used, as a shared cache would determine it. The
+    s-maxage and max-age Cache-Control directives take precedence over the
+    Expires header, which is relative to the Date header. The Age header, if
+    any, is subtracted. No heuristic freshness is assumed.
+
+    Args:
+        headers: A mapping of response header names to values, such as an
+            aiohttp response's headers. Names must be matched insensitively.
+        now (datetime.datetime): The aware datetime at which the response was
+            received. Defaults to the current datetime.
+
+    Returns:
+        int: The remaining lifetime in seconds, which may be zero, or None if
+            the response does not declare one.
+
+    See:
+        https://tools.ietf.org/html/rfc7234#section-4.2.1
+
+    """
+    directives = {}
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.partition('=')
+        directives[name.strip().lower()] = value.strip().strip('"')
+
+    if 'no-store' in directives or 'no-cache' in directives:
+        return 0
+
+    lifetime = None
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                lifetime = int(directives[name])
+            except ValueError:
+                lifetime = 0
+            break
+
+    if lifetime is None and 'Expires' in headers:
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        expires = _parse_http_date(headers['Expires'])
+        date = _parse_http_date(headers.get('Date', '')) or now
+        lifetime = 0
+        if expires is not None:
+            lifetime = int((expires - date).total_seconds())
+
+    if lifetime is None:
+        return None
+
+    try:
+        lifetime -= int(headers.get('Age', 0))
+    except ValueError:
+        pass
+
+    return max(lifetime, 0)
+
+@functools.lru_cache(maxsize=None)
+def get_module_version(module):
+    """
+    Get a string that changes whenever a plugin module's behavior may change.
+
+    The module's __version__ attribute is used when defined. Otherwise, the
+    digest of the module's source file is used so that editing an unversioned
+    plugin still invalidates previously skipped documents. The result is cached
+    for the life of the process since plugin modules are not reloaded.
+
+    Args:
+        module: The imported plugin module as returned by importlib.
+
+    Returns:
+        string: The module version or None if it cannot be determined.
+
+    """
+    version = getattr(module, '__version__', None)
+    if version is not None:
+        version = str(version)
+    elif getattr(module, '__file__', None):
+        with open(module.__file__, 'rb') as module_file:
+            version = get_digest(module_file.read())
+
+    return version
+
+def is_known_charset(charset):
+    """
+    Determine if a charset name is one that Python can decode.
+
+    Args:
+        charset (string): A charset name. May be None.
+
+    Returns:
+        bool: True if a codec exists for the charset.
+
+    """
+    if not charset:
+        return False
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return False
+
+    return True
+
+async def iter_decoded_chunks(body_file, charset, chunk_size):
+    """
+    Asynchronously yield a binary file's contents as decoded text chunks.
+
+    An incremental decoder is used so that multi-byte characters split across
+    chunk boundaries are decoded correctly. Undecodable bytes are replaced.
+
+    Args:
+        body_file (file): A binary file positioned at its start.
+        charset (string): The charset with which to decode.
+        chunk_size (int): The number of bytes to read at a time.
+
+    Yields:
+        string: Decoded text chunks. Empty chunks are not yielded.
+
+    """
+    decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+    for chunk in iter(lambda: body_file.read(chunk_size), b''):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+def _parse_http_date(value):
+    """
+    Parse an HTTP date into an aware datetime or None if it is invalid.
+
+    """
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+
+    return parsed
+
 def raise_command_error(stdout, message):
     """
     Raise a CommandError and writes a failure string to stdout.
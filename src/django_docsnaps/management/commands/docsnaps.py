@@ -5,9 +5,30 @@ install
     Import a docsnaps plugin module and add its snapshot jobs to the docsnaps
     system.
 
+cluster-changes
+    Group similar changes made to different documents within a time window so
+    that a change pushed to many documents can be reviewed as one event.
+
+deliver-events
+    Deliver the change events recorded when new snapshots were saved to the
+    configured sinks, such as webhooks.
+
+hint
+    Mark the jobs of documents known to have changed, by their URLs, to be
+    checked by the next run regardless of their poll intervals.
+
+replay-spool
+    Load the snapshots that runs spooled to a local file when the database
+    failed or was too slow to save them.
+
+search
+    Find the snapshots whose texts contain words or a phrase, most relevant
+    first, or create the full-text index of snapshot texts.
+
 run
-    Check all active snapshot jobs and, if a document has changed since the last
-    snapshot, a new snapshot will be taken.
+    Check all due snapshot jobs and, if a document has changed since the last
+    snapshot, a new snapshot will be taken. Pass --force to check every enabled
+    job.
 
 """
 
@@ -15,8 +36,13 @@ import argparse
 
 import django.core.management.base
 
+from django_docsnaps.management.commands import _cluster
+from django_docsnaps.management.commands import _deliver
+from django_docsnaps.management.commands import _hint
 from django_docsnaps.management.commands import _install
-# from . import _run as run_parser
+from django_docsnaps.management.commands import _replay
+from django_docsnaps.management.commands import _run
+from django_docsnaps.management.commands import _search
 
 
 class Command(django.core.management.base.BaseCommand):
@@ -31,10 +57,34 @@ class Command(django.core.management.base.BaseCommand):
 
         """
         super().__init__(stdout=stdout, stderr=stderr, no_color=no_color)
+        self._cluster = _cluster.Command(
+            stdout=stdout,
+            stderr=stderr,
+            no_color=no_color)
+        self._deliver = _deliver.Command(
+            stdout=stdout,
+            stderr=stderr,
+            no_color=no_color)
+        self._hint = _hint.Command(
+            stdout=stdout,
+            stderr=stderr,
+            no_color=no_color)
         self._install = _install.Command(
             stdout=stdout,
             stderr=stderr,
             no_color=no_color)
+        self._replay = _replay.Command(
+            stdout=stdout,
+            stderr=stderr,
+            no_color=no_color)
+        self._run = _run.Command(
+            stdout=stdout,
+            stderr=stderr,
+            no_color=no_color)
+        self._search = _search.Command(
+            stdout=stdout,
+            stderr=stderr,
+            no_color=no_color)
 
     def add_arguments(self, parser):
         """
@@ -66,11 +116,47 @@ class Command(django.core.management.base.BaseCommand):
         self._install.add_arguments(install_parser)
         install_parser.set_defaults(handler=self._install.handle)
 
+        # "cluster-changes" subcommand.
+        cluster_parser = subparsers.add_parser(
+            'cluster-changes',
+            help=self._cluster.help)
+        self._cluster.add_arguments(cluster_parser)
+        cluster_parser.set_defaults(handler=self._cluster.handle)
+
+        # "deliver-events" subcommand.
+        deliver_parser = subparsers.add_parser(
+            'deliver-events',
+            help=self._deliver.help)
+        self._deliver.add_arguments(deliver_parser)
+        deliver_parser.set_defaults(handler=self._deliver.handle)
+
+        # "hint" subcommand.
+        hint_parser = subparsers.add_parser(
+            'hint',
+            help=self._hint.help)
+        self._hint.add_arguments(hint_parser)
+        hint_parser.set_defaults(handler=self._hint.handle)
+
+        # "replay-spool" subcommand.
+        replay_parser = subparsers.add_parser(
+            'replay-spool',
+            help=self._replay.help)
+        self._replay.add_arguments(replay_parser)
+        replay_parser.set_defaults(handler=self._replay.handle)
+
+        # "search" subcommand.
+        search_parser = subparsers.add_parser(
+            'search',
+            help=self._search.help)
+        self._search.add_arguments(search_parser)
+        search_parser.set_defaults(handler=self._search.handle)
+
         # "run" subcommand.
-        # run_parser = subparsers.add_parser(
-            # 'run',
-            # help=subcommand_run.HELP)
-        # run_parser.set_defaults(handler=subcommand_run.handle)
+        run_parser = subparsers.add_parser(
+            'run',
+            help=self._run.help)
+        self._run.add_arguments(run_parser)
+        run_parser.set_defaults(handler=self._run.handle)
 
     def handle(self, *args, **options):
         options['handler'](*args, **options)
@@ -27,9 +27,15 @@ See:
 
 """
 
+import json
+import re
+
+import django.core.exceptions
 import django.db.models
 import django_forcedfields as forcedfields
 
+import django_docsnaps.transforms.html_content
+
 
 class Document(django.db.models.Model):
     """
@@ -122,6 +128,38 @@ class DocumentsLanguages(django.db.models.Model):
     stored in the DB as a tinyint using eight bytes since MariaDB/MySQL stores
     bit fields in an integer type field (tinyint) anyway.
 
+    charset is the character encoding that was last detected for the
+    document's response body when the server omitted a charset. Encoding
+    detection is expensive so the result is cached here and reused on later runs
+    until decoding with it fails.
+
+    response_digest and module_version record the SHA-256 digest of the raw
+    response body and the version of the plugin module that transformed it on
+    the last run. If both are unchanged on the next run, the document cannot
+    have changed and the plugin's transform is not called at all.
+
+    similarity_threshold is the largest number of bits in which a new
+    snapshot's SimHash fingerprint may differ from the latest snapshot's and
+    still be considered a near-duplicate. Near-duplicates, such as reflowed
+    text or one-word edits to boilerplate, are not saved. When null, every
+    changed document is saved.
+
+    checked_datetime is when the run last completed the job, whether or not
+    the document had changed. The datetime of the job's latest snapshot is
+    when the document last changed.
+
+    poll_interval is the minimum number of seconds between the run's checks of
+    the job. When null, the job is checked by every run. Jobs whose origins
+    send hints when a document changes can be given a long fallback interval.
+    fetch_requested_datetime is when such a hint was last received for the
+    job's URL. A job with a pending hint is checked by the next run regardless
+    of its interval. url is indexed so that hints are mapped to jobs quickly.
+
+    fresh_until_datetime is when the last fetched response stops being fresh,
+    as declared by its Cache-Control or Expires headers and capped by
+    DJANGO_DOCSNAPS_MAX_FRESHNESS. The run does not check a job whose response
+    is still fresh unless a fetch was requested or the run is forced.
+
     """
 
     documents_languages_id = django.db.models.AutoField(primary_key=True)
@@ -136,8 +174,55 @@ class DocumentsLanguages(django.db.models.Model):
         on_delete=django.db.models.PROTECT,
         verbose_name='language')
     url = django.db.models.URLField(
-        blank=False, default=None, max_length=255, null=False)
+        blank=False, db_index=True, default=None, max_length=255, null=False)
     is_enabled = django.db.models.BooleanField(default=True)
+    charset = django.db.models.CharField(
+        blank=True,
+        default=None,
+        max_length=40,
+        null=True,
+        help_text='The cached, detected character encoding of the document.')
+    response_digest = forcedfields.FixedCharField(
+        blank=True,
+        default=None,
+        max_length=64,
+        null=True,
+        help_text='SHA-256 hex digest of the last fetched response body.')
+    module_version = django.db.models.CharField(
+        blank=True,
+        default=None,
+        max_length=64,
+        null=True,
+        help_text='The plugin module version that last transformed the body.')
+    similarity_threshold = django.db.models.PositiveSmallIntegerField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text=(
+            'Suppress snapshots whose fingerprints differ from the latest '
+            'snapshot\'s in at most this many bits.'))
+    checked_datetime = django.db.models.DateTimeField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text='When the document was last fetched and compared.')
+    poll_interval = django.db.models.PositiveIntegerField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text=(
+            'The minimum number of seconds between checks. Leave blank to '
+            'check the document on every run.'))
+    fetch_requested_datetime = django.db.models.DateTimeField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text='When a change hint for the URL was last received.')
+    fresh_until_datetime = django.db.models.DateTimeField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text='When the last fetched response stops being fresh.')
     updated_timestamp = forcedfields.TimestampField(auto_now=True)
 
     class Meta:
@@ -157,6 +242,29 @@ class Snapshot(django.db.models.Model):
     for each field occur too slowly, they will produce times that differ by one
     second or more.
 
+    digest is the SHA-256 hex digest of the snapshot text. It allows the run to
+    compare a newly-transformed document against the latest snapshot without
+    loading the latest snapshot's text.
+
+    simhash is the SimHash fingerprint of the snapshot text, stored as a signed
+    64-bit integer. It allows near-duplicates to be detected without loading
+    or diffing the latest snapshot's text.
+
+    lines_added, lines_removed, changed_ratio, and hunks summarize the
+    line-level differences from the job's previous snapshot. They are computed
+    once, when the snapshot is saved, so that readers need not diff texts.
+    changed_ratio is the fraction of both texts' bytes in changed lines. hunks
+    is a compact JSON index of [old_start, old_count, new_start, new_count]
+    lists with zero-based starts. All are null for a job's first snapshot.
+
+    change_cluster_id relates the snapshot to the cluster of similar changes,
+    made to other documents in the same period, to which it was assigned by the
+    cluster-changes subcommand. It is null if the change was not similar to any
+    other.
+
+    See:
+        django_docsnaps.fingerprints
+
     """
 
     snapshot_id = django.db.models.AutoField(primary_key=True)
@@ -172,6 +280,55 @@ class Snapshot(django.db.models.Model):
         db_index=True,
         null=False)
     text = django.db.models.TextField(blank=True, null=True)
+    digest = forcedfields.FixedCharField(
+        blank=True,
+        default=None,
+        max_length=64,
+        null=True,
+        help_text='SHA-256 hex digest of the snapshot text.')
+    simhash = django.db.models.BigIntegerField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text='SimHash fingerprint of the snapshot text.')
+    lines_added = django.db.models.PositiveIntegerField(
+        blank=True,
+        default=None,
+        null=True)
+    lines_removed = django.db.models.PositiveIntegerField(
+        blank=True,
+        default=None,
+        null=True)
+    changed_ratio = django.db.models.FloatField(
+        blank=True,
+        default=None,
+        null=True)
+    hunks = django.db.models.TextField(
+        blank=True,
+        default=None,
+        null=True,
+        help_text='JSON list of changed line ranges.')
+    change_cluster_id = django.db.models.ForeignKey(
+        'ChangeCluster',
+        blank=True,
+        db_column='change_cluster_id',
+        default=None,
+        null=True,
+        on_delete=django.db.models.SET_NULL,
+        verbose_name='change cluster')
+
+    def get_hunks(self):
+        """
+        Get the parsed hunk index.
+
+        Returns:
+            list: (old_start, old_count, new_start, new_count) tuples or None
+                if the snapshot has no diff summary.
+
+        """
+        if self.hunks is None:
+            return None
+        return [tuple(hunk) for hunk in json.loads(self.hunks)]
 
     class Meta:
         db_table = 'snapshot'
@@ -180,47 +337,319 @@ class Snapshot(django.db.models.Model):
         unique_together = ['documents_languages_id', 'datetime']
 
 
-# class Transform(models.Model):
-    # """
-    # A transform class to which to pass a newly-fetched document snapshot.
+class Transform(django.db.models.Model):
+    """
+    A transform class to which to pass a newly-fetched document snapshot.
+
+    This table is designed to relate plugin modules and their supplied
+    transforms to the documents they registered when installed.
+
+    Natural key: the unique combination of document and module.
+    There is currently no correct reason to double-register a module for the
+    same snapshot job. When a plugin module's transform is passed data from a
+    recent snapshot, it can internally differentiate between the document's
+    language or other data. There is no reason to tie this relationship to the
+    higher cardinality of DocumentsLanguages.
+
+    The module field will contain absolute, fully-qualified module names that
+    can be directly passed to importlib. Do not include the module's transform
+    callable attribute in the name as that is part of the standardized interface
+    and will be called automatically.
+
+    Using a separate table rather than adding "module" to Documents
+    allows for more flexible relationships, the addition of dependent fields,
+    and for chained transform "pipelines" (see below).
+
+    Execution priority exists so that multiple plugin modules can register to
+    transform the same document. This forms a transform "pipeline" and allows
+    altering transforms without having to edit third-party plugin module code.
+    This field will largely be manually managed by the user. All records with
+    identical priority returned by a given query will be sorted in arbitrary
+    order to be determined by the DBMS. Lower priorities execute first and each
+    transform receives the output of the one before it.
+
+    A document with no Transform records is transformed by its own module.
+
+    """
+
+    transform_id = django.db.models.AutoField(primary_key=True)
+    document_id = django.db.models.ForeignKey(
+        Document,
+        db_column='document_id',
+        on_delete=django.db.models.PROTECT,
+        verbose_name='document')
+    module = django.db.models.CharField(
+        blank=False,
+        default=None,
+        max_length=255,
+        null=False)
+    execution_priority = django.db.models.SmallIntegerField(
+        default=0,
+        null=False)
+
+    def __str__(self):
+        return self.module
+
+    class Meta:
+        db_table = 'transform'
+        unique_together = ('document_id', 'module')
+
 
-    # This table is designed to relate plugin modules and their supplied
-    # transforms to the documents they registered when installed.
+class TransformResult(django.db.models.Model):
+    """
+    A cached output of a single transform pipeline stage.
+
+    A stage is identified by its module and module version. Given the same
+    input, identified by its digest, a stage produces the same output so the
+    output is cached here and reused in place of calling the stage again. When
+    an upstream stage's output is unchanged, every downstream stage is a cache
+    hit. Stages shared between documents are computed once per distinct input.
+
+    Results are not tied to a document. updated_timestamp is refreshed when a
+    result is used, at most once per half of DJANGO_DOCSNAPS_STAGE_CACHE_TTL,
+    and results unused for longer than the TTL are deleted at the end of each
+    run.
+
+    """
 
-    # Natural key: the unique combination of document and module.
-    # There is currently no correct reason to double-register a module for the
-    # same snapshot job. When a plugin module's transform is passed data from a
-    # recent snapshot, it can internally differentiate between the document's
-    # language or other data. There is no reason to tie this relationship to the
-    # higher cardinality of DocumentsLanguages.
+    transform_result_id = django.db.models.AutoField(primary_key=True)
+    module = django.db.models.CharField(
+        blank=False,
+        default=None,
+        max_length=255,
+        null=False)
+    module_version = django.db.models.CharField(
+        blank=False,
+        default=None,
+        max_length=64,
+        null=False)
+    input_digest = forcedfields.FixedCharField(
+        blank=False,
+        default=None,
+        max_length=64,
+        null=False)
+    text = django.db.models.TextField(blank=True, null=True)
+    updated_timestamp = forcedfields.TimestampField(auto_now=True)
 
-    # The module field will contain absolute, fully-qualified module names that
-    # can be directly passed to importlib. Do not include the module's transform
-    # callable attribute in the name as that is part of the standardized interface
-    # and will be called automatically.
+    class Meta:
+        db_table = 'transform_result'
+        unique_together = ('module', 'module_version', 'input_digest')
 
-    # Using a separate table rather than adding "module" to Documents
-    # allows for more flexible relationships, the addition of dependent fields,
-    # and for chained transform "pipelines" (see below).
 
-    # Execution priority exists so that multiple plugin modules can register to
-    # transform the same document. This forms a transform "pipeline" and allows
-    # altering transforms without having to edit third-party plugin module code.
-    # This field will largely be manually managed by the user. All records with
-    # identical priority returned by a given query will be sorted in arbitrary
-    # order to be determined by the DBMS.
+class ChangeCluster(django.db.models.Model):
+    """
+    A group of similar changes made to different documents.
 
-    # """
+    A vendor often pushes the same boilerplate change to many documents at once.
+    Each such change creates a snapshot per document. The snapshots are related
+    to a single cluster so that the change may be reviewed as one event.
 
-    # transform_id = models.AutoField(primary_key=True)
-    # document_id = models.ForeignKey(
-        # Document, db_column='document_id',
-        # on_delete=models.PROTECT, verbose_name='document')
-    # module = models.CharField(
-        # blank=False, default=None, max_length=255, null=False)
-    # execution_priority = models.SmallIntegerField(default=0, null=False)
+    Clusters are created by the cluster-changes subcommand. The snapshot count
+    and the datetimes of the first and last snapshots are denormalized here so
+    that clusters may be listed without aggregating snapshots.
 
-    # class Meta:
-        # db_table = 'transform'
-        # unique_together = ('document_id', 'module')
+    """
 
+    change_cluster_id = django.db.models.AutoField(primary_key=True)
+    snapshot_count = django.db.models.PositiveIntegerField(
+        default=0,
+        null=False)
+    first_datetime = django.db.models.DateTimeField(
+        db_index=True,
+        default=None,
+        null=False)
+    last_datetime = django.db.models.DateTimeField(default=None, null=False)
+    updated_timestamp = forcedfields.TimestampField(auto_now=True)
+
+    def __str__(self):
+        return '{!s} changes from {!s}'.format(
+            self.snapshot_count,
+            self.first_datetime)
+
+    class Meta:
+        db_table = 'change_cluster'
+
+
+class IgnoreRule(django.db.models.Model):
+    """
+    A pattern of noise to remove from documents before change detection.
+
+    Rotating CSRF tokens, timestamps, and session IDs make documents appear to
+    change on every run. Ignore rules remove such noise from the decoded
+    document before it is transformed and hashed.
+
+    A rule applies to a single job when documents_languages_id is set and to
+    every job whose transform pipeline includes a module when module is set.
+    At least one of the two must be set.
+
+    A regex rule removes every match of its pattern. Each pattern is compiled
+    on its own so it may use inline flags and backreferences. A selector rule
+    removes every HTML element, and its content, matching its pattern. Only
+    simple selectors are supported: a tag name, #id, .class, and [attribute] or
+    [attribute=value], in any combination.
+
+    """
+
+    RULE_TYPE_REGEX = 'regex'
+    RULE_TYPE_SELECTOR = 'selector'
+    RULE_TYPE_CHOICES = (
+        (RULE_TYPE_REGEX, 'Regular expression'),
+        (RULE_TYPE_SELECTOR, 'HTML selector'))
+
+    ignore_rule_id = django.db.models.AutoField(primary_key=True)
+    documents_languages_id = django.db.models.ForeignKey(
+        DocumentsLanguages,
+        blank=True,
+        db_column='documents_languages_id',
+        default=None,
+        null=True,
+        on_delete=django.db.models.PROTECT,
+        verbose_name='document instance')
+    module = django.db.models.CharField(
+        blank=True,
+        default=None,
+        max_length=255,
+        null=True,
+        help_text='Apply to every job whose pipeline includes this module.')
+    rule_type = django.db.models.CharField(
+        blank=False,
+        choices=RULE_TYPE_CHOICES,
+        default=RULE_TYPE_REGEX,
+        max_length=8,
+        null=False)
+    pattern = django.db.models.CharField(
+        blank=False,
+        default=None,
+        max_length=255,
+        null=False)
+    is_enabled = django.db.models.BooleanField(default=True)
+    updated_timestamp = forcedfields.TimestampField(auto_now=True)
+
+    def __str__(self):
+        return self.pattern
+
+    def clean(self):
+        """
+        Validate the rule's scope and pattern.
+
+        Raises:
+            django.core.exceptions.ValidationError
+
+        """
+        if self.documents_languages_id_id is None and not self.module:
+            raise django.core.exceptions.ValidationError(
+                'An ignore rule requires a document instance, a module, or '
+                'both.')
+
+        try:
+            if self.rule_type == self.RULE_TYPE_SELECTOR:
+                django_docsnaps.transforms.html_content.Selector(
+                    self.pattern)
+            else:
+                re.compile(self.pattern)
+        except (re.error, ValueError) as exception:
+            raise django.core.exceptions.ValidationError(
+                {'pattern': str(exception)})
+
+    class Meta:
+        db_table = 'ignore_rule'
+
+
+class ChangeEvent(django.db.models.Model):
+    """
+    A pending notification that a document changed.
+
+    Inserted in the transaction that saves a new snapshot and deleted once
+    delivered to every configured sink. The table is therefore an outbox of
+    undelivered events and stays small while the deliver-events subcommand
+    keeps up.
+
+    payload is the JSON event delivered to sinks, to which the
+    change_event_id is added. A failed delivery increments attempts, records
+    the error, and postpones the event until next_attempt_datetime. Events
+    whose attempts reach DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS are no longer
+    delivered but remain for inspection.
+
+    See:
+        django_docsnaps.events
+
+    """
+
+    change_event_id = django.db.models.AutoField(primary_key=True)
+    snapshot_id = django.db.models.ForeignKey(
+        Snapshot,
+        db_column='snapshot_id',
+        on_delete=django.db.models.CASCADE,
+        verbose_name='snapshot')
+    payload = django.db.models.TextField(
+        blank=False,
+        default=None,
+        null=False)
+    attempts = django.db.models.PositiveSmallIntegerField(
+        default=0,
+        null=False)
+    next_attempt_datetime = django.db.models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        null=False)
+    last_error = django.db.models.TextField(
+        blank=True,
+        default=None,
+        null=True)
+    created_datetime = django.db.models.DateTimeField(
+        auto_now_add=True,
+        null=False)
+
+    class Meta:
+        db_table = 'change_event'
+
+
+class Run(django.db.models.Model):
+    """
+    An execution of the run subcommand over its due jobs.
+
+    As jobs complete, a run records them in batches as RunCheckpoint records.
+    A run killed before all of its jobs completed is left unfinished and may be
+    continued by "run --resume", which executes only the due jobs that it has
+    not checkpointed. A run in which any job failed is also left unfinished. A
+    run started without --resume finishes the earlier unfinished runs, which
+    could then never be resumed. A finished run's checkpoints are deleted.
+
+    """
+
+    run_id = django.db.models.AutoField(primary_key=True)
+    is_forced = django.db.models.BooleanField(default=False, null=False)
+    started_datetime = django.db.models.DateTimeField(
+        auto_now_add=True,
+        null=False)
+    finished_datetime = django.db.models.DateTimeField(
+        blank=True,
+        default=None,
+        null=True)
+
+    class Meta:
+        db_table = 'run'
+        get_latest_by = 'run_id'
+
+
+class RunCheckpoint(django.db.models.Model):
+    """
+    A job completed without an exception by an unfinished run.
+
+    """
+
+    run_checkpoint_id = django.db.models.AutoField(primary_key=True)
+    run_id = django.db.models.ForeignKey(
+        Run,
+        db_column='run_id',
+        on_delete=django.db.models.CASCADE,
+        verbose_name='run')
+    documents_languages_id = django.db.models.ForeignKey(
+        DocumentsLanguages,
+        db_column='documents_languages_id',
+        on_delete=django.db.models.CASCADE,
+        verbose_name='document instance')
+
+    class Meta:
+        db_table = 'run_checkpoint'
+        unique_together = ('run_id', 'documents_languages_id')
@@ -0,0 +1,181 @@
+"""
+Paginators for tables too large to count exactly or to page by offset.
+
+An exact COUNT(*) of a large InnoDB or PostgreSQL table requires a full scan of
+an index. The admin runs one for every changelist page.
+
+An OFFSET requires the database to read and discard every preceding row so deep
+pages of snapshot history are paginated by keyset instead.
+
+"""
+
+import base64
+import binascii
+import collections
+import json
+
+import django.core.paginator
+import django.db
+import django.db.models
+import django.utils.dateparse
+import django.utils.functional
+
+
+def get_estimated_count(model, using='default'):
+    """
+    Get the database's own estimate of the number of rows in a model's table.
+
+    The estimate is read from the database's statistics in constant time.
+    Only MySQL, MariaDB, and PostgreSQL maintain such an estimate.
+
+    Args:
+        model: The model class.
+        using (string): The database alias.
+
+    Returns:
+        int: The estimated row count or None if no estimate is available.
+
+    """
+    connection = django.db.connections[using]
+    if connection.vendor == 'mysql':
+        estimate_sql = '''
+            SELECT TABLE_ROWS
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'''
+    elif connection.vendor == 'postgresql':
+        estimate_sql = '''
+            SELECT reltuples::bigint
+            FROM pg_class
+            WHERE relname = %s'''
+    else:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(estimate_sql, [model._meta.db_table])
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(django.core.paginator.Paginator):
+    """
+    A paginator that never counts more rows than necessary.
+
+    An unfiltered queryset of a large table is counted using the database's
+    estimate. A filtered queryset is counted exactly but only up to
+    max_count rows, using a LIMIT subquery, so its count is the smaller of the
+    exact count and max_count. Pages beyond max_count rows are not linked but
+    the filter may be narrowed to reach them.
+
+    Only primary keys are selected when counting so that annotations and
+    other columns of the queryset are not computed.
+
+    """
+
+    # Tables estimated to be smaller than this are counted exactly.
+    exact_count_threshold = 10000
+
+    # The maximum number of rows counted for filtered querysets.
+    max_count = 10000
+
+    @django.utils.functional.cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        queryset = queryset.values('pk')
+        if not queryset.query.where:
+            estimate = get_estimated_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate >= self.exact_count_threshold:
+                return estimate
+            return queryset.count()
+
+        return queryset.order_by()[:self.max_count].count()
+
+
+# A page of a keyset-paginated queryset. next_cursor is None on the last page.
+KeysetPage = collections.namedtuple(
+    'KeysetPage',
+    ['object_list', 'next_cursor'])
+
+
+def _decode_cursor(cursor):
+    try:
+        job_id, snapshot_datetime, snapshot_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        snapshot_datetime = django.utils.dateparse.parse_datetime(
+            snapshot_datetime)
+        if snapshot_datetime is None:
+            raise ValueError
+        return int(job_id), snapshot_datetime, int(snapshot_id)
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise ValueError('The cursor is invalid.')
+
+def _encode_cursor(snapshot):
+    cursor_json = json.dumps([
+        snapshot.documents_languages_id_id,
+        snapshot.datetime.isoformat(),
+        snapshot.snapshot_id])
+    return base64.urlsafe_b64encode(cursor_json.encode('utf-8'))\
+        .decode('ascii')
+
+def get_history_page(
+    snapshot_set,
+    cursor=None,
+    page_size=50,
+    include_text=False):
+    """
+    Get a page of snapshots, newest first, by keyset pagination.
+
+    Snapshots are ordered by job, datetime, and snapshot ID, all descending,
+    and a page starts after the snapshot identified by the cursor. The cursor is
+    applied as a range condition on the snapshot table's unique index on the
+    job and datetime rather than as an OFFSET. Every page therefore costs the
+    same regardless of its depth, and snapshots saved while paging neither
+    shift nor repeat pages.
+
+    Args:
+        snapshot_set (django.db.models.query.QuerySet): The Snapshot queryset
+            to paginate, usually filtered to a single job. Any ordering is
+            replaced.
+        cursor (string): The next_cursor of the previous page, or None for the
+            first page.
+        page_size (int): The maximum number of snapshots in the page.
+        include_text (bool): Whether to load the snapshots' texts. The texts
+            and hunk indices are deferred otherwise.
+
+    Returns:
+        KeysetPage: The page.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+
+    """
+    snapshot_set = snapshot_set.order_by(
+        '-documents_languages_id',
+        '-datetime',
+        '-snapshot_id')
+    if not include_text:
+        snapshot_set = snapshot_set.defer('text', 'hunks')
+
+    if cursor is not None:
+        job_id, snapshot_datetime, snapshot_id = _decode_cursor(cursor)
+        snapshot_set = snapshot_set\
+            .filter(documents_languages_id__lte=job_id)\
+            .filter(
+                django.db.models.Q(documents_languages_id__lt=job_id)
+                | django.db.models.Q(datetime__lt=snapshot_datetime)
+                | django.db.models.Q(
+                    datetime=snapshot_datetime,
+                    snapshot_id__lt=snapshot_id))
+
+    snapshots = list(snapshot_set[:page_size + 1])
+    next_cursor = None
+    if len(snapshots) > page_size:
+        snapshots = snapshots[:page_size]
+        next_cursor = _encode_cursor(snapshots[-1])
+
+    return KeysetPage(snapshots, next_cursor)
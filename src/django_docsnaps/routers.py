@@ -7,33 +7,119 @@ specialized data and schema is also able to be easily used in another framework
 due to the absence of dependency on or relationship with Django-specific
 functionality.
 
+Enable the router in the project's settings:
+
+    DATABASE_ROUTERS = ['django_docsnaps.routers.Router']
+
+All of the app's models are written to the database alias named by
+DJANGO_DOCSNAPS_DATABASE, the primary, or to the default alias if it is unset.
+Reads are sent to a random one of the aliases in DJANGO_DOCSNAPS_REPLICAS, if
+any, so that the admin, the API views, and the run's loading of jobs and latest
+snapshots do not compete with the run's writes. Reads are sent to the primary
+instead:
+
+- inside a transaction on the primary, so that a transaction reads its own
+  writes, and
+- inside use_primary(), for work that must not read stale data, such as
+  subcommands that read rows and then update them.
+
+Note that the run compares documents against the latest snapshots read from a
+replica. A replica lagging by more than the interval between runs may cause a
+duplicate snapshot to be saved.
+
 See:
     https://docs.djangoproject.com/en/dev/topics/db/multi-db/#automatic-database-routing
 
 """
 
-# Get config from django.conf.settings
-# APP_LABEL = 'docsnaps'
-# DB_NAME = 'docsnaps'
+import contextlib
+import contextvars
+import random
+
+import django.db
+
+import django_docsnaps.settings
+
+
+APP_LABEL = 'django_docsnaps'
+
+# Set by use_primary(). A context variable rather than a thread-local so that
+# it is also inherited by the asyncio tasks created within the block.
+_use_primary = contextvars.ContextVar(
+    'django_docsnaps_use_primary',
+    default=False)
+
+
+def get_primary_alias():
+    """
+    Get the alias of the database to which the app's models are written.
+
+    Transactions around writes of the app's models must be opened on this
+    alias rather than the default.
+
+    Returns:
+        string: The database alias.
+
+    """
+    return django_docsnaps.settings.DJANGO_DOCSNAPS_DATABASE \
+        or django.db.DEFAULT_DB_ALIAS
+
+@contextlib.contextmanager
+def use_primary():
+    """
+    Send all reads of the app's models in the block to the primary.
+
+    Blocks may be nested.
+
+    """
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
 
 class Router:
 
+    def _get_aliases(self):
+        return {get_primary_alias()} \
+            | set(django_docsnaps.settings.DJANGO_DOCSNAPS_REPLICAS)
+
     def db_for_read(self, model, **hints):
-        read_db = None
-        if model._meta.app_label == APP_LABEL:
-            read_db = DB_NAME
-        return read_db
+        if model._meta.app_label != APP_LABEL:
+            return None
+
+        primary_alias = get_primary_alias()
+        replicas = django_docsnaps.settings.DJANGO_DOCSNAPS_REPLICAS
+        if not replicas or _use_primary.get() \
+            or django.db.connections[primary_alias].in_atomic_block:
+            return primary_alias
+
+        return random.choice(replicas)
 
     def db_for_write(self, model, **hints):
-        write_db = None
-        if model._meta.app_label == APP_LABEL:
-            write_db = DB_NAME
-        return write_db
+        if model._meta.app_label != APP_LABEL:
+            return None
+
+        # Never None, which would let Django write to the database from which
+        # an instance was read, possibly a replica.
+        return get_primary_alias()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = self._get_aliases()
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+
+        return None
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
-        allow = None
-        if db == DB_NAME:
-            allow = (app_label == APP_LABEL)
-        elif app_label == APP_LABEL:
-            allow = False
-        return allow
+        primary_alias = get_primary_alias()
+        if app_label == APP_LABEL:
+            return db == primary_alias
+        elif db in django_docsnaps.settings.DJANGO_DOCSNAPS_REPLICAS:
+            return False
+        elif db == primary_alias and db != django.db.DEFAULT_DB_ALIAS:
+            # A dedicated alias holds only the app's tables.
+            return False
+
+        return None
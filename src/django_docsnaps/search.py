@@ -0,0 +1,288 @@
+"""
+Full-text search of snapshot texts.
+
+Each supported database maintains its own full-text index of the snapshot table
+so that the index is updated as part of every write of a snapshot, by the run
+or otherwise, with no work by the app:
+
+- MySQL and MariaDB: a FULLTEXT index on snapshot.text.
+- PostgreSQL: a GIN index on the text's tsvector, in the text search
+  configuration named by DJANGO_DOCSNAPS_SEARCH_CONFIG.
+- SQLite: an external content FTS5 table kept in sync with the snapshot table
+  by triggers.
+
+The index is created by create_index(), or the search subcommand's
+--create-index option, since the app's tables are not created by migrations.
+
+Queries are matched against every snapshot, not only the latest of each job,
+and results are ranked by the database's own relevance score. A phrase query
+matches the words of the query in order. Otherwise, every word must match on
+SQLite and PostgreSQL while MySQL ranks snapshots containing any of the words.
+Note that MySQL ignores stopwords and words shorter than its minimum token
+size and that PostgreSQL cannot index a text whose tsvector exceeds 1 MB.
+
+See:
+    https://dev.mysql.com/doc/refman/en/fulltext-search.html
+    https://www.postgresql.org/docs/current/textsearch-tables.html
+    https://www.sqlite.org/fts5.html#external_content_tables
+
+"""
+
+import collections
+import re
+
+import django.core.exceptions
+import django.db
+
+import django_docsnaps.models
+import django_docsnaps.settings
+
+
+# A snapshot matching a query. rank is greater for more relevant snapshots.
+SearchResult = collections.namedtuple(
+    'SearchResult',
+    ['documents_languages_id', 'snapshot_id', 'rank'])
+
+# The name of the indexed table.
+_SNAPSHOT_TABLE = django_docsnaps.models.Snapshot._meta.db_table
+
+
+class _MySQLBackend:
+
+    index_name = 'snapshot_text_fulltext'
+
+    def create_index(self, cursor):
+        cursor.execute(
+            '''
+            SELECT COUNT(*)
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                AND INDEX_NAME = %s''',
+            [_SNAPSHOT_TABLE, self.index_name])
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                'ALTER TABLE {!s} ADD FULLTEXT INDEX {!s} (text)'.format(
+                    _SNAPSHOT_TABLE,
+                    self.index_name))
+
+    def drop_index(self, cursor):
+        cursor.execute(
+            'ALTER TABLE {!s} DROP INDEX {!s}'.format(
+                _SNAPSHOT_TABLE,
+                self.index_name))
+
+    def search(self, cursor, query, phrase, limit):
+        if phrase:
+            match_sql = 'MATCH (text) AGAINST (%s IN BOOLEAN MODE)'
+            query = '"{!s}"'.format(query.replace('"', ' '))
+        else:
+            match_sql = 'MATCH (text) AGAINST (%s IN NATURAL LANGUAGE MODE)'
+        cursor.execute(
+            '''
+            SELECT documents_languages_id, snapshot_id, {0!s} AS score
+            FROM {1!s}
+            WHERE {0!s}
+            ORDER BY score DESC, snapshot_id DESC
+            LIMIT %s'''.format(match_sql, _SNAPSHOT_TABLE),
+            [query, query, limit])
+        return cursor.fetchall()
+
+
+class _PostgreSQLBackend:
+
+    index_name = 'snapshot_text_search'
+
+    def __init__(self, config):
+        if not re.fullmatch(r'\w+', config):
+            raise django.core.exceptions.ImproperlyConfigured(
+                'DJANGO_DOCSNAPS_SEARCH_CONFIG must be the name of a text '
+                'search configuration.')
+        # The indexed expression and the queried expression must be identical
+        # for the index to be used so the configuration is a literal.
+        self._vector_sql = \
+            "to_tsvector('{!s}'::regconfig, COALESCE(text, ''))".format(config)
+        self._config = config
+
+    def create_index(self, cursor):
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS {!s} ON {!s} USING GIN ({!s})'\
+                .format(self.index_name, _SNAPSHOT_TABLE, self._vector_sql))
+
+    def drop_index(self, cursor):
+        cursor.execute('DROP INDEX IF EXISTS {!s}'.format(self.index_name))
+
+    def search(self, cursor, query, phrase, limit):
+        query_function = 'phraseto_tsquery' if phrase else 'plainto_tsquery'
+        cursor.execute(
+            '''
+            SELECT documents_languages_id, snapshot_id,
+                ts_rank({0!s}, query) AS score
+            FROM {3!s}, {1!s}('{2!s}'::regconfig, %s) query
+            WHERE {0!s} @@ query
+            ORDER BY score DESC, snapshot_id DESC
+            LIMIT %s'''.format(
+                self._vector_sql,
+                query_function,
+                self._config,
+                _SNAPSHOT_TABLE),
+            [query, limit])
+        return cursor.fetchall()
+
+
+class _SQLiteBackend:
+
+    table_name = 'snapshot_search'
+
+    def create_index(self, cursor):
+        statements = [
+            '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {0!s} USING fts5(
+                text,
+                content='{1!s}',
+                content_rowid='snapshot_id')''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS {0!s}_insert
+            AFTER INSERT ON {1!s} BEGIN
+                INSERT INTO {0!s} (rowid, text)
+                VALUES (new.snapshot_id, new.text);
+            END''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS {0!s}_delete
+            AFTER DELETE ON {1!s} BEGIN
+                INSERT INTO {0!s} ({0!s}, rowid, text)
+                VALUES ('delete', old.snapshot_id, old.text);
+            END''',
+            '''
+            CREATE TRIGGER IF NOT EXISTS {0!s}_update
+            AFTER UPDATE OF text ON {1!s} BEGIN
+                INSERT INTO {0!s} ({0!s}, rowid, text)
+                VALUES ('delete', old.snapshot_id, old.text);
+                INSERT INTO {0!s} (rowid, text)
+                VALUES (new.snapshot_id, new.text);
+            END''',
+            "INSERT INTO {0!s} ({0!s}) VALUES ('rebuild')"]
+        for statement in statements:
+            cursor.execute(statement.format(self.table_name, _SNAPSHOT_TABLE))
+
+    def drop_index(self, cursor):
+        for trigger in ('insert', 'delete', 'update'):
+            cursor.execute(
+                'DROP TRIGGER IF EXISTS {!s}_{!s}'.format(
+                    self.table_name,
+                    trigger))
+        cursor.execute('DROP TABLE IF EXISTS {!s}'.format(self.table_name))
+
+    def search(self, cursor, query, phrase, limit):
+        # Quote each word as an FTS5 string so that query syntax is not
+        # interpreted. Adjacent strings must all match.
+        words = query.split()
+        if phrase:
+            words = [' '.join(words)]
+        fts_query = ' '.join(
+            '"{!s}"'.format(word.replace('"', '""')) for word in words)
+        cursor.execute(
+            '''
+            SELECT {1!s}.documents_languages_id, {1!s}.snapshot_id,
+                -bm25({0!s}) AS score
+            FROM {0!s}
+            INNER JOIN {1!s} ON {1!s}.snapshot_id = {0!s}.rowid
+            WHERE {0!s} MATCH %s
+            ORDER BY score DESC, {1!s}.snapshot_id DESC
+            LIMIT %s'''.format(self.table_name, _SNAPSHOT_TABLE),
+            [fts_query, limit])
+        return cursor.fetchall()
+
+
+def _get_backend(connection):
+    """
+    Get the full-text search implementation for a database connection.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If the database does not
+            support full-text search.
+
+    """
+    if connection.vendor == 'mysql':
+        return _MySQLBackend()
+    elif connection.vendor == 'postgresql':
+        return _PostgreSQLBackend(
+            django_docsnaps.settings.DJANGO_DOCSNAPS_SEARCH_CONFIG)
+    elif connection.vendor == 'sqlite':
+        return _SQLiteBackend()
+
+    raise django.core.exceptions.ImproperlyConfigured(
+        'Full-text search is not supported by the {!s} database '
+        'backend.'.format(connection.vendor))
+
+def _get_connection(for_write):
+    model = django_docsnaps.models.Snapshot
+    if for_write:
+        alias = django.db.router.db_for_write(model)
+    else:
+        alias = django.db.router.db_for_read(model)
+    return django.db.connections[alias or django.db.DEFAULT_DB_ALIAS]
+
+def create_index():
+    """
+    Create the full-text index of snapshot texts if it does not exist.
+
+    Existing snapshots are indexed. On large tables, this may take a long
+    time.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If the database does not
+            support full-text search.
+        django.db.Error: If the index could not be created. SQLite, for
+            example, may have been compiled without FTS5.
+
+    """
+    connection = _get_connection(True)
+    backend = _get_backend(connection)
+    with django.db.transaction.atomic(using=connection.alias), \
+        connection.cursor() as cursor:
+        backend.create_index(cursor)
+
+def drop_index():
+    """
+    Drop the full-text index of snapshot texts.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If the database does not
+            support full-text search.
+
+    """
+    connection = _get_connection(True)
+    backend = _get_backend(connection)
+    with django.db.transaction.atomic(using=connection.alias), \
+        connection.cursor() as cursor:
+        backend.drop_index(cursor)
+
+def search(query, phrase=False, limit=100):
+    """
+    Find the snapshots whose texts match a query, most relevant first.
+
+    Args:
+        query (string): The words to find.
+        phrase (bool): Whether the words must occur in order.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list: SearchResult tuples. Empty if the query has no words.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If the database does not
+            support full-text search.
+        django.db.Error: If, for example, the index has not been created.
+
+    """
+    if not query.split():
+        return []
+
+    connection = _get_connection(False)
+    backend = _get_backend(connection)
+    with connection.cursor() as cursor:
+        rows = backend.search(cursor, query, phrase, limit)
+
+    return [
+        SearchResult(documents_languages_id, snapshot_id, float(rank))
+        for documents_languages_id, snapshot_id, rank in rows]
@@ -3,10 +3,246 @@ A module of app-specific settings and their respective defaults.
 
 """
 
-import django.conf.settings
+import django.conf
 
 
+# The alias of the database to which all of the app's models are written when
+# django_docsnaps.routers.Router is installed. Defaults to the default alias.
+DJANGO_DOCSNAPS_DATABASE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DATABASE',
+    None)
+
+# The aliases of read-only replicas of the app's database. Reads are spread
+# across them by django_docsnaps.routers.Router.
+DJANGO_DOCSNAPS_REPLICAS = tuple(getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_REPLICAS',
+    ()))
+
+# The number of completed jobs that the run checkpoints at once. Resuming a
+# killed run repeats only the jobs completed since its last checkpoint.
+DJANGO_DOCSNAPS_CHECKPOINT_BATCH_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_CHECKPOINT_BATCH_SIZE',
+    100)
+
+# The number of threads, each with its own database connections, in which the
+# run makes its database queries. Set the databases' CONN_MAX_AGE to keep the
+# connections open between queries. When 0, queries block the event loop.
+DJANGO_DOCSNAPS_DB_THREADS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DB_THREADS',
+    4)
+
+# The number of seconds a connection of the run may be idle before it is
+# checked, and reopened if lost, before its next query.
+DJANGO_DOCSNAPS_DB_HEALTH_CHECK_INTERVAL = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DB_HEALTH_CHECK_INTERVAL',
+    60)
+
 DJANGO_DOCSNAPS_REQUEST_TIMEOUT = getattr(
     django.conf.settings,
     'DJANGO_DOCSNAPS_REQUEST_TIMEOUT',
     10)
+
+# The maximum number of concurrent HTTP requests issued by a run, including
+# requests issued by plugin transforms through the run's shared session.
+DJANGO_DOCSNAPS_MAX_REQUESTS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_MAX_REQUESTS',
+    10)
+
+# The maximum number of concurrent HTTP requests to any single host.
+DJANGO_DOCSNAPS_MAX_HOST_REQUESTS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_MAX_HOST_REQUESTS',
+    2)
+
+# The minimum number of seconds between the starts of requests to the same host.
+DJANGO_DOCSNAPS_HOST_REQUEST_DELAY = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_HOST_REQUEST_DELAY',
+    0)
+
+# The maximum number of documents passed to a plugin's transform_many() at once.
+DJANGO_DOCSNAPS_TRANSFORM_BATCH_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_TRANSFORM_BATCH_SIZE',
+    50)
+
+# The maximum number of seconds a document waits for its batch to fill.
+DJANGO_DOCSNAPS_TRANSFORM_BATCH_DELAY = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_TRANSFORM_BATCH_DELAY',
+    0.1)
+
+# The number of seconds for which a cached pipeline stage output is kept after
+# it was last stored or used. Older outputs are deleted at the end of each run.
+# None to keep outputs forever.
+DJANGO_DOCSNAPS_STAGE_CACHE_TTL = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_STAGE_CACHE_TTL',
+    604800)
+
+# The size, in bytes, of the largest response transformed in memory by a job
+# whose plugin module implements the streaming interface. Larger responses are
+# streamed, without ignore rules, diff summaries, or spooling.
+DJANGO_DOCSNAPS_STREAM_THRESHOLD = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_STREAM_THRESHOLD',
+    16777216)
+
+# The size, in bytes, of the chunks in which streaming plugin transforms receive
+# documents and in which their output is written to a temporary file.
+DJANGO_DOCSNAPS_STREAM_CHUNK_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_STREAM_CHUNK_SIZE',
+    65536)
+
+# The maximum number of seconds spent finding a minimal line-level difference
+# between a new snapshot and the previous one. When exceeded, the whole changed
+# region is summarized as a single hunk. None for no limit.
+DJANGO_DOCSNAPS_DIFF_TIME_LIMIT = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DIFF_TIME_LIMIT',
+    1.0)
+
+# The alias of the Django cache in which the admin caches snapshot differences.
+# When None, differences are cached in each process by an LRU cache bounded by
+# the two settings below.
+DJANGO_DOCSNAPS_DIFF_CACHE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DIFF_CACHE',
+    None)
+
+# The maximum total number of characters of differences held in the in-process
+# cache. The least recently viewed differences are evicted first.
+DJANGO_DOCSNAPS_DIFF_CACHE_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DIFF_CACHE_SIZE',
+    16 * 1024 * 1024)
+
+# The number of seconds for which a difference is cached.
+DJANGO_DOCSNAPS_DIFF_CACHE_TIMEOUT = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_DIFF_CACHE_TIMEOUT',
+    600)
+
+# The CSS-like selectors, in order of preference, used by the built-in HTML
+# content transform to locate a document's main content. Supported selectors
+# are simple selectors only: a tag name, #id, .class, and [attribute] or
+# [attribute=value], in any combination such as div#content.legal.
+DJANGO_DOCSNAPS_HTML_SELECTORS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_HTML_SELECTORS',
+    ('main', 'article', '[role=main]', '#content'))
+
+# The parser backend used by the built-in HTML content transform. Either
+# 'html.parser', from the standard library, or 'lxml', which must be installed.
+DJANGO_DOCSNAPS_HTML_PARSER = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_HTML_PARSER',
+    'html.parser')
+
+# The alias of the Django cache in which the snapshot API caches the latest
+# snapshots and their texts. The run invalidates entries when it saves new
+# snapshots, which only reaches web processes through a shared cache. When
+# None, entries are cached in each process by an LRU cache bounded by the two
+# settings below and may be served until they expire.
+DJANGO_DOCSNAPS_API_CACHE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_API_CACHE',
+    None)
+
+# The maximum total number of characters of snapshot text held in the
+# in-process snapshot API cache.
+DJANGO_DOCSNAPS_API_CACHE_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_API_CACHE_SIZE',
+    64 * 1024 * 1024)
+
+# The number of seconds for which the snapshot API caches an entry.
+DJANGO_DOCSNAPS_API_CACHE_TIMEOUT = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_API_CACHE_TIMEOUT',
+    60)
+
+# The default number of snapshots in a page of the snapshot API's history.
+DJANGO_DOCSNAPS_API_PAGE_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_API_PAGE_SIZE',
+    50)
+
+# The PostgreSQL text search configuration with which snapshot texts are indexed
+# and searched. The full-text index must be dropped and created again after it
+# is changed.
+DJANGO_DOCSNAPS_SEARCH_CONFIG = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_SEARCH_CONFIG',
+    'english')
+
+# The sinks to which change events are delivered by the deliver-events
+# subcommand. Change events are only recorded when at least one is configured.
+# See django_docsnaps.events for the configuration of each type of sink.
+DJANGO_DOCSNAPS_EVENT_SINKS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_EVENT_SINKS',
+    ())
+
+# The maximum number of change events delivered to a sink at once.
+DJANGO_DOCSNAPS_EVENT_BATCH_SIZE = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_EVENT_BATCH_SIZE',
+    100)
+
+# The maximum number of batches of change events being delivered at once.
+DJANGO_DOCSNAPS_EVENT_CONCURRENCY = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_EVENT_CONCURRENCY',
+    4)
+
+# The number of seconds before the first retry of a failed delivery. The delay
+# doubles with each further attempt up to an hour.
+DJANGO_DOCSNAPS_EVENT_RETRY_DELAY = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_EVENT_RETRY_DELAY',
+    30)
+
+# The number of failed attempts after which a change event is abandoned.
+DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS',
+    10)
+
+# The path of the local file to which the run appends new snapshots that could
+# not be saved to the database in time. Replayed by the replay-spool
+# subcommand. When None, a failed snapshot write fails the job.
+DJANGO_DOCSNAPS_SPOOL_PATH = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_SPOOL_PATH',
+    None)
+
+# The number of seconds the run waits for a snapshot's write before spooling
+# the snapshot, and for a job's other database calls before skipping those it
+# can do without. Only used when DJANGO_DOCSNAPS_SPOOL_PATH is set.
+DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT',
+    5)
+
+# The maximum number of seconds for which the run skips a job whose last
+# response was declared fresh by its Cache-Control or Expires headers. Set to 0
+# to ignore freshness and check every due job.
+DJANGO_DOCSNAPS_MAX_FRESHNESS = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_MAX_FRESHNESS',
+    86400)
+
+# The secret that senders of change hints must present as a bearer token in the
+# Authorization header. The hint view rejects every request when it is unset.
+DJANGO_DOCSNAPS_HINT_TOKEN = getattr(
+    django.conf.settings,
+    'DJANGO_DOCSNAPS_HINT_TOKEN',
+    None)
@@ -0,0 +1,12 @@
+"""
+Built-in transform modules.
+
+Each module implements the same interface as a third-party plugin module's
+transform functions. A built-in module may be used for documents added
+manually, by setting the Document's module to the built-in module's name, or as
+a stage in any document's transform pipeline via a Transform record.
+
+Built-in modules do not provide models and cannot be installed with the
+"install" subcommand.
+
+"""
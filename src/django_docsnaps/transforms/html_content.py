@@ -0,0 +1,433 @@
+"""
+A built-in transform that extracts the main content of an HTML document.
+
+The document is passed through an incremental parser and only the text of the
+elements matching the configured selectors is kept. No DOM is built. Text inside
+scripts, styles, and the document head is discarded and whitespace is
+normalized so that cosmetic changes to markup or indentation are not detected as
+document changes.
+
+The selectors are taken from the DJANGO_DOCSNAPS_HTML_SELECTORS setting, in
+order of preference. The text of every element matching the most preferred
+selector that matches anything is returned. If no selector matches, the text of
+the whole document is returned.
+
+The parser backend is taken from the DJANGO_DOCSNAPS_HTML_PARSER setting. The
+standard library's html.parser is used by default. lxml is faster on large
+documents and is used when the setting is 'lxml'. When using lxml, elements are
+discarded as soon as they have been processed, so memory use stays flat.
+
+To use this module for a manually-added document, set the Document's module to
+"django_docsnaps.transforms.html_content". It may also be used as a stage in
+any document's transform pipeline.
+
+"""
+
+import hashlib
+import html.parser
+import re
+
+import django.core.exceptions
+
+import django_docsnaps.settings
+
+try:
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+
+# Elements that begin a new line of text.
+BLOCK_ELEMENTS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl',
+    'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p',
+    'pre', 'section', 'table', 'td', 'th', 'tr', 'ul'])
+
+# Elements whose text content is never part of a document's content.
+SKIPPED_ELEMENTS = frozenset([
+    'head', 'noscript', 'script', 'style', 'svg', 'template'])
+
+# Elements that never have content or end tags.
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'])
+
+# The output depends on the settings as well as this module's code so both are
+# included in the version. A settings change invalidates skipped documents.
+__version__ = '1.0.0+' + hashlib.sha256(repr((
+    tuple(django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_SELECTORS),
+    django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_PARSER)).encode('utf-8'))\
+    .hexdigest()[:8]
+
+_SELECTOR_TOKEN_PATTERN = re.compile(
+    r'''([#.]?)([\w-]+)|\[\s*([\w-]+)\s*(?:=\s*["']?([^"'\]]*)["']?\s*)?\]''')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+class Selector:
+    """
+    A simple CSS selector.
+
+    Only simple selectors are supported: an optional tag name followed by any
+    number of #id, .class, [attribute], and [attribute=value] conditions.
+    Combinators and pseudo-classes are not supported.
+
+    """
+
+    def __init__(self, selector):
+        """
+        Parse a selector string.
+
+        Args:
+            selector (string): The selector, such as "div#content.legal".
+
+        Raises:
+            ValueError: If the selector is empty or not a simple selector.
+
+        """
+        self._attributes = []
+        self._classes = set()
+        self._id = None
+        self._tag = None
+
+        position = 0
+        selector = selector.strip()
+        for match in _SELECTOR_TOKEN_PATTERN.finditer(selector):
+            if match.start() != position:
+                break
+            position = match.end()
+            prefix, name, attribute, value = match.groups()
+            if attribute:
+                self._attributes.append((attribute.lower(), value))
+            elif prefix == '#':
+                self._id = name
+            elif prefix == '.':
+                self._classes.add(name)
+            elif match.start() == 0:
+                self._tag = name.lower()
+            else:
+                break
+
+        if not selector or position != len(selector):
+            raise ValueError(
+                'Unsupported HTML content selector: "{!s}".'.format(selector))
+
+    def matches(self, tag, attributes):
+        """
+        Determine if an element matches this selector.
+
+        Args:
+            tag (string): The element's lowercase tag name.
+            attributes (dict): The element's attributes. Valueless attributes
+                have None values.
+
+        Returns:
+            bool: True if the element matches.
+
+        """
+        if self._tag and self._tag != tag:
+            return False
+        if self._id and attributes.get('id') != self._id:
+            return False
+        if self._classes and not self._classes.issubset(
+            (attributes.get('class') or '').split()):
+            return False
+        for attribute, value in self._attributes:
+            if attribute not in attributes:
+                return False
+            if value is not None and attributes[attribute] != value:
+                return False
+
+        return True
+
+
+class ContentExtractor:
+    """
+    Collects the text of the elements that match a list of selectors.
+
+    The extractor is driven by a parser backend's start, end, and data events.
+    It tracks only the stack of currently open tag names. Text is buffered
+    per selector while inside a matching element. Once any selector has
+    matched an element with text, the buffers of less preferred selectors are
+    discarded and no longer filled.
+
+    """
+
+    def __init__(self, selectors):
+        """
+        Initialize an instance.
+
+        Args:
+            selectors (iterable): Selector strings in order of preference.
+
+        Raises:
+            ValueError: If a selector is unsupported.
+
+        """
+        self._selectors = [Selector(selector) for selector in selectors]
+        self._best = len(self._selectors)
+        self._buffers = [[] for selector in self._selectors]
+        self._capture_depths = [None for selector in self._selectors]
+        self._document_buffer = []
+        self._skip_depth = None
+        self._stack = []
+
+    def _write(self, text):
+        if self._skip_depth is not None:
+            return
+        if self._best == len(self._selectors):
+            self._document_buffer.append(text)
+        for index in range(self._best):
+            if self._capture_depths[index] is not None:
+                self._buffers[index].append(text)
+
+    def data(self, text):
+        """
+        Handle text content.
+
+        """
+        self._write(_WHITESPACE_PATTERN.sub(' ', text))
+
+    def end(self, tag):
+        """
+        Handle an end tag. Unclosed child elements are implicitly closed.
+
+        """
+        tag = tag.lower()
+        if tag in VOID_ELEMENTS:
+            if tag in BLOCK_ELEMENTS:
+                self._write('\n')
+            return
+
+        try:
+            index = len(self._stack) - 1 - self._stack[::-1].index(tag)
+        except ValueError:
+            return
+        del self._stack[index:]
+        depth = len(self._stack)
+
+        if self._skip_depth is not None and depth < self._skip_depth:
+            self._skip_depth = None
+        if tag in BLOCK_ELEMENTS:
+            self._write('\n')
+
+        for index in range(self._best):
+            capture_depth = self._capture_depths[index]
+            if capture_depth is not None and depth < capture_depth:
+                self._capture_depths[index] = None
+                self._buffers[index].append('\n')
+                if ''.join(self._buffers[index]).strip():
+                    self._select(index)
+                    break
+
+    def _select(self, index):
+        """
+        Discard the buffers of every selector less preferred than index.
+
+        """
+        self._best = index
+        self._document_buffer = []
+        for discarded in range(index + 1, len(self._selectors)):
+            self._buffers[discarded] = []
+            self._capture_depths[discarded] = None
+
+    def get_text(self):
+        """
+        Get the normalized text of the most preferred matching selector.
+
+        Returns:
+            string: The extracted text with whitespace collapsed, one line per
+                block of text, and no blank lines.
+
+        """
+        for buffer in self._buffers:
+            text = _normalize(buffer)
+            if text:
+                return text
+
+        return _normalize(self._document_buffer)
+
+    def start(self, tag, attributes):
+        """
+        Handle a start tag.
+
+        Args:
+            tag (string): The tag name.
+            attributes (iterable): (name, value) attribute tuples.
+
+        """
+        tag = tag.lower()
+        if tag in BLOCK_ELEMENTS:
+            self._write('\n')
+        if tag in VOID_ELEMENTS:
+            return
+
+        self._stack.append(tag)
+        depth = len(self._stack)
+        if self._skip_depth is not None:
+            return
+        if tag in SKIPPED_ELEMENTS:
+            self._skip_depth = depth
+            return
+
+        attributes = dict(
+            (name.lower(), value) for name, value in attributes)
+        for index in range(self._best):
+            if (self._capture_depths[index] is None
+                and self._selectors[index].matches(tag, attributes)):
+                self._capture_depths[index] = depth
+
+
+class _StandardLibraryParser(html.parser.HTMLParser):
+    """
+    Drives a ContentExtractor with the standard library's HTML parser.
+
+    """
+
+    def __init__(self, extractor):
+        super().__init__(convert_charrefs=True)
+        self._extractor = extractor
+
+    def handle_data(self, data):
+        self._extractor.data(data)
+
+    def handle_endtag(self, tag):
+        self._extractor.end(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self._extractor.start(tag, attrs)
+
+
+class _LxmlParser:
+    """
+    Drives a ContentExtractor with lxml's incremental HTML parser.
+
+    lxml reports element text only as attributes of elements, not as events.
+    An element's text is complete when its first child starts or when it
+    ends, and its tail is complete when its next sibling starts or its parent
+    ends. Text is emitted at those points and processed elements are then
+    removed from the tree.
+
+    """
+
+    def __init__(self, extractor):
+        self._extractor = extractor
+        self._parser = lxml.etree.HTMLPullParser(
+            events=('start', 'end', 'comment'))
+        self._tail_owner = None
+        self._text_owner = None
+
+    def _flush(self):
+        if self._text_owner is not None:
+            if self._text_owner.text:
+                self._extractor.data(self._text_owner.text)
+            self._text_owner = None
+        if self._tail_owner is not None:
+            if self._tail_owner.tail:
+                self._extractor.data(self._tail_owner.tail)
+            element = self._tail_owner
+            self._tail_owner = None
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+                if isinstance(element.tag, str):
+                    element.clear()
+
+    def _read_events(self):
+        for event, element in self._parser.read_events():
+            self._flush()
+            if event == 'start':
+                self._extractor.start(element.tag, element.attrib.items())
+                self._text_owner = element
+            else:
+                if event == 'end':
+                    self._extractor.end(element.tag)
+                self._tail_owner = element
+
+    def close(self):
+        self._parser.close()
+        self._read_events()
+        self._flush()
+
+    def feed(self, data):
+        self._parser.feed(data)
+        self._read_events()
+
+
+def _create_parser(extractor):
+    """
+    Create the configured parser backend.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If the configured
+            backend is unknown or unavailable.
+
+    """
+    backend = django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_PARSER
+    if backend == 'html.parser':
+        return _StandardLibraryParser(extractor)
+    elif backend == 'lxml':
+        if lxml is None:
+            raise django.core.exceptions.ImproperlyConfigured(
+                'DJANGO_DOCSNAPS_HTML_PARSER is "lxml" but lxml is not '
+                'installed.')
+        return _LxmlParser(extractor)
+
+    raise django.core.exceptions.ImproperlyConfigured(
+        'Unknown DJANGO_DOCSNAPS_HTML_PARSER "{!s}".'.format(backend))
+
+def _normalize(buffer):
+    lines = (' '.join(line.split()) for line in ''.join(buffer).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+def get_models():
+    """
+    Built-in transform modules provide no snapshot jobs.
+
+    """
+    return ()
+
+def transform(doc_text):
+    """
+    Extract the main content of an HTML document.
+
+    Args:
+        doc_text (string): The decoded HTML document.
+
+    Returns:
+        string: The normalized text of the document's main content.
+
+    """
+    extractor = ContentExtractor(
+        django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_SELECTORS)
+    parser = _create_parser(extractor)
+    parser.feed(doc_text)
+    parser.close()
+
+    return extractor.get_text()
+
+async def transform_stream(chunks):
+    """
+    Extract the main content of an HTML document as it is received.
+
+    Only the extracted text is held in memory. It is yielded once the whole
+    document has been parsed since a more preferred selector may match late
+    in the document.
+
+    Args:
+        chunks: An asynchronous iterator of decoded HTML text chunks.
+
+    Yields:
+        string: The normalized text of the document's main content.
+
+    """
+    extractor = ContentExtractor(
+        django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_SELECTORS)
+    parser = _create_parser(extractor)
+    async for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+    yield extractor.get_text()
@@ -0,0 +1,33 @@
+"""
+URLs of the snapshot API.
+
+Include in a project's URLconf, for example:
+    path('docsnaps/', include('django_docsnaps.urls'))
+
+"""
+
+import django.urls
+
+import django_docsnaps.views
+
+
+app_name = 'django_docsnaps'
+
+urlpatterns = [
+    django.urls.path(
+        'hints/',
+        django_docsnaps.views.hint,
+        name='hint'),
+    django.urls.path(
+        'documents/<int:document_id>/latest/',
+        django_docsnaps.views.document_latest_snapshots,
+        name='document_latest_snapshots'),
+    django.urls.path(
+        'jobs/<int:documents_languages_id>/latest/',
+        django_docsnaps.views.job_latest_snapshot,
+        name='job_latest_snapshot'),
+    django.urls.path(
+        'jobs/<int:documents_languages_id>/snapshots/',
+        django_docsnaps.views.job_snapshot_history,
+        name='job_snapshot_history'),
+]
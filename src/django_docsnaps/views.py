@@ -1,3 +1,354 @@
-from django.shortcuts import render
+"""
+A JSON API of the latest snapshots and the history of jobs.
 
-# Create your views here.
+Responses are built from a cache rather than the database whenever possible.
+A job's latest snapshot metadata is cached until the run saves a new snapshot
+for the job, at which time the run invalidates the job's and its document's
+entries. Snapshot texts never change once saved so they are cached by snapshot
+ID and never invalidated.
+
+The cache is an in-process LRUCache unless DJANGO_DOCSNAPS_API_CACHE names a
+Django cache. The run can only invalidate entries of a cache shared with the web
+processes. Entries of an in-process cache are instead served for up to
+DJANGO_DOCSNAPS_API_CACHE_TIMEOUT seconds after a change.
+
+Every latest snapshot response carries a strong ETag derived from the
+snapshots' IDs and digests so that polling clients sending If-None-Match
+receive 304 responses.
+
+History is paginated by keyset rather than by offset and is not cached.
+
+The only view that writes is the hint view, which receives notices that
+documents have changed. See django_docsnaps.hints.
+
+"""
+
+import hashlib
+import hmac
+import json
+
+import django.db.models
+import django.http
+import django.utils.cache
+import django.views.decorators.csrf
+import django.views.decorators.http
+
+import django_docsnaps.caches
+import django_docsnaps.hints
+import django_docsnaps.models
+import django_docsnaps.paginators
+import django_docsnaps.settings
+
+
+# The maximum number of URLs in a single hint request.
+MAX_HINT_URLS = 1000
+
+# The maximum number of snapshots in a page of history.
+MAX_PAGE_SIZE = 500
+
+snapshot_cache = django_docsnaps.caches.get_cache(
+    django_docsnaps.settings.DJANGO_DOCSNAPS_API_CACHE,
+    max_entries=4096,
+    max_cost=django_docsnaps.settings.DJANGO_DOCSNAPS_API_CACHE_SIZE,
+    timeout=django_docsnaps.settings.DJANGO_DOCSNAPS_API_CACHE_TIMEOUT,
+    get_cost=lambda value: len(value) if isinstance(value, str) else 1)
+
+
+def _get_cache_key(kind, object_id):
+    return 'django_docsnaps.api.{!s}.{!s}'.format(kind, object_id)
+
+def _get_etag(snapshots, include_text):
+    """
+    Get a strong ETag for a representation of one or more snapshots.
+
+    Snapshots are immutable so their IDs and digests identify their contents.
+    The text flag is included since the two representations differ.
+
+    """
+    etag_hash = hashlib.sha256()
+    for snapshot in snapshots:
+        etag_hash.update(
+            '{!s}:{!s};'.format(
+                snapshot['snapshot_id'],
+                snapshot['digest']).encode('ascii'))
+    if include_text:
+        etag_hash.update(b'text')
+
+    return '"{!s}"'.format(etag_hash.hexdigest())
+
+def _get_hinted_urls(request):
+    """
+    Get the URLs of a hint request's body.
+
+    The body is either a JSON object with a "urls" list or a "url" string or
+    form data with one or more "url" fields.
+
+    Raises:
+        ValueError: If the body is invalid or has too many URLs.
+
+    """
+    if request.content_type == 'application/json':
+        try:
+            body = json.loads(request.body.decode('utf-8'))
+        except UnicodeDecodeError as exception:
+            raise ValueError('The body is not UTF-8.') from exception
+        if not isinstance(body, dict):
+            raise ValueError('The body must be a JSON object.')
+        urls = body.get('urls', [body['url']] if 'url' in body else [])
+    else:
+        urls = request.POST.getlist('url')
+
+    if not isinstance(urls, list) \
+        or not all(isinstance(url, str) for url in urls):
+        raise ValueError('The URLs must be strings.')
+    if not urls:
+        raise ValueError('No URLs were given.')
+    if len(urls) > MAX_HINT_URLS:
+        raise ValueError(
+            'At most {!s} URLs may be given.'.format(MAX_HINT_URLS))
+
+    return urls
+
+def _get_latest_snapshots(kind, object_id, snapshot_set):
+    """
+    Get the cached metadata of latest snapshots, querying them on a miss.
+
+    Args:
+        kind (string): "job" or "document".
+        object_id (int): The job or document ID.
+        snapshot_set (django.db.models.query.QuerySet): The latest snapshots.
+
+    Returns:
+        list: Dictionaries as returned by _get_snapshot_data().
+
+    """
+    cache_key = _get_cache_key(kind, object_id)
+    snapshots = snapshot_cache.get(cache_key)
+    if snapshots is None:
+        snapshots = [
+            _get_snapshot_data(snapshot)
+            for snapshot in _select_related(snapshot_set)\
+                .defer('text', 'hunks')]
+        snapshot_cache.set(cache_key, snapshots)
+
+    return snapshots
+
+def _get_snapshot_data(snapshot):
+    """
+    Get the JSON-serializable metadata of a snapshot.
+
+    The snapshot's job, document, and language must have been selected with it.
+
+    """
+    job = snapshot.documents_languages_id
+    return {
+        'changed_ratio': snapshot.changed_ratio,
+        'datetime': snapshot.datetime.isoformat(),
+        'digest': snapshot.digest,
+        'document': job.document_id.name,
+        'document_id': job.document_id_id,
+        'documents_languages_id': job.documents_languages_id,
+        'language': job.language_id.code_iso_639_1,
+        'lines_added': snapshot.lines_added,
+        'lines_removed': snapshot.lines_removed,
+        'snapshot_id': snapshot.snapshot_id,
+    }
+
+def _get_texts(snapshots):
+    """
+    Get the texts of snapshots keyed by snapshot ID.
+
+    Cached texts are used and the rest are loaded in a single query.
+
+    """
+    texts = {}
+    missing_ids = []
+    for snapshot in snapshots:
+        text = snapshot_cache.get(
+            _get_cache_key('text', snapshot['snapshot_id']))
+        if text is None:
+            missing_ids.append(snapshot['snapshot_id'])
+        else:
+            texts[snapshot['snapshot_id']] = text
+
+    if missing_ids:
+        text_set = django_docsnaps.models.Snapshot.objects\
+            .filter(pk__in=missing_ids)\
+            .values_list('snapshot_id', 'text')
+        for snapshot_id, text in text_set:
+            text = text or ''
+            snapshot_cache.set(_get_cache_key('text', snapshot_id), text)
+            texts[snapshot_id] = text
+
+    return texts
+
+def _select_related(snapshot_set):
+    return snapshot_set.select_related(
+        'documents_languages_id__document_id',
+        'documents_languages_id__language_id')
+
+def _snapshot_response(request, snapshots, many):
+    """
+    Render snapshots as JSON or a 304 response if the client's copy is fresh.
+
+    Texts are included when the "text" query parameter is given.
+
+    """
+    include_text = 'text' in request.GET
+    etag = _get_etag(snapshots, include_text)
+    response = django.utils.cache.get_conditional_response(request, etag=etag)
+    if response is None:
+        if include_text:
+            texts = _get_texts(snapshots)
+            snapshots = [
+                dict(snapshot, text=texts[snapshot['snapshot_id']])
+                for snapshot in snapshots]
+        if many:
+            response = django.http.JsonResponse({'snapshots': snapshots})
+        else:
+            response = django.http.JsonResponse(snapshots[0])
+        response['ETag'] = etag
+    django.utils.cache.patch_cache_control(response, no_cache=True)
+
+    return response
+
+@django.views.decorators.http.require_safe
+def document_latest_snapshots(request, document_id):
+    """
+    Get the latest snapshot of each of a document's jobs.
+
+    Responds with 404 if none of the document's jobs has a snapshot.
+
+    """
+    latest_snapshot_set = django_docsnaps.models.Snapshot.objects\
+        .filter(documents_languages_id=django.db.models.OuterRef('pk'))\
+        .order_by('-datetime')\
+        .values('snapshot_id')[:1]
+    latest_id_set = django_docsnaps.models.DocumentsLanguages.objects\
+        .filter(document_id=document_id)\
+        .annotate(
+            latest_snapshot_id=django.db.models.Subquery(latest_snapshot_set))\
+        .values('latest_snapshot_id')
+    snapshot_set = django_docsnaps.models.Snapshot.objects\
+        .filter(pk__in=latest_id_set)\
+        .order_by('documents_languages_id')
+
+    snapshots = _get_latest_snapshots('document', document_id, snapshot_set)
+    if not snapshots:
+        raise django.http.Http404('The document has no snapshots.')
+
+    return _snapshot_response(request, snapshots, True)
+
+@django.views.decorators.csrf.csrf_exempt
+@django.views.decorators.http.require_POST
+def hint(request):
+    """
+    Receive a hint that the documents at one or more URLs have changed.
+
+    The enabled jobs with the URLs are checked by the next run. Responds with
+    202 and the number of jobs marked, with 400 if the body is invalid, and
+    with 403 unless the Authorization header carries the bearer token set in
+    DJANGO_DOCSNAPS_HINT_TOKEN.
+
+    See:
+        _get_hinted_urls
+        django_docsnaps.hints.request_fetches
+
+    """
+    token = django_docsnaps.settings.DJANGO_DOCSNAPS_HINT_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(
+        authorization.encode('utf-8'),
+        'Bearer {!s}'.format(token).encode('utf-8')):
+        return django.http.JsonResponse(
+            {'error': 'Invalid or missing hint token.'},
+            status=403)
+
+    try:
+        urls = _get_hinted_urls(request)
+    except ValueError as exception:
+        return django.http.JsonResponse(
+            {'error': str(exception)},
+            status=400)
+
+    job_count = django_docsnaps.hints.request_fetches(urls)
+    return django.http.JsonResponse({'jobs': job_count}, status=202)
+
+def invalidate_latest_snapshot(job):
+    """
+    Remove a job's and its document's latest snapshots from the cache.
+
+    Called by the run whenever it saves a new snapshot.
+
+    Args:
+        job (django_docsnaps.models.DocumentsLanguages): The job.
+
+    """
+    snapshot_cache.delete(
+        _get_cache_key('job', job.documents_languages_id))
+    snapshot_cache.delete(_get_cache_key('document', job.document_id_id))
+
+@django.views.decorators.http.require_safe
+def job_latest_snapshot(request, documents_languages_id):
+    """
+    Get the latest snapshot of a job.
+
+    Responds with 404 if the job has no snapshot.
+
+    """
+    snapshot_set = django_docsnaps.models.Snapshot.objects\
+        .filter(documents_languages_id=documents_languages_id)\
+        .order_by('-datetime')[:1]
+
+    snapshots = _get_latest_snapshots(
+        'job',
+        documents_languages_id,
+        snapshot_set)
+    if not snapshots:
+        raise django.http.Http404('The job has no snapshots.')
+
+    return _snapshot_response(request, snapshots, False)
+
+@django.views.decorators.http.require_safe
+def job_snapshot_history(request, documents_languages_id):
+    """
+    Get a page of a job's snapshots, newest first.
+
+    The "cursor" query parameter is the "next" value of the previous page's
+    response and is omitted for the first page. The "size" query parameter
+    sets the number of snapshots in the page. Texts are included when the
+    "text" query parameter is given. Responds with 400 if either the cursor or
+    the size is invalid.
+
+    See:
+        django_docsnaps.paginators.get_history_page
+
+    """
+    include_text = 'text' in request.GET
+    try:
+        page_size = int(request.GET.get(
+            'size',
+            django_docsnaps.settings.DJANGO_DOCSNAPS_API_PAGE_SIZE))
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ValueError(
+                'The size must be between 1 and {!s}.'.format(MAX_PAGE_SIZE))
+        page = django_docsnaps.paginators.get_history_page(
+            _select_related(django_docsnaps.models.Snapshot.objects)\
+                .filter(documents_languages_id=documents_languages_id),
+            cursor=request.GET.get('cursor'),
+            page_size=page_size,
+            include_text=include_text)
+    except ValueError as exception:
+        return django.http.JsonResponse(
+            {'error': str(exception)},
+            status=400)
+
+    snapshots = []
+    for snapshot in page.object_list:
+        snapshot_data = _get_snapshot_data(snapshot)
+        if include_text:
+            snapshot_data['text'] = snapshot.text or ''
+        snapshots.append(snapshot_data)
+
+    return django.http.JsonResponse(
+        {'next': page.next_cursor, 'snapshots': snapshots})
@@ -24,10 +24,15 @@ setup(
 
     author='monotonee',
     author_email='monotonee@tuta.io',
+    extras_require={
+        'cluster': ['numpy'],
+        'lxml': ['lxml']
+    },
     include_package_data=True,
     install_requires=[
         'aiodns',
-        'aiohttp',
+        'aiohttp>=3,<4',
+        'chardet',
         'django',
         'django-forcedfields',
         'mysqlclient'
@@ -0,0 +1,186 @@
+"""
+Tests the clustering of similar changes made to different documents.
+
+"""
+
+import datetime
+import io
+import json
+import unittest
+
+import django.test
+import django.utils.timezone
+
+from django_docsnaps.management.commands._cluster import Command
+import django_docsnaps.diff
+import django_docsnaps.fingerprints
+import django_docsnaps.models
+
+
+@unittest.skipIf(
+    django_docsnaps.fingerprints.numpy is None,
+    'NumPy is not installed.')
+class TestClusterChanges(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Create four jobs, each with a previous and a new snapshot.
+
+        The first three jobs' documents receive the same new clause. The
+        fourth's change is unrelated. The new snapshots are saved with hunks
+        as by the run command.
+
+        """
+        cls._language = django_docsnaps.models.Language.objects.create(
+            name='English',
+            code_iso_639_1='en')
+        changes = [
+            ('Terms of Use', 'Applies to users of product A.', True),
+            ('Privacy Policy', 'Data of product B is collected.', True),
+            ('Cookie Policy', 'Cookies of product C.', True),
+            ('Refund Policy', 'Refunds are issued within 30 days.', False)]
+
+        cls._snapshots = []
+        for name, text, is_shared in changes:
+            document = django_docsnaps.models.Document.objects.create(
+                module='fake.module',
+                name=name)
+            job = django_docsnaps.models.DocumentsLanguages.objects.create(
+                document_id=document,
+                language_id=cls._language,
+                url='https://example.com/')
+            previous_text = name + '\n' + text
+            django_docsnaps.models.Snapshot.objects.create(
+                documents_languages_id=job,
+                text=previous_text)
+            if is_shared:
+                new_text = (
+                    name + '\n' + text + '\n'
+                    'Disputes are resolved by binding arbitration.\n'
+                    'You waive the right to a class action.')
+            else:
+                new_text = name + '\nRefunds are issued within 60 days.'
+            hunks = django_docsnaps.diff.summarize(
+                previous_text,
+                new_text).hunks
+            cls._snapshots.append(
+                django_docsnaps.models.Snapshot.objects.create(
+                    documents_languages_id=job,
+                    hunks=json.dumps(hunks),
+                    text=new_text))
+
+    def _handle(self, **options):
+        options.setdefault('since', None)
+        self._command.handle(**options)
+
+    def _get_cluster_ids(self):
+        return [
+            django_docsnaps.models.Snapshot.objects.get(
+                pk=snapshot.pk).change_cluster_id_id
+            for snapshot in self._snapshots]
+
+    def test_clustering(self):
+        """
+        Test that the shared change forms one cluster and the other none.
+
+        """
+        self._handle()
+        cluster_ids = self._get_cluster_ids()
+
+        self.assertIsNotNone(cluster_ids[0])
+        self.assertEqual(cluster_ids[0], cluster_ids[1])
+        self.assertEqual(cluster_ids[0], cluster_ids[2])
+        self.assertIsNone(cluster_ids[3])
+        change_cluster = django_docsnaps.models.ChangeCluster.objects.get()
+        self.assertEqual(change_cluster.snapshot_count, 3)
+
+    def test_rerun_replaces_clusters(self):
+        """
+        Test that running again replaces rather than duplicates clusters.
+
+        """
+        self._handle()
+        self._handle()
+
+        self.assertEqual(
+            django_docsnaps.models.ChangeCluster.objects.count(),
+            1)
+
+    def test_single_document(self):
+        """
+        Test that the same change made to one document in two languages does
+        not form a cluster. The snapshots have no hunks so their texts' lines
+        are compared as sets.
+
+        """
+        django_docsnaps.models.Snapshot.objects\
+            .filter(pk__in=[snapshot.pk for snapshot in self._snapshots[:3]])\
+            .delete()
+        document = self._snapshots[3].documents_languages_id.document_id
+        language = django_docsnaps.models.Language.objects.create(
+            name='French',
+            code_iso_639_1='fr')
+        job = django_docsnaps.models.DocumentsLanguages.objects.create(
+            document_id=document,
+            language_id=language,
+            url='https://example.com/fr/')
+        django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=job,
+            text='Refund Policy\nRefunds are issued within 30 days.')
+        django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=job,
+            text='Refund Policy\nRefunds are issued within 60 days.')
+
+        self._handle()
+
+        self.assertFalse(
+            django_docsnaps.models.ChangeCluster.objects.exists())
+
+    def test_since(self):
+        """
+        Test that changes made before the window are ignored.
+
+        """
+        old_datetime = django.utils.timezone.now() - datetime.timedelta(days=2)
+        django_docsnaps.models.Snapshot.objects\
+            .filter(pk=self._snapshots[0].pk)\
+            .update(datetime=old_datetime)
+
+        self._handle()
+        cluster_ids = self._get_cluster_ids()
+
+        self.assertIsNone(cluster_ids[0])
+        self.assertIsNotNone(cluster_ids[1])
+        self.assertEqual(cluster_ids[1], cluster_ids[2])
+
+    def test_window_boundary(self):
+        """
+        Test that a cluster keeping a snapshot from before the window has its
+        snapshot count and datetimes recomputed.
+
+        """
+        self._handle()
+        change_cluster = django_docsnaps.models.ChangeCluster.objects.get()
+        old_datetime = django.utils.timezone.now() - datetime.timedelta(days=2)
+        django_docsnaps.models.Snapshot.objects\
+            .filter(pk=self._snapshots[0].pk)\
+            .update(datetime=old_datetime)
+
+        self._handle()
+        cluster_ids = self._get_cluster_ids()
+
+        self.assertEqual(cluster_ids[0], change_cluster.pk)
+        self.assertNotEqual(cluster_ids[1], change_cluster.pk)
+        change_cluster.refresh_from_db()
+        self.assertEqual(change_cluster.snapshot_count, 1)
+        self.assertEqual(change_cluster.first_datetime, old_datetime)
+        self.assertEqual(change_cluster.last_datetime, old_datetime)
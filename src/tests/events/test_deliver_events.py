@@ -0,0 +1,190 @@
+"""
+Tests the recording of change events and their delivery to sinks.
+
+Webhook delivery is tested against a local HTTP server.
+
+"""
+
+import asyncio
+import http.server
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest.mock
+
+import django.test
+
+from django_docsnaps.management.commands._deliver import Command
+import django_docsnaps.events
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+class _WebhookHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Records the events POSTed to it and responds with the server's status.
+
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append(json.loads(body.decode('utf-8')))
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDeliverEvents(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        Start a webhook server and record an event for each of two snapshots.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+        self._server = http.server.HTTPServer(
+            ('127.0.0.1', 0),
+            _WebhookHandler)
+        self._server.received = []
+        self._server.status = 204
+        threading.Thread(target=self._server.serve_forever).start()
+        self.addCleanup(self._server.server_close)
+        self.addCleanup(self._server.shutdown)
+        self._webhook_sink = django_docsnaps.events.WebhookSink(
+            'http://127.0.0.1:{!s}/'.format(self._server.server_port))
+
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_SINKS',
+            [{'type': 'webhook', 'url': 'http://127.0.0.1/'}]):
+            self._change_events = [
+                django_docsnaps.events.create_change_event(
+                    django_docsnaps.models.Snapshot.objects.create(
+                        documents_languages_id=self._job,
+                        text=text))
+                for text in ('Old text.', 'New text.')]
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def _deliver(self, sinks, batch_size=1, concurrency=2):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(
+            self._command._deliver_due_events(sinks, batch_size, concurrency))
+
+    def _handle(self, **options):
+        with tempfile.TemporaryDirectory() as directory, \
+            unittest.mock.patch(
+                'django_docsnaps.settings.DJANGO_DOCSNAPS_DB_THREADS',
+                0), \
+            unittest.mock.patch(
+                'django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_SINKS',
+                [{
+                    'type': 'file',
+                    'path': os.path.join(directory, 'events.jsonl')}]):
+            self._command.handle(**options)
+
+    def test_abandoned_events(self):
+        """
+        Test that events at the maximum number of attempts are not delivered
+        but are reported, and purged only when requested.
+
+        """
+        django_docsnaps.models.ChangeEvent.objects\
+            .filter(pk=self._change_events[0].pk)\
+            .update(attempts=10)
+
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_MAX_ATTEMPTS',
+            10):
+            self._handle()
+            self.assertIn('1 abandoned', self._command.stdout.getvalue())
+            self.assertEqual(
+                list(django_docsnaps.models.ChangeEvent.objects.all()),
+                [self._change_events[0]])
+
+            self._handle(purge_abandoned=True)
+            self.assertIn(
+                '1 abandoned purged',
+                self._command.stdout.getvalue())
+            self.assertFalse(
+                django_docsnaps.models.ChangeEvent.objects.exists())
+
+    def test_delivery(self):
+        """
+        Test that every event is delivered to every sink and then deleted.
+
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'events.jsonl')
+            called_events = []
+            sinks = [
+                self._webhook_sink,
+                django_docsnaps.events.FileSink(path),
+                django_docsnaps.events.CallableSink(called_events.extend)]
+
+            self.assertEqual(self._deliver(sinks), (2, 0))
+
+            with open(path, encoding='utf-8') as event_file:
+                file_events = [json.loads(line) for line in event_file]
+
+        event_ids = sorted(
+            change_event.change_event_id
+            for change_event in self._change_events)
+        webhook_events = [
+            event
+            for request in self._server.received
+            for event in request['events']]
+        for events in (webhook_events, file_events, called_events):
+            self.assertEqual(
+                sorted(event['change_event_id'] for event in events),
+                event_ids)
+        self.assertEqual(
+            webhook_events[0]['documents_languages_id'],
+            self._job.documents_languages_id)
+        self.assertFalse(django_docsnaps.models.ChangeEvent.objects.exists())
+
+    def test_failed_delivery(self):
+        """
+        Test that rejected events are kept and postponed for a retry.
+
+        """
+        self._server.status = 500
+
+        self.assertEqual(self._deliver([self._webhook_sink]), (0, 2))
+
+        for change_event in django_docsnaps.models.ChangeEvent.objects.all():
+            self.assertEqual(change_event.attempts, 1)
+            self.assertIn('500', change_event.last_error)
+            self.assertGreater(
+                change_event.next_attempt_datetime,
+                change_event.created_datetime)
+        self.assertEqual(self._deliver([self._webhook_sink]), (0, 0))
+
+    def test_no_sinks(self):
+        """
+        Test that no event is recorded when no sinks are configured.
+
+        """
+        snapshot = django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=self._job,
+            text='Text.')
+
+        self.assertIsNone(
+            django_docsnaps.events.create_change_event(snapshot))
@@ -71,6 +71,23 @@ class TestModuleInterfaceValidation(django.test.SimpleTestCase):
             self._command._validate_module_interface,
             self._module)
 
+    def test_transform_many_not_callable(self):
+        """
+        Test a module in which the optional transform_many is not callable.
+
+        """
+        self._module.mock_add_spec(
+            ['__name__', 'get_models', 'transform', 'transform_many'],
+            spec_set=True)
+        self._module.get_models = unittest.mock.Mock()
+        self._module.transform = unittest.mock.Mock()
+        self._module.transform_many = unittest.mock.NonCallableMock()
+
+        self.assertRaises(
+            django.core.management.base.CommandError,
+            self._command._validate_module_interface,
+            self._module)
+
     def test_valid_module_interface(self):
         """
         Test a module with complete and correct interface.
@@ -125,11 +125,15 @@ class TestModuleModelsLoad(django.test.TransactionTestCase):
         self.assertTrue(result_set.first().is_enabled)
 
         # Verify that transform record was inserted.
-        # transform_set = models.Transform.objects.select_related().all()
-        # self.assertEqual(len(transform_set), 1)
-        # self.assertEqual(
-            # transform_set.first().document_id, self._docs_langs.document_id)
-        # self.assertEqual(transform_set.first().module, self._module.__name__)
+        transform_set = django_docsnaps.models.Transform.objects\
+            .select_related().all()
+        self.assertEqual(len(transform_set), 1)
+        self.assertEqual(
+            transform_set[0].document_id.module,
+            self._docs_langs.document_id.module)
+        self.assertEqual(
+            transform_set[0].module,
+            self._docs_langs.document_id.module)
 
     def test_load_successful(self):
         """
@@ -148,12 +152,14 @@ class TestModuleModelsLoad(django.test.TransactionTestCase):
         self.assertTrue(result_set.first().is_enabled)
 
         # Verify that the Transform record was created correctly.
-        # transform = models.Transform.objects.all()
-        # self.assertEqual(len(transform), 1)
-        # self.assertEqual(
-            # transform.first().document_id.document_id,
-            # self._docs_langs.document_id.document_id)
-        # self.assertEqual(transform.first().module, self._module.__name__)
+        transform = django_docsnaps.models.Transform.objects.all()
+        self.assertEqual(len(transform), 1)
+        self.assertEqual(
+            transform[0].document_id.name,
+            self._docs_langs.document_id.name)
+        self.assertEqual(
+            transform[0].module,
+            self._docs_langs.document_id.module)
 
     def test_reinstall_update(self):
         """
@@ -2,148 +2,180 @@
 Tests the comparison of a new snapshot to the most recent existing snapshot.
 
 This operation is executed after fetching a new document snapshot from a remote
-source.
+source. The network and plugin modules are mocked but the job, its transforms,
+and its snapshots are read from and saved to the test database.
 
 """
 
 import asyncio
-import datetime
 import io
-import sys
+import types
 import unittest.mock
 
-from django.test import TestCase
-
-# Preemptively replace settings module. Python will believe that the module has
-# already been imported. The module's settings file imports the Django project
-# settings module which, when running these tests outside of a Django project,
-# obviously raises an exception. This must be done before the Command is
-# imported.
-sys.modules['docsnaps.settings'] = unittest.mock.NonCallableMock()
+import django.core.management.base
+import django.test
 
+from django_docsnaps.management.commands._run import Command
+from django_docsnaps.management.commands._run import DocumentResponse
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
 from .. import utils as test_utils
-from docsnaps.management.commands._run import Command
-import docsnaps.management.commands._utils as command_utils
-import docsnaps.models
 
 
-class TestCompareSnapshot(TestCase):
+class TestCompareSnapshot(django.test.TestCase):
 
     def setUp(self):
         """
         Capture stdout output to string buffer instead of allowing it to be
         sent to actual terminal stdout.
 
+        Mock the network and the import of plugin modules. Each fake module
+        appends its name to the text that it transforms.
+
         """
         self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        self._document_body = b'Terms'
+        self._modules = {}
+        for module_name in ('fake.module', 'fake.module1', 'fake.module2'):
+            module = types.ModuleType(module_name)
+            module.__version__ = '1.0.0'
+            module.transform = lambda text, name=module_name: (
+                text + ' ' + name,
+                None)
+            self._modules[module_name] = module
+
+        async def _mock_request_document(*args, **kwargs):
+            return DocumentResponse(
+                body=self._document_body,
+                charset='utf-8')
+
+        def _mock_import_job_module(job, module_name=None):
+            if module_name not in self._modules:
+                command_utils.raise_command_error(
+                    self._command.stdout,
+                    'Module not found.')
+            return self._modules[module_name]
+
+        self._command._request_document = _mock_request_document
+        self._command._import_job_module = _mock_import_job_module
 
     @classmethod
-    def setUpTestData(self):
+    def setUpTestData(cls):
         """
-        Load baseline data for the tests.
-
-        Might switch to fixtures in the future.
-
-        See:
-            https://docs.djangoproject.com/en/dev/topics/testing/tools/#fixture-loading
+        Insert a single job.
 
         """
-        document = None
-        documents_languages = test_utils.get_test_models()[0]
-        snapshot_timedelta = datetime.timedelta(days=1)
-        snapshot_datetime = datetime.datetime.today() - snapshot_timedelta
-
-        # Create basic models.
-        test_models = command_utils.flatten_model_graph(documents_languages)
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
         for model in reversed(list(test_models)):
-            if isinstance(model, docsnaps.models.Document):
-                document = model
             model.save()
 
-        # Create Transform records.
-        docsnaps.models.Transform.objects.create(
-            document_id=document,
-            module='fake.module1',
-            execution_priority=0)
-        docsnaps.models.Transform.objects.create(
-            document_id=document,
-            module='fake.module2',
-            execution_priority=1)
-
-        # Create Snapshot records.
-        # Create old snapshot.
-        docsnaps.models.Snapshot.objects.create(
-            documents_languages_id=documents_languages,
-            date=snapshot_datetime.date().isoformat(),
-            time=snapshot_datetime.time().isoformat(),
-            datetime=snapshot_datetime.isoformat(),
-            text='Slightly larger small document.')
-        # Create most recent snapshot.
-        snapshot_datetime = snapshot_datetime + snapshot_timedelta
-        docsnaps.models.Snapshot.objects.create(
-            documents_languages_id=documents_languages,
-            date=snapshot_datetime.date().isoformat(),
-            time=snapshot_datetime.time().isoformat(),
-            datetime=snapshot_datetime.isoformat(),
-            text='Really small document')
+    def _create_snapshot(self, text):
+        django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=self._job,
+            digest=command_utils.get_digest(text),
+            simhash=django_docsnaps.fingerprints.simhash(text),
+            text=text)
+
+    def _create_transforms(self, *module_names):
+        for priority, module_name in enumerate(module_names):
+            django_docsnaps.models.Transform.objects.create(
+                document_id=self._job.document_id,
+                module=module_name,
+                execution_priority=priority)
+
+    def _execute(self):
+        """
+        Execute the job against its latest snapshot.
+
+        Returns:
+            list: The texts of the job's snapshots, oldest first.
+
+        """
+        job = django_docsnaps.models.DocumentsLanguages.objects\
+            .select_related('document_id')\
+            .prefetch_related('document_id__transform_set')\
+            .get(pk=self._job.pk)
+        loop = asyncio.get_event_loop()
+        snapshots = loop.run_until_complete(
+            self._command._get_latest_snapshots())
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                job,
+                unittest.mock.NonCallableMock(),
+                snapshot=snapshots.get(job.documents_languages_id)))
+
+        return list(
+            django_docsnaps.models.Snapshot.objects\
+                .order_by('snapshot_id')\
+                .values_list('text', flat=True))
 
     def test_multiple_transforms_available(self):
         """
-        Test importing module and applying transforms in order successfully.
-
-        Transform must be applied before comparing new and existing document
-        snapshots. Multiple transforms may be registered for a single document
-        snapshot job, ordered by a "priority" ordinal. Ensure that all
-        transforms are executed and executed in the correct order.
+        Test that multiple transforms are applied in order of their execution
+        priority before the snapshots are compared.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self._create_transforms('fake.module2', 'fake.module1')
+
+        self.assertEqual(self._execute(), ['Terms fake.module2 fake.module1'])
 
     def test_no_existing_snapshot(self):
         """
-        Test comparison when no existing snapshot exists.
+        Test that a snapshot is saved when no snapshot exists.
 
         This condition occurs when running a snapshot job for the first time.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self.assertEqual(self._execute(), ['Terms fake.module'])
 
     def test_snapshot_changed(self):
         """
-        Test new document snapshot different than existing, most recent one.
+        Test that a new document snapshot different than the existing, most
+        recent one is saved.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self._create_snapshot('Old terms')
+
+        self.assertEqual(self._execute(), ['Old terms', 'Terms fake.module'])
 
     def test_snapshot_unchanged(self):
         """
-        Test new document snapshot unchanged from existing, most recent one.
+        Test that a new document snapshot unchanged from the existing, most
+        recent one is not saved.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self._create_snapshot('Terms fake.module')
+
+        self.assertEqual(self._execute(), ['Terms fake.module'])
 
     def test_transform_available(self):
         """
-        Test importing module and applying transform successfully.
-
-        Transform must be applied before comparing new and existing document
-        snapshots.
+        Test that a transform registered for the document is applied.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self._create_transforms('fake.module1')
+
+        self.assertEqual(self._execute(), ['Terms fake.module1'])
 
     def test_transform_module_load_failure(self):
         """
-        Test failure to import module that contains the transform.
+        Test that failure to import a transform's module raises a CommandError
+        and saves no snapshot.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self._create_transforms('fake.missing')
+
+        self.assertRaises(
+            django.core.management.base.CommandError,
+            self._execute)
+        self.assertFalse(django_docsnaps.models.Snapshot.objects.exists())
 
     def test_transform_unavailable(self):
         """
-        Test importing module when no transform available.
-
-        In this case, raw document snapshot will be compared.
+        Test that the document's own module transforms the document when no
+        transform is registered.
 
         """
-        raise NotImplementedError('Complete this test.')
+        self.assertEqual(self._execute(), ['Terms fake.module'])
@@ -0,0 +1,114 @@
+"""
+Tests the execution of the run's database calls in a thread pool.
+
+"""
+
+import asyncio
+import threading
+import unittest.mock
+
+import django.db
+import django.test
+
+import django_docsnaps.management.commands._database as command_database
+
+
+class TestDatabaseExecutor(django.test.SimpleTestCase):
+
+    def setUp(self):
+        self._database = command_database.DatabaseExecutor(max_workers=2)
+
+    def tearDown(self):
+        self._database.close()
+
+    def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(
+            self._database.run(function, *args, **kwargs))
+
+    def _get_failing_function(self, failure_count):
+        calls = []
+
+        def function():
+            calls.append(None)
+            if len(calls) <= failure_count:
+                raise django.db.OperationalError('Connection lost.')
+            return len(calls)
+
+        return function
+
+    def test_direct(self):
+        """
+        Test that calls are made in the calling thread without threads.
+
+        """
+        database = command_database.DatabaseExecutor()
+        thread_id = asyncio.get_event_loop().run_until_complete(
+            database.run(threading.get_ident))
+
+        self.assertEqual(thread_id, threading.get_ident())
+
+    def test_lost_connection_idempotent(self):
+        """
+        Test that an idempotent call is retried once on a new connection.
+
+        """
+        with unittest.mock.patch.object(
+            self._database,
+            '_close_unusable_connections',
+            return_value=True):
+            self.assertEqual(
+                self._run(self._get_failing_function(1), idempotent=True),
+                2)
+            with self.assertRaises(django.db.OperationalError):
+                self._run(self._get_failing_function(2), idempotent=True)
+
+    def test_lost_connection_not_idempotent(self):
+        """
+        Test that a call that is not idempotent is not retried.
+
+        """
+        with unittest.mock.patch.object(
+            self._database,
+            '_close_unusable_connections',
+            return_value=True):
+            with self.assertRaises(django.db.OperationalError):
+                self._run(self._get_failing_function(1))
+
+    def test_stalled(self):
+        """
+        Test that calls exceeding their timeout are abandoned, that further
+        calls with a timeout fail without being made once abandoned calls
+        occupy every thread, and that the executor recovers when they finish.
+
+        """
+        event = threading.Event()
+        self.addCleanup(event.set)
+        for _ in range(2):
+            with self.assertRaises(asyncio.TimeoutError):
+                self._run(event.wait, timeout=0.01)
+        self.assertTrue(self._database.is_stalled())
+
+        function = unittest.mock.Mock()
+        with self.assertRaises(asyncio.TimeoutError):
+            self._run(function, timeout=0.01)
+        self.assertFalse(function.called)
+
+        event.set()
+        loop = asyncio.get_event_loop()
+        for _ in range(100):
+            if not self._database.is_stalled():
+                break
+            loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(self._database.is_stalled())
+        self.assertEqual(self._run(max, 1, 3, 2, timeout=1), 3)
+
+    def test_thread(self):
+        """
+        Test that calls are made in a worker thread with their arguments.
+
+        """
+        thread_id = self._run(threading.get_ident)
+
+        self.assertNotEqual(thread_id, threading.get_ident())
+        self.assertEqual(self._run(max, 1, 3, 2), 3)
@@ -0,0 +1,108 @@
+"""
+Tests the decoding of a fetched document's body into text.
+
+Encoding detection is expensive so these tests mostly assert when it is and is
+not performed and when its result is cached on the job.
+
+"""
+
+import asyncio
+import io
+import unittest.mock
+
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+from django_docsnaps.management.commands._run import DocumentResponse
+
+
+class TestDecodeDocument(django.test.SimpleTestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        The job is a mock so that calls to save() can be inspected without a
+        database.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        self._document_text = 'Conditions d’utilisation'
+        self._job = unittest.mock.Mock(charset=None)
+
+    def _decode(self, document_response):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(
+            self._command._decode_document(self._job, document_response))
+
+    def test_cached_charset(self):
+        """
+        Test that a cached charset is used without encoding detection.
+
+        """
+        self._job.charset = 'windows-1252'
+        document_response = DocumentResponse(
+            body=self._document_text.encode('windows-1252'),
+            charset=None)
+
+        with unittest.mock.patch('chardet.detect') as detect_mock:
+            doc_text = self._decode(document_response)
+
+        self.assertEqual(doc_text, self._document_text)
+        self.assertFalse(detect_mock.called)
+        self.assertFalse(self._job.save.called)
+
+    def test_cached_charset_failure(self):
+        """
+        Test that detection is repeated and cached when cached charset fails.
+
+        """
+        self._job.charset = 'ascii'
+        document_response = DocumentResponse(
+            body=self._document_text.encode('utf-8'),
+            charset=None)
+
+        with unittest.mock.patch(
+            'chardet.detect',
+            return_value={'encoding': 'UTF-8'}) as detect_mock:
+            doc_text = self._decode(document_response)
+
+        self.assertEqual(doc_text, self._document_text)
+        self.assertTrue(detect_mock.called)
+        self.assertEqual(self._job.charset, 'utf-8')
+        self._job.save.assert_called_once_with(update_fields=['charset'])
+
+    def test_header_charset(self):
+        """
+        Test that the charset declared by the server is used when present.
+
+        """
+        document_response = DocumentResponse(
+            body=self._document_text.encode('utf-8'),
+            charset='utf-8')
+
+        with unittest.mock.patch('chardet.detect') as detect_mock:
+            doc_text = self._decode(document_response)
+
+        self.assertEqual(doc_text, self._document_text)
+        self.assertFalse(detect_mock.called)
+        self.assertFalse(self._job.save.called)
+
+    def test_no_charset(self):
+        """
+        Test that a detected charset is cached when no charset is available.
+
+        """
+        document_response = DocumentResponse(
+            body=self._document_text.encode('utf-8'),
+            charset=None)
+
+        with unittest.mock.patch(
+            'chardet.detect',
+            return_value={'encoding': 'utf-8'}):
+            doc_text = self._decode(document_response)
+
+        self.assertEqual(doc_text, self._document_text)
+        self.assertEqual(self._job.charset, 'utf-8')
+        self._job.save.assert_called_once_with(update_fields=['charset'])
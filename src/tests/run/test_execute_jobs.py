@@ -1,120 +1,162 @@
 """
-Tests the selection of job data from the database.
+Tests the execution of a run's jobs.
+
+Jobs request their documents from a stub aiohttp web server on the loopback
+interface through the run's own client session. Only the plugin module is
+mocked. Snapshots and checkpoints are saved to the test database.
 
 """
 
 import asyncio
-import datetime
 import io
-import sys
+import types
 import unittest.mock
 
-from django.test import TestCase
-
-# Preemptively replace settings module. Python will believe that the module has
-# already been imported. The module's settings file imports the Django project
-# settings module which, when running these tests outside of a Django project,
-# obviously raises an exception. This must be done before the Command is
-# imported.
-sys.modules['docsnaps.settings'] = unittest.mock.NonCallableMock()
+import aiohttp.test_utils
+import aiohttp.web
+import django.test
 
+from django_docsnaps.management.commands._run import Command
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
 from .. import utils as test_utils
-from docsnaps.management.commands._run import Command
-import docsnaps.management.commands._utils as command_utils
-import docsnaps.models
 
 
-class TestExecuteJob(TestCase):
+@unittest.mock.patch('django_docsnaps.settings.DJANGO_DOCSNAPS_DB_THREADS', 0)
+class TestExecuteJobs(django.test.TestCase):
 
     def setUp(self):
         """
         Capture stdout output to string buffer instead of allowing it to be
         sent to actual terminal stdout.
 
+        Start the stub server, which serves a document at /terms and a missing
+        document at any other path, and point the jobs at it.
+
         """
         self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
 
-    @classmethod
-    def setUpTestData(self):
-        """
-        Load baseline data for the tests.
+        module = types.ModuleType('fake.module')
+        module.__version__ = '1.0.0'
+        module.transform = lambda text: (text, None)
+        self._command._import_job_module = unittest.mock.Mock(
+            return_value=module)
 
-        Might switch to fixtures in the future.
+        async def terms(request):
+            return aiohttp.web.Response(
+                text='Terms\n',
+                headers={'Content-Type': 'text/plain; charset=utf-8'})
 
-        See:
-            https://docs.djangoproject.com/en/dev/topics/testing/tools/#fixture-loading
+        application = aiohttp.web.Application()
+        application.router.add_get('/terms', terms)
+        self._loop = asyncio.get_event_loop()
+        self._server = aiohttp.test_utils.TestServer(application)
+        self._loop.run_until_complete(self._server.start_server())
+        self.addCleanup(self._loop.run_until_complete, self._server.close())
 
+        for job in django_docsnaps.models.DocumentsLanguages.objects.all():
+            job.url = str(self._server.make_url('/terms'))
+            job.save()
+
+    @classmethod
+    def setUpTestData(cls):
         """
-        document = None
-        documents_languages = test_utils.get_test_models()[0]
-        snapshot_timedelta = datetime.timedelta(days=1)
-        snapshot_datetime = datetime.datetime.today() - snapshot_timedelta
+        Insert two jobs of a single document.
 
-        # Create basic models.
-        test_models = command_utils.flatten_model_graph(documents_languages)
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
         for model in reversed(list(test_models)):
-            if isinstance(model, docsnaps.models.Document):
-                document = model
             model.save()
 
-        # Create Transform records.
-        docsnaps.models.Transform.objects.create(
-            document_id=document,
-            module='fake.module1',
-            execution_priority=0)
-        docsnaps.models.Transform.objects.create(
-            document_id=document,
-            module='fake.module2',
-            execution_priority=1)
-
-        # Create Snapshot records.
-        # Create old snapshot.
-        docsnaps.models.Snapshot.objects.create(
-            documents_languages_id=documents_languages,
-            date=snapshot_datetime.date().isoformat(),
-            time=snapshot_datetime.time().isoformat(),
-            datetime=snapshot_datetime.isoformat(),
-            text='Slightly larger small document.')
-        # Create most recent snapshot.
-        snapshot_datetime = snapshot_datetime + snapshot_timedelta
-        docsnaps.models.Snapshot.objects.create(
-            documents_languages_id=documents_languages,
-            date=snapshot_datetime.date().isoformat(),
-            time=snapshot_datetime.time().isoformat(),
-            datetime=snapshot_datetime.isoformat(),
-            text='Really small document')
-
-    def test_execute_multiple_jobs(self):
+        language = django_docsnaps.models.Language.objects.create(
+            language_id=2,
+            name='French',
+            code_iso_639_1='fr')
+        cls._second_job = django_docsnaps.models.DocumentsLanguages.objects\
+            .create(
+                documents_languages_id=2,
+                document_id=cls._job.document_id,
+                language_id=language,
+                url='help.test.tset/legal/termsofuse?locale=fr')
+
+    def _execute(self):
         """
-        Test correct snapshot creation under ideal conditions.
+        Execute the active jobs in a new run.
+
+        Returns:
+            int: The number of failed jobs.
 
         """
-        raise NotImplementedError('Complete this test.')
+        run = self._command._start_run(True)
+        active_jobs = self._command._get_active_jobs(force=True, run=run)
 
-    def test_execute_single_job(self):
+        return self._loop.run_until_complete(
+            self._command._execute_enabled_jobs(
+                active_jobs,
+                loop=self._loop,
+                run=run))
+
+    def _get_snapshot_texts(self, job):
+        return list(
+            django_docsnaps.models.Snapshot.objects\
+                .filter(documents_languages_id=job)\
+                .values_list('text', flat=True))
+
+    def test_execute_multiple_jobs(self):
         """
-        Test correct snapshot creation under ideal conditions.
+        Test correct snapshot creation and checkpointing for every job.
 
         """
-        #active_jobs = self._command._get_active_jobs()
-        #loop = asyncio.get_event_loop()
-        #loop.run_until_complete(self._command._execute_jobs(active_jobs))
-        #loop.close()
-        raise NotImplementedError('Complete this test.')
+        self.assertEqual(self._execute(), 0)
+
+        self.assertEqual(self._get_snapshot_texts(self._job), ['Terms\n'])
+        self.assertEqual(
+            self._get_snapshot_texts(self._second_job),
+            ['Terms\n'])
+        self.assertEqual(
+            django_docsnaps.models.RunCheckpoint.objects.count(),
+            2)
 
-    def test_execute_single_job_no_snapshots(self):
+    def test_execute_single_job(self):
         """
-        Test correct snapshot creation without any existing snapshots.
+        Test that an unchanged document is not saved again.
 
         """
-        raise NotImplementedError('Complete this test.')
+        django_docsnaps.models.DocumentsLanguages.objects\
+            .filter(pk=self._second_job.pk)\
+            .update(is_enabled=False)
+        django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=self._job,
+            digest=command_utils.get_digest('Terms\n'),
+            simhash=django_docsnaps.fingerprints.simhash('Terms\n'),
+            text='Terms\n')
+
+        self.assertEqual(self._execute(), 0)
+
+        self.assertEqual(self._get_snapshot_texts(self._job), ['Terms\n'])
+        self.assertEqual(
+            django_docsnaps.models.RunCheckpoint.objects.count(),
+            1)
 
     def test_job_exception(self):
         """
-        Test behavior if a job completes with exception raised.
-
-        Entire process should not be halted but failure should output to console
-        and it should be logged.
+        Test that a failed job is reported and not checkpointed and that the
+        other jobs are not halted.
 
         """
-        pass
+        django_docsnaps.models.DocumentsLanguages.objects\
+            .filter(pk=self._second_job.pk)\
+            .update(url=str(self._server.make_url('/missing')))
+
+        self.assertEqual(self._execute(), 1)
+
+        self.assertEqual(self._get_snapshot_texts(self._job), ['Terms\n'])
+        self.assertEqual(self._get_snapshot_texts(self._second_job), [])
+        self.assertEqual(
+            list(
+                django_docsnaps.models.RunCheckpoint.objects\
+                    .values_list('documents_languages_id', flat=True)),
+            [self._job.pk])
+        self.assertIn('404', self._command.stdout.getvalue())
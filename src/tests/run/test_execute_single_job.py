@@ -0,0 +1,262 @@
+"""
+Tests the execution of a single snapshot job.
+
+The network, plugin module, and database are all mocked. These tests only
+assert the decisions made by the job between fetching and saving.
+
+"""
+
+import asyncio
+import io
+import tempfile
+import threading
+import types
+import unittest.mock
+
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+from django_docsnaps.management.commands._run import DocumentFile
+from django_docsnaps.management.commands._run import DocumentResponse
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._utils as command_utils
+
+
+class TestExecuteSingleJob(django.test.SimpleTestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        Mock each of the command's methods that would touch the network or the
+        database.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        self._document_response = DocumentResponse(
+            body=b'Really small document.',
+            charset='utf-8')
+        self._job = unittest.mock.Mock(
+            charset=None,
+            module_version=None,
+            response_digest=None,
+            similarity_threshold=None)
+        self._job.document_id.transform_set.all.return_value = []
+        self._module = types.ModuleType('fake.module')
+        self._module.__version__ = '1.0.0'
+        self._module.transform = unittest.mock.Mock(
+            side_effect=lambda text: (text, True))
+
+        async def _mock_request_document(*args, **kwargs):
+            return self._document_response
+        self._save_mock = unittest.mock.Mock()
+        async def _mock_save_new_snapshot(*args, **kwargs):
+            self._save_mock(*args, **kwargs)
+
+        self._command._request_document = _mock_request_document
+        self._command._import_job_module = unittest.mock.Mock(
+            return_value=self._module)
+        self._command._save_new_snapshot = _mock_save_new_snapshot
+
+    def _execute(self):
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                self._job,
+                unittest.mock.NonCallableMock()))
+
+    def test_changed_module_version(self):
+        """
+        Test that transform is called when only the module version changed.
+
+        """
+        self._job.response_digest = command_utils.get_digest(
+            self._document_response.body)
+        self._job.module_version = '0.9.0'
+
+        self._execute()
+
+        self.assertTrue(self._module.transform.called)
+        self.assertEqual(self._job.module_version, '1.0.0')
+
+    def test_changed_response(self):
+        """
+        Test that transform is called and the job state updated on new body.
+
+        """
+        self._job.response_digest = command_utils.get_digest(b'Old document.')
+        self._job.module_version = '1.0.0'
+
+        self._execute()
+
+        self._module.transform.assert_called_once_with(
+            'Really small document.')
+        self.assertTrue(self._save_mock.called)
+        self.assertEqual(
+            self._job.response_digest,
+            command_utils.get_digest(self._document_response.body))
+        self._job.save.assert_called_once_with(
+            update_fields=['response_digest', 'module_version'])
+
+    def test_fingerprint_off_loop(self):
+        """
+        Test that the transformed text is fingerprinted outside of the event
+        loop's thread.
+
+        """
+        threads = []
+        simhash = django_docsnaps.fingerprints.simhash
+        def _mock_simhash(text):
+            threads.append(threading.current_thread())
+            return simhash(text)
+
+        with unittest.mock.patch(
+            'django_docsnaps.fingerprints.simhash',
+            _mock_simhash):
+            self._execute()
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertTrue(self._save_mock.called)
+
+    def test_identical_transformed_text(self):
+        """
+        Test that text identical to the latest snapshot is never saved.
+
+        The plugin reports a change but the core compares digests itself.
+
+        """
+        snapshot = unittest.mock.NonCallableMock(
+            digest=command_utils.get_digest('Really small document.'))
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                self._job,
+                unittest.mock.NonCallableMock(),
+                snapshot=snapshot))
+
+        self.assertTrue(self._module.transform.called)
+        self.assertFalse(self._save_mock.called)
+
+    def test_missing_fingerprints(self):
+        """
+        Test that the digest and fingerprint of a snapshot saved without them
+        are computed through the database executor, which loads the text.
+
+        """
+        snapshot = unittest.mock.NonCallableMock(
+            digest=None,
+            simhash=None,
+            text='Really small document.')
+        functions = []
+        database = command_database.DatabaseExecutor()
+        async def _mock_run(function, *args, **kwargs):
+            functions.append(getattr(function, '__name__', None))
+            return await command_database.DatabaseExecutor.run(
+                database,
+                function,
+                *args,
+                **kwargs)
+        database.run = _mock_run
+        self._command._get_database = unittest.mock.Mock(
+            return_value=database)
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                self._job,
+                unittest.mock.NonCallableMock(),
+                snapshot=snapshot))
+
+        self.assertEqual(functions[0], 'load_fingerprints')
+        self.assertFalse(self._save_mock.called)
+
+    def test_near_duplicate_text(self):
+        """
+        Test that text within the job's similarity threshold is not saved but
+        that text beyond it is.
+
+        """
+        self._document_response = DocumentResponse(
+            body=b'The quick brown fox jumps over the lazy dog today.',
+            charset='utf-8')
+        snapshot = unittest.mock.NonCallableMock(
+            digest=command_utils.get_digest('Old document.'),
+            simhash=django_docsnaps.fingerprints.simhash(
+                'The quick brown fox jumps over the lazy dog today.\n'),
+            snapshot_id=7)
+
+        self._job.similarity_threshold = 3
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                self._job,
+                unittest.mock.NonCallableMock(),
+                snapshot=snapshot))
+        self.assertFalse(self._save_mock.called)
+        self.assertRegex(
+            self._command.stdout.getvalue(),
+            'near duplicate of snapshot 7, distance [0-3]')
+
+        self._document_response = DocumentResponse(
+            body=b'An entirely different document.',
+            charset='utf-8')
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                self._job,
+                unittest.mock.NonCallableMock(),
+                snapshot=snapshot))
+        self.assertTrue(self._save_mock.called)
+
+    def test_streaming_module(self):
+        """
+        Test that a streaming module's documents are only streamed above the
+        threshold and are otherwise transformed in memory.
+
+        """
+        async def _mock_request_document_file(*args, **kwargs):
+            body_file = tempfile.TemporaryFile()
+            body_file.write(self._document_response.body)
+            body_file.seek(0)
+            return DocumentFile(
+                body_file=body_file,
+                charset='utf-8',
+                digest=command_utils.get_digest(self._document_response.body),
+                size=len(self._document_response.body))
+        streaming_mock = unittest.mock.Mock()
+        async def _mock_execute_streaming_job(*args, **kwargs):
+            streaming_mock(*args, **kwargs)
+        self._command._request_document_file = _mock_request_document_file
+        self._command._execute_streaming_job = _mock_execute_streaming_job
+        self._module.transform_stream = unittest.mock.Mock()
+
+        self._execute()
+        self._module.transform.assert_called_once_with(
+            'Really small document.')
+        self.assertFalse(streaming_mock.called)
+
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_STREAM_THRESHOLD',
+            8):
+            self._execute()
+        self.assertTrue(streaming_mock.called)
+        self._module.transform.assert_called_once_with(
+            'Really small document.')
+
+    def test_unchanged_response(self):
+        """
+        Test that transform is skipped when body and module version match.
+
+        """
+        self._job.response_digest = command_utils.get_digest(
+            self._document_response.body)
+        self._job.module_version = '1.0.0'
+
+        self._execute()
+
+        self.assertFalse(self._module.transform.called)
+        self.assertFalse(self._save_mock.called)
+        self.assertFalse(self._job.save.called)
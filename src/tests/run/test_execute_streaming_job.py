@@ -0,0 +1,118 @@
+"""
+Tests the execution of a snapshot job whose plugin module streams.
+
+The network and plugin module are mocked but snapshots are saved to the test
+database so that chunked writes can be verified.
+
+"""
+
+import asyncio
+import io
+import tempfile
+import types
+import unittest.mock
+
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+from django_docsnaps.management.commands._run import DocumentFile
+import django_docsnaps.management.commands._transform as command_transform
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+class TestExecuteStreamingJob(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        The chunk size is reduced so that the test document spans many chunks,
+        including chunks that split multi-byte characters.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        self._document_text = 'Conditions d’utilisation. ' * 100
+        self._job = django_docsnaps.models.DocumentsLanguages.objects.get()
+
+        self._module = types.ModuleType('fake.module')
+        async def transform_stream(chunks):
+            async for chunk in chunks:
+                yield chunk.upper()
+        self._module.transform_stream = transform_stream
+
+        settings_patcher = unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_STREAM_CHUNK_SIZE',
+            7)
+        settings_patcher.start()
+        self.addCleanup(settings_patcher.stop)
+
+    @classmethod
+    def setUpTestData(self):
+        """
+        Load baseline data for the tests.
+
+        """
+        documents_languages = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(documents_languages)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def _execute(self, previous=None):
+        context = command_transform.TransformContext(
+            unittest.mock.NonCallableMock(),
+            None,
+            None)
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self._command._execute_streaming_job(
+                self._job,
+                self._module,
+                '1.0.0',
+                self._get_document_file(),
+                previous=previous,
+                context=context))
+
+    def _get_document_file(self):
+        body = self._document_text.encode('utf-8')
+        body_file = tempfile.TemporaryFile()
+        body_file.write(body)
+        body_file.seek(0)
+        return DocumentFile(
+            body_file=body_file,
+            charset='utf-8',
+            digest=command_utils.get_digest(body),
+            size=len(body))
+
+    def test_changed_document(self):
+        """
+        Test that the streamed output is saved in full with its digest.
+
+        """
+        self._execute()
+
+        snapshot = django_docsnaps.models.Snapshot.objects.get()
+        self.assertEqual(snapshot.text, self._document_text.upper())
+        self.assertEqual(
+            snapshot.digest,
+            command_utils.get_digest(self._document_text.upper()))
+        self.assertEqual(
+            snapshot.simhash,
+            django_docsnaps.fingerprints.simhash(self._document_text.upper()))
+        self._job.refresh_from_db()
+        self.assertEqual(self._job.module_version, '1.0.0')
+
+    def test_unchanged_document(self):
+        """
+        Test that output identical to the latest snapshot is not saved.
+
+        """
+        previous = unittest.mock.NonCallableMock(
+            digest=command_utils.get_digest(self._document_text.upper()))
+
+        self._execute(previous=previous)
+
+        self.assertFalse(django_docsnaps.models.Snapshot.objects.exists())
@@ -10,6 +10,7 @@ import unittest.mock
 import django.core.management.base
 import django.db
 import django.test
+import django.utils.timezone
 
 from django_docsnaps.management.commands._run import Command
 import django_docsnaps.management.commands._utils as command_utils
@@ -125,3 +126,53 @@ class TestGetActiveJobs(django.test.TestCase):
         active_jobs = self._command._get_active_jobs()
 
         self.assertEqual(len(active_jobs), 0)
+
+    def test_get_active_jobs_fresh(self):
+        """
+        Test that a job whose last response is fresh is only selected when a
+        fetch was requested or the run is forced.
+
+        """
+        job_set = django_docsnaps.models.DocumentsLanguages.objects.all()
+        job_set.update(
+            fresh_until_datetime=(
+                django.utils.timezone.now() + datetime.timedelta(hours=1)))
+
+        self.assertEqual(len(self._command._get_active_jobs()), 0)
+        self.assertEqual(len(self._command._get_active_jobs(force=True)), 1)
+
+        job_set.update(fetch_requested_datetime=django.utils.timezone.now())
+
+        self.assertEqual(len(self._command._get_active_jobs()), 1)
+
+    def test_get_active_jobs_hinted(self):
+        """
+        Test that a job whose poll interval has not elapsed is selected when a
+        fetch was requested for it.
+
+        """
+        django_docsnaps.models.DocumentsLanguages.objects.all().update(
+            checked_datetime=django.utils.timezone.now(),
+            fetch_requested_datetime=django.utils.timezone.now(),
+            poll_interval=86400)
+        active_jobs = self._command._get_active_jobs()
+
+        self.assertEqual(len(active_jobs), 1)
+
+    def test_get_active_jobs_not_due(self):
+        """
+        Test that a job is not selected until its poll interval has elapsed.
+
+        """
+        job_set = django_docsnaps.models.DocumentsLanguages.objects.all()
+        job_set.update(
+            checked_datetime=django.utils.timezone.now(),
+            poll_interval=86400)
+
+        self.assertEqual(len(self._command._get_active_jobs()), 0)
+
+        job_set.update(
+            checked_datetime=(
+                django.utils.timezone.now() - datetime.timedelta(days=2)))
+
+        self.assertEqual(len(self._command._get_active_jobs()), 1)
@@ -0,0 +1,164 @@
+"""
+Tests the loading, compilation, and application of ignore rules.
+
+"""
+
+import io
+
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+import django_docsnaps.management.commands._ignore as command_ignore
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+class TestLoadIgnoreRules(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def _get_jobs(self):
+        return django_docsnaps.models.DocumentsLanguages.objects\
+            .prefetch_related('document_id__transform_set')
+
+    def test_invalid_pattern(self):
+        """
+        Test that an invalid pattern is skipped and reported while the job's
+        other rules still apply.
+
+        """
+        django_docsnaps.models.IgnoreRule.objects.create(
+            documents_languages_id=self._job,
+            pattern='(unclosed')
+        django_docsnaps.models.IgnoreRule.objects.create(
+            documents_languages_id=self._job,
+            pattern=r'csrf=\w+')
+
+        rule_sets = self._command._load_ignore_rules(self._get_jobs())
+        rule_set = rule_sets[self._job.documents_languages_id]
+        self._command._report_invalid_ignore_rules(rule_sets)
+
+        self.assertEqual(rule_set.apply('Terms csrf=abc123'), 'Terms ')
+        self.assertEqual(
+            [pattern for pattern, message in rule_set.invalid_patterns],
+            ['(unclosed'])
+        self.assertIn('(unclosed', self._command.stdout.getvalue())
+
+    def test_job_and_module_rules(self):
+        """
+        Test that a job's own rules and its module's rules are combined and
+        that disabled rules and other modules' rules are ignored.
+
+        """
+        django_docsnaps.models.IgnoreRule.objects.create(
+            documents_languages_id=self._job,
+            pattern=r'csrf=\w+')
+        django_docsnaps.models.IgnoreRule.objects.create(
+            module='fake.module',
+            pattern=r'\d{2}:\d{2}')
+        django_docsnaps.models.IgnoreRule.objects.create(
+            module='fake.module',
+            pattern='Terms',
+            is_enabled=False)
+        django_docsnaps.models.IgnoreRule.objects.create(
+            module='other.module',
+            pattern='of')
+
+        rule_sets = self._command._load_ignore_rules(self._get_jobs())
+
+        self.assertEqual(
+            rule_sets[self._job.documents_languages_id].apply(
+                'Terms of use csrf=abc123 at 12:30'),
+            'Terms of use  at ')
+
+    def test_no_rules(self):
+        """
+        Test that no rule sets are returned when no rules exist.
+
+        """
+        self.assertEqual(self._command._load_ignore_rules(self._get_jobs()), {})
+
+
+class TestIgnoreRuleSet(django.test.SimpleTestCase):
+
+    def test_backreference_rule(self):
+        """
+        Test that a rule's numbered backreference refers to its own group.
+
+        """
+        rule_set = command_ignore.IgnoreRuleSet([
+            django_docsnaps.models.IgnoreRule(pattern=r'\d+'),
+            django_docsnaps.models.IgnoreRule(pattern=r'<(b)>.*?</\1>')])
+
+        self.assertEqual(
+            rule_set.apply('Terms <b>updated</b> 2 <i>times</i>'),
+            'Terms   <i>times</i>')
+
+    def test_inline_flag_rule(self):
+        """
+        Test that a rule's global inline flags apply to that rule only.
+
+        """
+        rule_set = command_ignore.IgnoreRuleSet([
+            django_docsnaps.models.IgnoreRule(pattern=r'(?i)csrf=\w+'),
+            django_docsnaps.models.IgnoreRule(pattern='terms')])
+
+        self.assertEqual(rule_set.invalid_patterns, [])
+        self.assertEqual(
+            rule_set.apply('Terms CSRF=abc terms'),
+            'Terms  ')
+
+    def test_selector_rules(self):
+        """
+        Test that matched elements and their content are removed and that the
+        remaining markup is reproduced unchanged.
+
+        """
+        rule_set = command_ignore.IgnoreRuleSet([
+            django_docsnaps.models.IgnoreRule(
+                rule_type=django_docsnaps.models.IgnoreRule.RULE_TYPE_SELECTOR,
+                pattern='input[name=csrf]'),
+            django_docsnaps.models.IgnoreRule(
+                rule_type=django_docsnaps.models.IgnoreRule.RULE_TYPE_SELECTOR,
+                pattern='.timestamp')])
+        doc_text = (
+            '<p class="a">Terms &amp; <br>conditions'
+            '<span class="timestamp">Updated <b>today</b></span></p>'
+            '<input name="csrf" value="abc"><!-- comment -->')
+
+        self.assertEqual(
+            rule_set.apply(doc_text),
+            '<p class="a">Terms &amp; <br>conditions</p><!-- comment -->')
+
+    def test_version_changes_with_rules(self):
+        """
+        Test that the version depends on the rules but not their order.
+
+        """
+        first = django_docsnaps.models.IgnoreRule(pattern='a')
+        second = django_docsnaps.models.IgnoreRule(pattern='b')
+
+        self.assertEqual(
+            command_ignore.IgnoreRuleSet([first, second]).version,
+            command_ignore.IgnoreRuleSet([second, first]).version)
+        self.assertNotEqual(
+            command_ignore.IgnoreRuleSet([first]).version,
+            command_ignore.IgnoreRuleSet([first, second]).version)
@@ -1,133 +1,151 @@
 """
-Tests the selection of job data from the database.
+Tests the request of documents from remote sources.
 
-These tests create tight coupling to the aiohttp library. The other alternative
-to mocking aiohttp objects is to use a Docker web server container to serve
-bare-bones pages to test HTTP response codes, timeouts, etc.
-
-Alternative is possibly to use the http.server module to start and stop a web
-server here in this test file, defining handlers for the GET method.
+Requests are issued to a stub aiohttp web server on the loopback interface so
+that HTTP response codes, timeouts, and bodies are produced by aiohttp itself
+rather than by mocks of its objects.
 
 """
 
 import asyncio
 import io
-import sys
 import unittest.mock
 
 import aiohttp
-from django.test import SimpleTestCase
-import yarl
-
-# Preemptively replace settings module. Python will believe that the module has
-# already been imported. The module's settings file imports the Django project
-# settings module which, when running these tests outside of a Django project,
-# obviously raises an exception. This must be done before the Command is
-# imported.
-sys.modules['docsnaps.settings'] = unittest.mock.NonCallableMock()
-
-from .. import utils as test_utils
-from docsnaps.management.commands._run import Command
+import aiohttp.test_utils
+import aiohttp.web
+import django.core.management.base
+import django.test
 
+from django_docsnaps.management.commands._run import Command
+from django_docsnaps.management.commands._run import DocumentResponse
+import django_docsnaps.management.commands._utils as command_utils
 
-patch_attributes = {'DOCSNAPS_REQUEST_TIMEOUT': 0.5}
-@unittest.mock.patch('docsnaps.settings', create=True, **patch_attributes)
-class TestRequestDocument(SimpleTestCase):
-    """
-    Patch the module settings into every test case. The sys.modules manipulation
-    ensures the import statements never actually hit the import system and the
-    patch ensures that the replacement value occupies the correct name within
-    the test subject module's namespace.
 
-    """
+@unittest.mock.patch(
+    'django_docsnaps.settings.DJANGO_DOCSNAPS_REQUEST_TIMEOUT',
+    0.5)
+class TestRequestDocument(django.test.SimpleTestCase):
 
     def setUp(self):
         """
         Capture stdout output to string buffer instead of allowing it to be
         sent to actual terminal stdout.
 
+        Start the stub server, which serves a document, a missing document,
+        and a document that is never finished.
+
         """
         self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
-        self._test_url = 'http://url.test'
+        self._document_body = 'Documents snapshot.'.encode('utf-8')
 
-    def test_error_code(self, docsnaps_settings_mock):
-        """
-        Test unsuccessful HTTP response code.
+        async def document(request):
+            return aiohttp.web.Response(
+                body=self._document_body,
+                headers={'Content-Type': 'text/html; charset=UTF-8'})
 
-        I'm not happy with this test as I'm not sure it actually serves a
-        purpose given the way it's implemented.
+        async def missing(request):
+            raise aiohttp.web.HTTPNotFound()
 
-        """
-        async def _mock_get(*args, **kwargs):
-            response = aiohttp.ClientResponse(
-                aiohttp.hdrs.METH_GET,
-                yarl.URL(self._test_url))
-            response.status = 404
+        async def slow(request):
+            response = aiohttp.web.StreamResponse()
+            await response.prepare(request)
+            await response.write(b'Documents')
+            await asyncio.sleep(1)
             return response
-        client_session = unittest.mock.Mock(get=_mock_get)
-        loop = asyncio.get_event_loop()
 
-        self.assertRaises(
-            aiohttp.errors.HttpProcessingError,
-            loop.run_until_complete,
-            self._command._request_document(client_session, self._test_url))
+        application = aiohttp.web.Application()
+        application.router.add_get('/document', document)
+        application.router.add_get('/missing', missing)
+        application.router.add_get('/slow', slow)
+        self._loop = asyncio.get_event_loop()
+        self._server = aiohttp.test_utils.TestServer(application)
+        self._loop.run_until_complete(self._server.start_server())
+        self.addCleanup(self._loop.run_until_complete, self._server.close())
 
-    def test_request_timeout(self, docsnaps_settings_mock):
+    def _request(self, method, path):
         """
-        Test request timing out.
+        Request a path of the stub server in a new client session.
 
-        Timeout should be logged with moderate to high severity.
+        """
+        async def request():
+            async with aiohttp.ClientSession() as client_session:
+                return await method(
+                    client_session,
+                    str(self._server.make_url(path)))
 
-        Nested coroutine function defined because aiohttp complains when
-        ClientSession is not instantiated from within coroutine. Additionally,
-        I prefer to at least attempt to test the instance's creation in a
-        context similar to that of production.
+        return self._loop.run_until_complete(request())
 
+    def test_error_code(self):
         """
-        async def _client_session_creation_coroutine(**kwargs):
-            async with aiohttp.ClientSession(**kwargs) as session:
-                await self._command._request_document(
-                    session,
-                    self._test_url)
+        Test that an unsuccessful HTTP response code raises a CommandError.
 
-        async def _mock_connect_coroutine(self, *args, **kwargs):
-            await asyncio.sleep(
-                patch_attributes['DOCSNAPS_REQUEST_TIMEOUT'] + 0.1)
+        """
+        with self.assertRaisesRegex(
+            django.core.management.base.CommandError,
+            '404'):
+            self._request(self._command._request_document, '/missing')
 
-        loop = asyncio.get_event_loop()
-        connector = aiohttp.TCPConnector(loop=loop)
-        connector.connect = _mock_connect_coroutine
+    def test_request_timeout(self):
+        """
+        Test that a request timing out while its body is read raises a
+        CommandError.
 
+        """
         self.assertRaises(
-            aiohttp.errors.TimeoutError,
-            loop.run_until_complete,
-            _client_session_creation_coroutine(connector=connector))
+            django.core.management.base.CommandError,
+            self._request,
+            self._command._request_document,
+            '/slow')
 
-    def test_successful_request(self, docsnaps_settings_mock):
+    def test_stream_timeout(self):
+        """
+        Test that a streamed request timing out raises a CommandError and
+        closes the temporary file.
+
+        """
+        body_files = []
+        with unittest.mock.patch(
+            'django_docsnaps.management.commands._run.tempfile') \
+            as tempfile_mock:
+            def create_file():
+                body_files.append(io.BytesIO())
+                return body_files[-1]
+            tempfile_mock.TemporaryFile = create_file
+            self.assertRaises(
+                django.core.management.base.CommandError,
+                self._request,
+                self._command._request_document_file,
+                '/slow')
+
+        self.assertTrue(body_files[0].closed)
+
+    def test_successful_request(self):
         """
         Test normal, successful HTTP request.
 
-        I'm not sure nested function definitions are good practice here. Review.
+        """
+        document_response = self._request(
+            self._command._request_document,
+            '/document')
+
+        self.assertIsInstance(document_response, DocumentResponse)
+        self.assertEqual(document_response.body, self._document_body)
+        self.assertEqual(document_response.charset, 'utf-8')
+
+    def test_successful_stream(self):
+        """
+        Test normal, successful streamed HTTP request.
 
         """
-        # Define awaitable response mock.
-        document_text = 'Documents snapshot.'
-        async def mock_text_coroutine(*args, **kwargs):
-            return document_text
-        response_mock = unittest.mock.NonCallableMock()
-        response_mock.text = mock_text_coroutine
-
-        # Define awaitable get() mock.
-        async def mock_get_coroutine(*args, **kwargs):
-            return response_mock
-        client_session_mock = unittest.mock.NonCallableMock(
-            get=mock_get_coroutine)
-
-        loop = asyncio.get_event_loop()
-        text = loop.run_until_complete(
-            self._command._request_document(
-                client_session_mock,
-                self._test_url))
-
-        self.assertEqual(text, document_text)
-        self.assertTrue(response_mock.close.called)
+        document_file = self._request(
+            self._command._request_document_file,
+            '/document')
+        self.addCleanup(document_file.body_file.close)
+
+        self.assertEqual(document_file.body_file.read(), self._document_body)
+        self.assertEqual(document_file.charset, 'utf-8')
+        self.assertEqual(document_file.size, len(self._document_body))
+        self.assertEqual(
+            document_file.digest,
+            command_utils.get_digest(self._document_body))
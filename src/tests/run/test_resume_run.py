@@ -0,0 +1,149 @@
+"""
+Tests the checkpointing of completed jobs and the resumption of runs.
+
+"""
+
+import asyncio
+import io
+import unittest.mock
+
+import django.core.management.base
+import django.db
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+class TestResumeRun(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def test_checkpoint(self):
+        """
+        Test that a checkpointed job is saved as checked and excluded from
+        the run's resumption, and that checkpointing may be repeated.
+
+        """
+        run = self._command._start_run(False)
+        self._command._save_checkpoint(run, [self._job], None)
+        self._command._save_checkpoint(run, [self._job], None)
+
+        self.assertEqual(
+            django_docsnaps.models.RunCheckpoint.objects.count(),
+            1)
+        self.assertIsNotNone(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .get(pk=self._job.pk)\
+                .checked_datetime)
+        self.assertEqual(
+            self._command._get_active_jobs(force=True, run=run),
+            [])
+        self.assertEqual(
+            self._command._get_active_jobs(
+                force=True,
+                run=self._command._start_run(False)),
+            [self._job])
+
+    def test_checkpoint_database_error(self):
+        """
+        Test that a database error raised in the database executor reaches
+        the checkpointing coroutine and is re-raised there as a CommandError.
+
+        """
+        self._command._database = command_database.DatabaseExecutor()
+        self._command._save_checked_jobs = unittest.mock.Mock(
+            side_effect=django.db.DatabaseError('Checkpoint failed.'))
+
+        loop = asyncio.get_event_loop()
+        with self.assertRaisesRegex(
+            django.core.management.base.CommandError,
+            'Checkpoint failed.'):
+            loop.run_until_complete(
+                self._command._checkpoint_jobs(None, [self._job], None))
+
+    def test_finished_run(self):
+        """
+        Test that a finished run is not resumed and that its checkpoints are
+        deleted.
+
+        """
+        run = self._command._start_run(False)
+        self._command._save_checkpoint(run, [self._job], None)
+        self._command._finish_run(run)
+
+        self.assertIsNone(self._command._get_resumable_run())
+        self.assertFalse(
+            django_docsnaps.models.RunCheckpoint.objects.exists())
+
+    def test_failed_jobs(self):
+        """
+        Test that cancelled jobs and jobs that raised are reported and
+        counted as failed.
+
+        """
+        loop = asyncio.get_event_loop()
+        failed_task = loop.create_future()
+        failed_task.set_exception(ValueError('Request failed.'))
+        cancelled_task = loop.create_future()
+        cancelled_task.cancel()
+        completed_task = loop.create_future()
+        completed_task.set_result(None)
+
+        failed_count = self._command._report_failed_jobs({
+            failed_task: self._job,
+            cancelled_task: self._job,
+            completed_task: self._job})
+
+        self.assertEqual(failed_count, 2)
+        output = self._command.stdout.getvalue()
+        self.assertIn('Request failed.', output)
+        self.assertIn('cancelled', output)
+
+    def test_superseded_run(self):
+        """
+        Test that starting a new run finishes the earlier unfinished run and
+        deletes its checkpoints.
+
+        """
+        superseded_run = self._command._start_run(False)
+        self._command._save_checkpoint(superseded_run, [self._job], None)
+        run = self._command._start_run(False)
+
+        superseded_run.refresh_from_db()
+        self.assertIsNotNone(superseded_run.finished_datetime)
+        self.assertFalse(
+            django_docsnaps.models.RunCheckpoint.objects.exists())
+        self.assertEqual(self._command._get_resumable_run(), run)
+
+    def test_unfinished_run(self):
+        """
+        Test that only the latest run is resumed if it is unfinished.
+
+        """
+        self.assertIsNone(self._command._get_resumable_run())
+
+        self._command._start_run(False)
+        run = self._command._start_run(True)
+
+        self.assertEqual(self._command._get_resumable_run(), run)
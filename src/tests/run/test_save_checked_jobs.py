@@ -0,0 +1,116 @@
+"""
+Tests the recording of the datetime at which jobs were last checked.
+
+"""
+
+import datetime
+import io
+
+import django.test
+import django.utils.timezone
+
+from django_docsnaps.management.commands._run import Command
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+class TestSaveCheckedJobs(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def _get_fetch_requested_datetime(self):
+        return django_docsnaps.models.DocumentsLanguages.objects\
+            .values_list('fetch_requested_datetime', flat=True)\
+            .get(pk=self._job.pk)
+
+    def _get_checked_datetime(self):
+        return django_docsnaps.models.DocumentsLanguages.objects\
+            .values_list('checked_datetime', flat=True)\
+            .get(pk=self._job.pk)
+
+    def test_no_jobs(self):
+        """
+        Test that no query is issued when no jobs completed.
+
+        """
+        with self.assertNumQueries(0):
+            self._command._save_checked_jobs([])
+
+        self.assertIsNone(self._get_checked_datetime())
+
+    def test_save_checked_jobs(self):
+        """
+        Test that the jobs' checked datetimes are updated in a single query.
+
+        """
+        with self.assertNumQueries(1):
+            self._command._save_checked_jobs([self._job])
+
+        self.assertIsNotNone(self._get_checked_datetime())
+
+    def test_requested_fetch_cleared(self):
+        """
+        Test that a fetch requested before the job started is cleared while
+        one requested after it started is kept.
+
+        """
+        started_datetime = django.utils.timezone.now()
+        requested_datetime = started_datetime - datetime.timedelta(seconds=1)
+        job_set = django_docsnaps.models.DocumentsLanguages.objects\
+            .filter(pk=self._job.pk)
+        job_set.update(fetch_requested_datetime=requested_datetime)
+
+        with self.assertNumQueries(1):
+            self._command._save_checked_jobs(
+                [self._job],
+                requested_before=started_datetime)
+
+        self.assertIsNone(self._get_fetch_requested_datetime())
+
+        job_set.update(fetch_requested_datetime=django.utils.timezone.now())
+        self._command._save_checked_jobs(
+            [self._job],
+            requested_before=started_datetime)
+
+        self.assertIsNotNone(self._get_fetch_requested_datetime())
+
+    def test_fresh_until_saved(self):
+        """
+        Test that the freshness set on the job is saved and later cleared.
+
+        """
+        fresh_until = django.utils.timezone.now() + datetime.timedelta(hours=1)
+        self._job.fresh_until_datetime = fresh_until
+        self._command._save_checked_jobs([self._job])
+
+        self.assertEqual(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .values_list('fresh_until_datetime', flat=True)\
+                .get(pk=self._job.pk),
+            fresh_until)
+
+        self._job.fresh_until_datetime = None
+        self._command._save_checked_jobs([self._job])
+
+        self.assertIsNone(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .values_list('fresh_until_datetime', flat=True)\
+                .get(pk=self._job.pk))
@@ -0,0 +1,147 @@
+"""
+Tests the saving of new snapshots and their diff summaries.
+
+"""
+
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest.mock
+
+import django.db
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._spool as command_spool
+import django_docsnaps.management.commands._transform as command_transform
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+import django_docsnaps.views
+from .. import utils as test_utils
+
+
+class TestSaveNewSnapshot(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def _save(self, text, previous=None):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(
+            self._command._save_new_snapshot(
+                self._job,
+                text,
+                previous=previous))
+
+    def test_diff_summary(self):
+        """
+        Test that the differences from the previous snapshot are saved.
+
+        """
+        first_snapshot = self._save('Terms\nOld clause\n')
+        previous = command_transform.PreviousSnapshot(
+            django_docsnaps.models.Snapshot.objects\
+                .defer('text')\
+                .get(pk=first_snapshot.pk))
+        self._save('Terms\nNew clause\nAdded\n', previous=previous)
+
+        snapshot = django_docsnaps.models.Snapshot.objects.latest()
+        self.assertEqual(snapshot.lines_added, 2)
+        self.assertEqual(snapshot.lines_removed, 1)
+        self.assertEqual(snapshot.get_hunks(), [(1, 1, 1, 2)])
+        self.assertGreater(snapshot.changed_ratio, 0)
+
+    def test_first_snapshot(self):
+        """
+        Test that a job's first snapshot has no diff summary.
+
+        """
+        snapshot = self._save('Terms\n')
+
+        self.assertIsNotNone(snapshot.digest)
+        self.assertIsNotNone(snapshot.simhash)
+        self.assertIsNone(snapshot.hunks)
+        self.assertIsNone(snapshot.get_hunks())
+
+    def test_change_event(self):
+        """
+        Test that a change event is recorded when sinks are configured.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_EVENT_SINKS',
+            [{'type': 'file', 'path': '/dev/null'}]):
+            snapshot = self._save('Terms\n')
+
+        change_event = django_docsnaps.models.ChangeEvent.objects.get()
+        self.assertEqual(change_event.snapshot_id_id, snapshot.snapshot_id)
+        self.assertEqual(
+            json.loads(change_event.payload)['digest'],
+            snapshot.digest)
+
+    def test_cache_invalidation(self):
+        """
+        Test that the job's cached latest snapshot is invalidated through the
+        database executor after the snapshot is inserted.
+
+        """
+        functions = []
+        database = command_database.DatabaseExecutor()
+        async def _mock_run(function, *args, **kwargs):
+            functions.append(function)
+            return function(*args)
+        database.run = _mock_run
+        self._command._database = database
+
+        self._save('Terms\n')
+
+        self.assertEqual(
+            functions,
+            [
+                self._command._insert_snapshot,
+                django_docsnaps.views.invalidate_latest_snapshot])
+
+    def test_spooled(self):
+        """
+        Test that a snapshot whose write fails is appended to the spool.
+
+        """
+        spool_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_directory.cleanup)
+        spool_path = os.path.join(spool_directory.name, 'spool')
+        self._command._spool = command_spool.Spool(spool_path, sync_delay=0)
+        with unittest.mock.patch.object(
+            self._command,
+            '_insert_snapshot',
+            side_effect=django.db.OperationalError('Connection lost.')):
+            snapshot = self._save('Terms\n')
+        asyncio.get_event_loop().run_until_complete(
+            self._command._spool.close())
+
+        self.assertFalse(django_docsnaps.models.Snapshot.objects.exists())
+        with open(spool_path, 'rb') as spool_file:
+            records, trailing_length = command_spool.read_records(spool_file)
+        self.assertEqual(trailing_length, 0)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['type'], 'snapshot')
+        self.assertEqual(records[0]['digest'], snapshot.digest)
+        self.assertEqual(records[0]['text'], 'Terms\n')
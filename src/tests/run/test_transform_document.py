@@ -0,0 +1,183 @@
+"""
+Tests the invocation of plugin module transforms.
+
+Both the original transform interface and the extended interfaces that receive
+the previous snapshot and the run's context, or that are coroutine functions,
+must be supported.
+
+"""
+
+import asyncio
+import types
+import unittest.mock
+
+import django.test
+
+import django_docsnaps.management.commands._transform as command_transform
+import django_docsnaps.management.commands._utils as command_utils
+
+
+class TestTransformDocument(django.test.SimpleTestCase):
+
+    def setUp(self):
+        """
+        Create a fake plugin module and a fake, deferred snapshot.
+
+        """
+        self._module = types.ModuleType('fake.module')
+        self._snapshot = unittest.mock.NonCallableMock(
+            digest=command_utils.get_digest('Old text.'),
+            text='Old text.')
+
+    def test_coroutine_interface(self):
+        """
+        Test that a coroutine transform is awaited and receives the context.
+
+        The context's fetch() is used to retrieve a linked sub-document.
+
+        """
+        async def transform(doc_text, context=None):
+            sub_doc_text = await context.fetch('http://url.test/part2')
+            return doc_text + sub_doc_text
+        self._module.transform = transform
+        context = unittest.mock.NonCallableMock()
+        async def _mock_fetch(url):
+            return ' Part two.'
+        context.fetch = _mock_fetch
+
+        loop = asyncio.get_event_loop()
+        text, is_changed = loop.run_until_complete(
+            command_transform.transform_document(
+                self._module,
+                'Part one.',
+                context=context))
+
+        self.assertEqual(text, 'Part one. Part two.')
+        self.assertIsNone(is_changed)
+
+    def test_extended_interface(self):
+        """
+        Test that a transform declaring "previous" receives the snapshot.
+
+        """
+        def transform(doc_text, previous=None):
+            return doc_text.strip() + previous.digest[:4]
+        self._module.transform = transform
+        previous = command_transform.PreviousSnapshot(self._snapshot)
+
+        loop = asyncio.get_event_loop()
+        text, is_changed = loop.run_until_complete(
+            command_transform.transform_document(
+                self._module,
+                ' New text. ',
+                previous=previous))
+
+        self.assertEqual(text, 'New text.' + self._snapshot.digest[:4])
+        self.assertIsNone(is_changed)
+
+    def test_legacy_interface(self):
+        """
+        Test that a transform without "previous" is called as before.
+
+        """
+        self._module.transform = lambda doc_text: (doc_text, False)
+        previous = command_transform.PreviousSnapshot(self._snapshot)
+
+        loop = asyncio.get_event_loop()
+        text, is_changed = loop.run_until_complete(
+            command_transform.transform_document(
+                self._module,
+                'New text.',
+                previous=previous))
+
+        self.assertEqual(text, 'New text.')
+        self.assertFalse(is_changed)
+
+    def test_previous_digest_from_text(self):
+        """
+        Test that a snapshot saved without a digest has one computed from text.
+
+        """
+        self._snapshot.digest = None
+        previous = command_transform.PreviousSnapshot(self._snapshot)
+
+        self.assertEqual(previous.digest, command_utils.get_digest('Old text.'))
+
+
+class TestTransformBatcher(django.test.SimpleTestCase):
+
+    def setUp(self):
+        """
+        Create a fake plugin module that records the size of each batch.
+
+        """
+        self._batch_sizes = []
+        def transform_many(batch):
+            self._batch_sizes.append(len(batch))
+            return [item.doc_text.upper() for item in batch]
+
+        self._module = types.ModuleType('fake.module')
+        self._module.transform = unittest.mock.Mock()
+        self._module.transform_many = transform_many
+
+    def _transform_all(self, batcher, doc_texts):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(
+            asyncio.gather(*[
+                command_transform.transform_document(
+                    self._module,
+                    doc_text,
+                    batcher=batcher)
+                for doc_text in doc_texts]))
+
+    def test_batches(self):
+        """
+        Test that documents are batched and each job receives its own result.
+
+        """
+        batcher = command_transform.TransformBatcher(2, 0.01)
+
+        results = self._transform_all(batcher, ['a', 'b', 'c'])
+
+        self.assertEqual(results, [('A', None), ('B', None), ('C', None)])
+        self.assertEqual(sorted(self._batch_sizes), [1, 2])
+        self.assertFalse(self._module.transform.called)
+
+    def test_batch_exception(self):
+        """
+        Test that an exception in transform_many() is raised in every job.
+
+        """
+        self._module.transform_many = unittest.mock.Mock(
+            side_effect=ValueError)
+        batcher = command_transform.TransformBatcher(2, 0.01)
+
+        self.assertRaises(ValueError, self._transform_all, batcher, ['a', 'b'])
+
+    def test_batch_interrupted(self):
+        """
+        Test that the jobs of an interrupted batch are cancelled rather than
+        left waiting.
+
+        """
+        self._module.transform_many = unittest.mock.Mock(
+            side_effect=asyncio.CancelledError)
+        batcher = command_transform.TransformBatcher(2, 0.01)
+
+        self.assertRaises(
+            asyncio.CancelledError,
+            self._transform_all,
+            batcher,
+            ['a', 'b'])
+
+    def test_no_batcher(self):
+        """
+        Test that transform() is used when no batcher is passed.
+
+        """
+        self._module.transform = lambda doc_text: doc_text.lower()
+
+        results = self._transform_all(None, ['A'])
+
+        self.assertEqual(results, [('a', None)])
+        self.assertEqual(self._batch_sizes, [])
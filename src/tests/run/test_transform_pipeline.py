@@ -0,0 +1,108 @@
+"""
+Tests transform pipelines and the caching of their stages' outputs.
+
+"""
+
+import asyncio
+import datetime
+import types
+import unittest.mock
+
+import django.test
+import django.utils.timezone
+
+import django_docsnaps.management.commands._transform as command_transform
+import django_docsnaps.models
+
+
+class TestTransformPipeline(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Create two fake plugin modules that count their calls.
+
+        """
+        self._normalize = types.ModuleType('fake.normalize')
+        self._normalize.transform = unittest.mock.Mock(
+            side_effect=lambda doc_text: (' '.join(doc_text.split()), True))
+        self._upper = types.ModuleType('fake.upper')
+        self._upper.transform = unittest.mock.Mock(
+            side_effect=lambda doc_text: doc_text.upper())
+        self._stages = [(self._normalize, '1'), (self._upper, '1')]
+
+    def _transform(self, doc_text, stage_cache):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(
+            command_transform.transform_pipeline(
+                self._stages,
+                doc_text,
+                stage_cache=stage_cache))
+
+    def test_downstream_cache_hit(self):
+        """
+        Test that an unchanged upstream output skips downstream stages.
+
+        The second document differs only in whitespace which the first stage
+        removes. A new run's cache must be served from the database.
+
+        """
+        self._transform('Terms  of use.', command_transform.StageCache())
+        text, is_changed = self._transform(
+            'Terms of   use.',
+            command_transform.StageCache())
+
+        self.assertEqual(text, 'TERMS OF USE.')
+        self.assertEqual(self._normalize.transform.call_count, 2)
+        self.assertEqual(self._upper.transform.call_count, 1)
+        self.assertEqual(
+            django_docsnaps.models.TransformResult.objects.count(),
+            3)
+
+    def test_prune(self):
+        """
+        Test that only the outputs unused for longer than the TTL are pruned
+        and that using an output keeps it.
+
+        """
+        self._transform('Terms of use.', command_transform.StageCache())
+        self._transform('Privacy policy.', command_transform.StageCache())
+        expired = django.utils.timezone.now() - datetime.timedelta(days=8)
+        django_docsnaps.models.TransformResult.objects.update(
+            updated_timestamp=expired)
+        self._transform('Terms of use.', command_transform.StageCache())
+
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_STAGE_CACHE_TTL',
+            7 * 24 * 60 * 60):
+            deleted_count = command_transform.StageCache().prune()
+
+        self.assertEqual(deleted_count, 2)
+        self.assertEqual(
+            django_docsnaps.models.TransformResult.objects.count(),
+            2)
+
+    def test_pipeline_order(self):
+        """
+        Test that stages run in order, each receiving the previous output.
+
+        """
+        text, is_changed = self._transform('Terms  of use.', None)
+
+        self.assertEqual(text, 'TERMS OF USE.')
+        self.assertTrue(is_changed)
+        self.assertFalse(
+            django_docsnaps.models.TransformResult.objects.exists())
+
+    def test_uncacheable_stage(self):
+        """
+        Test that a stage declaring "previous" is never cached.
+
+        """
+        self._upper.transform = unittest.mock.Mock(
+            side_effect=lambda doc_text, previous=None: doc_text.upper())
+        self._upper.transform_cacheable = False
+
+        self._transform('Terms of use.', command_transform.StageCache())
+        self._transform('Terms of use.', command_transform.StageCache())
+
+        self.assertEqual(self._upper.transform.call_count, 2)
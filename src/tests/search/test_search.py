@@ -0,0 +1,103 @@
+"""
+Tests the full-text search of snapshot texts.
+
+A TransactionTestCase is used since MySQL commits DDL statements implicitly and
+InnoDB only indexes committed rows.
+
+"""
+
+import io
+
+import django.core.management.base
+import django.test
+
+from django_docsnaps.management.commands._search import Command
+import django_docsnaps.models
+import django_docsnaps.search
+
+
+@django.test.skipUnlessDBFeature('supports_transactions')
+class TestSearch(django.test.TransactionTestCase):
+
+    def setUp(self):
+        """
+        Create the index and insert a job with three snapshots, only two of
+        which contain the clause.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+        try:
+            self._command.handle(create_index=True)
+        except django.core.management.base.CommandError as exception:
+            self.skipTest(str(exception))
+
+        language = django_docsnaps.models.Language.objects.create(
+            name='English',
+            code_iso_639_1='en')
+        document = django_docsnaps.models.Document.objects.create(
+            module='fake.module',
+            name='Terms of Use')
+        self._job = django_docsnaps.models.DocumentsLanguages.objects.create(
+            document_id=document,
+            language_id=language,
+            url='https://example.com/')
+        texts = [
+            'Disputes are resolved in court.',
+            'Disputes are resolved by binding arbitration.',
+            'Disputes are resolved by binding arbitration. Arbitration is '
+                'final and binding arbitration awards are enforced.']
+        self._snapshots = [
+            django_docsnaps.models.Snapshot.objects.create(
+                documents_languages_id=self._job,
+                text=text)
+            for text in texts]
+
+    def tearDown(self):
+        self._command.handle(drop_index=True)
+
+    def test_command(self):
+        """
+        Test that the command lists the matching snapshots.
+
+        """
+        self._command.handle(
+            query='binding arbitration',
+            phrase=True,
+            limit=10)
+
+        self.assertIn(
+            'snapshot {!s}\t'.format(self._snapshots[1].snapshot_id),
+            self._command.stdout.getvalue())
+
+    def test_new_snapshots_indexed(self):
+        """
+        Test that snapshots saved after the index was created are found.
+
+        """
+        snapshot = django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=self._job,
+            text='Class actions are waived.')
+
+        results = django_docsnaps.search.search('class actions waived')
+
+        self.assertEqual(
+            [result.snapshot_id for result in results],
+            [snapshot.snapshot_id])
+
+    def test_phrase(self):
+        """
+        Test that a phrase matches only snapshots containing it, most
+        relevant first.
+
+        """
+        results = django_docsnaps.search.search(
+            'binding arbitration',
+            phrase=True)
+
+        self.assertEqual(
+            {result.snapshot_id for result in results},
+            {self._snapshots[1].snapshot_id, self._snapshots[2].snapshot_id})
+        self.assertGreaterEqual(results[0].rank, results[1].rank)
+        self.assertEqual(
+            {result.documents_languages_id for result in results},
+            {self._job.documents_languages_id})
@@ -0,0 +1,142 @@
+"""
+Tests that a job whose database calls all hang or fail spools its snapshot.
+
+"""
+
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import types
+import unittest.mock
+
+import django.db
+import django.test
+
+from django_docsnaps.management.commands._run import Command
+from django_docsnaps.management.commands._run import DocumentResponse
+import django_docsnaps.fingerprints
+import django_docsnaps.management.commands._database as command_database
+import django_docsnaps.management.commands._spool as command_spool
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+@unittest.mock.patch(
+    'django_docsnaps.settings.DJANGO_DOCSNAPS_SPOOL_WRITE_TIMEOUT',
+    0.05)
+class TestDatabaseOutage(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        Give the command a spool and a database executor with a single thread,
+        and mock the network and the plugin module.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+        spool_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_directory.cleanup)
+        self._spool_path = os.path.join(spool_directory.name, 'spool')
+        self._command._spool = command_spool.Spool(
+            self._spool_path,
+            sync_delay=0)
+        self._command._database = command_database.DatabaseExecutor(
+            max_workers=1)
+        self.addCleanup(self._command._database.close)
+
+        module = types.ModuleType('fake.module')
+        module.__version__ = '1.0.0'
+        module.transform = lambda text: (text, True)
+        self._command._import_job_module = unittest.mock.Mock(
+            return_value=module)
+
+        async def _mock_request_document(*args, **kwargs):
+            return DocumentResponse(body=b'New terms.', charset='utf-8')
+        self._command._request_document = _mock_request_document
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job with a previous snapshot.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+        django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=cls._job,
+            digest=command_utils.get_digest('Old terms.'),
+            simhash=django_docsnaps.fingerprints.simhash('Old terms.'),
+            text='Old terms.')
+
+    def _execute(self, call):
+        """
+        Execute the job with every database call of the executor replaced.
+
+        Returns:
+            list: The spooled records.
+
+        """
+        self._command._database._call = call
+        snapshot = django_docsnaps.models.Snapshot.objects\
+            .defer('text')\
+            .get()
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self._command._execute_single_job(
+                self._job,
+                unittest.mock.NonCallableMock(),
+                snapshot=snapshot))
+        loop.run_until_complete(self._command._spool.close())
+
+        with open(self._spool_path, 'rb') as spool_file:
+            records, trailing_length = command_spool.read_records(spool_file)
+
+        return records
+
+    def _assert_spooled(self, records):
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['text'], 'New terms.')
+        self.assertIsNone(records[0]['hunks'])
+        self.assertEqual(django_docsnaps.models.Snapshot.objects.count(), 1)
+        self.assertIsNone(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .get(pk=self._job.pk)\
+                .response_digest)
+        output = self._command.stdout.getvalue()
+        self.assertIn('diff summary', output)
+        self.assertIn('spooled', output)
+        self.assertIn('response digest', output)
+
+    def test_failing_database(self):
+        """
+        Test that the job spools its snapshot when every call raises.
+
+        """
+        def call(function, args, idempotent):
+            raise django.db.OperationalError('Connection lost.')
+
+        self._assert_spooled(self._execute(call))
+
+    def test_hanging_database(self):
+        """
+        Test that the job spools its snapshot when every call hangs and that
+        no call is made once the hanging call occupies the only thread.
+
+        """
+        event = threading.Event()
+        self.addCleanup(event.set)
+        calls = []
+        def call(function, args, idempotent):
+            calls.append(function)
+            event.wait()
+
+        self._assert_spooled(self._execute(call))
+        self.assertEqual(len(calls), 1)
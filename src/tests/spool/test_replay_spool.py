@@ -0,0 +1,125 @@
+"""
+Tests the spooling of snapshots and their replay into the database.
+
+"""
+
+import asyncio
+import io
+import os
+import tempfile
+
+import django.test
+import django.utils.timezone
+
+from django_docsnaps.management.commands._replay import Command
+import django_docsnaps.management.commands._spool as command_spool
+import django_docsnaps.management.commands._utils as command_utils
+import django_docsnaps.models
+from .. import utils as test_utils
+
+
+class TestReplaySpool(django.test.TestCase):
+
+    def setUp(self):
+        """
+        Capture stdout output to string buffer instead of allowing it to be
+        sent to actual terminal stdout.
+
+        """
+        self._command = Command(stdout=io.StringIO(), stderr=io.StringIO())
+
+        spool_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_directory.cleanup)
+        self._spool_path = os.path.join(spool_directory.name, 'spool')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a single job.
+
+        """
+        cls._job = test_utils.get_test_models()[0]
+        test_models = command_utils.flatten_model_graph(cls._job)
+        for model in reversed(list(test_models)):
+            model.save()
+
+    def _append(self, *records):
+        loop = asyncio.get_event_loop()
+        spool = command_spool.Spool(self._spool_path, sync_delay=0)
+        for record in records:
+            loop.run_until_complete(spool.append(record))
+        loop.run_until_complete(spool.close())
+
+    def _get_record(self, text, digest):
+        return {
+            'changed_ratio': None,
+            'datetime': django.utils.timezone.now().isoformat(),
+            'digest': digest,
+            'documents_languages_id': self._job.documents_languages_id,
+            'hunks': None,
+            'id': command_spool.create_record_id(),
+            'lines_added': None,
+            'lines_removed': None,
+            'simhash': None,
+            'text': text,
+            'type': 'snapshot',
+        }
+
+    def _replay(self):
+        self._command.handle(path=self._spool_path)
+
+    def test_committed(self):
+        """
+        Test that a snapshot whose write was committed late is skipped.
+
+        """
+        record = self._get_record('Terms\n', 'a' * 64)
+        self._append(record, {'type': 'committed', 'id': record['id']})
+        self._replay()
+
+        self.assertFalse(django_docsnaps.models.Snapshot.objects.exists())
+
+    def test_idempotent(self):
+        """
+        Test that replaying the same records again loads nothing.
+
+        """
+        records = [
+            self._get_record('Terms\n', 'a' * 64),
+            self._get_record('New terms\n', 'b' * 64)]
+        self._append(*records)
+        self._replay()
+        self._append(*records)
+        self._replay()
+
+        self.assertEqual(django_docsnaps.models.Snapshot.objects.count(), 2)
+
+    def test_replay(self):
+        """
+        Test that spooled snapshots are loaded at their spooled datetimes and
+        that the spool is emptied.
+
+        """
+        record = self._get_record('Terms\n', 'a' * 64)
+        self._append(record)
+        self._replay()
+
+        snapshot = django_docsnaps.models.Snapshot.objects.get()
+        self.assertEqual(snapshot.text, 'Terms\n')
+        self.assertEqual(snapshot.datetime.isoformat(), record['datetime'])
+        self.assertEqual(os.path.getsize(self._spool_path), 0)
+
+    def test_torn_record(self):
+        """
+        Test that a record torn by a crash is discarded and does not hide the
+        records appended after it.
+
+        """
+        self._append(self._get_record('Terms\n', 'a' * 64))
+        with open(self._spool_path, 'r+b') as spool_file:
+            spool_file.truncate(os.path.getsize(self._spool_path) - 1)
+        self._append(self._get_record('New terms\n', 'b' * 64))
+        self._replay()
+
+        snapshot = django_docsnaps.models.Snapshot.objects.get()
+        self.assertEqual(snapshot.text, 'New terms\n')
@@ -0,0 +1,196 @@
+"""
+Tests the admin's computed columns, bulk actions, and snapshot differences.
+
+"""
+
+import json
+import unittest.mock
+
+import django.contrib.admin
+import django.contrib.auth.models
+import django.http
+import django.test
+
+import django_docsnaps.admin
+import django_docsnaps.diff
+import django_docsnaps.models
+
+
+class TestDocumentsLanguagesAdmin(django.test.TestCase):
+
+    def setUp(self):
+        self._model_admin = django_docsnaps.admin.DocumentsLanguagesAdmin(
+            django_docsnaps.models.DocumentsLanguages,
+            django.contrib.admin.AdminSite())
+        self._model_admin.message_user = unittest.mock.Mock()
+        self._request = django.test.RequestFactory().get('/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert two jobs, the first with two snapshots.
+
+        """
+        language = django_docsnaps.models.Language.objects.create(
+            name='English',
+            code_iso_639_1='en')
+        cls._jobs = []
+        for name in ('Privacy Policy', 'Terms of Use'):
+            document = django_docsnaps.models.Document.objects.create(
+                module='fake.module',
+                name=name)
+            cls._jobs.append(
+                django_docsnaps.models.DocumentsLanguages.objects.create(
+                    document_id=document,
+                    language_id=language,
+                    url='https://example.com/'))
+        for text in ('Old text.', 'New text.'):
+            cls._latest_snapshot = \
+                django_docsnaps.models.Snapshot.objects.create(
+                    documents_languages_id=cls._jobs[0],
+                    text=text)
+
+    def test_annotations(self):
+        """
+        Test that snapshot counts and last changed datetimes are computed.
+
+        """
+        jobs = {
+            job.pk: job
+            for job in self._model_admin.get_queryset(self._request)}
+
+        self.assertEqual(jobs[self._jobs[0].pk].snapshot_count, 2)
+        self.assertEqual(
+            jobs[self._jobs[0].pk].last_changed,
+            self._latest_snapshot.datetime)
+        self.assertEqual(jobs[self._jobs[1].pk].snapshot_count, 0)
+        self.assertIsNone(jobs[self._jobs[1].pk].last_changed)
+
+    def test_disable_enable_jobs(self):
+        """
+        Test that the actions update every selected job in a single query.
+
+        """
+        queryset = self._model_admin.get_queryset(self._request)
+
+        with self.assertNumQueries(1):
+            self._model_admin.disable_jobs(self._request, queryset)
+        self.assertFalse(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .filter(is_enabled=True)\
+                .exists())
+
+        with self.assertNumQueries(1):
+            self._model_admin.enable_jobs(self._request, queryset)
+        self.assertFalse(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .filter(is_enabled=False)\
+                .exists())
+
+
+class TestSnapshotAdmin(django.test.TestCase):
+
+    def setUp(self):
+        self._model_admin = django_docsnaps.admin.SnapshotAdmin(
+            django_docsnaps.models.Snapshot,
+            django.contrib.admin.AdminSite())
+        self._model_admin.diff_cache = unittest.mock.Mock()
+        self._model_admin.diff_cache.get.return_value = None
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a job with three snapshots, each with its stored hunks.
+
+        """
+        cls._user = django.contrib.auth.models.User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'password')
+        language = django_docsnaps.models.Language.objects.create(
+            name='English',
+            code_iso_639_1='en')
+        document = django_docsnaps.models.Document.objects.create(
+            module='fake.module',
+            name='Terms of Use')
+        job = django_docsnaps.models.DocumentsLanguages.objects.create(
+            document_id=document,
+            language_id=language,
+            url='https://example.com/')
+        cls._snapshots = []
+        previous_text = None
+        for text in ('Terms\nOld\n', 'Terms\nNew\n', 'Terms\nNewer\n'):
+            hunks = None
+            if previous_text is not None:
+                hunks = json.dumps(
+                    django_docsnaps.diff.summarize(previous_text, text).hunks)
+            cls._snapshots.append(
+                django_docsnaps.models.Snapshot.objects.create(
+                    documents_languages_id=job,
+                    hunks=hunks,
+                    text=text))
+            previous_text = text
+
+    def _get_diff_rows(self, **query):
+        request = django.test.RequestFactory().get('/', query)
+        request.user = self._user
+        response = self._model_admin.diff_view(
+            request,
+            self._snapshots[2].snapshot_id)
+        return response.context_data['rows']
+
+    def test_against(self):
+        """
+        Test that the differences from an explicit snapshot are computed and
+        that a non-integer snapshot ID is not found.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.diff.diff_lines',
+            wraps=django_docsnaps.diff.diff_lines) as diff_lines_mock:
+            rows = self._get_diff_rows(
+                against=self._snapshots[0].snapshot_id)
+
+        self.assertTrue(diff_lines_mock.called)
+        self.assertIn(('replace', 2, 'Old', 2, 'Newer'), rows)
+        with self.assertRaises(django.http.Http404):
+            self._get_diff_rows(against='1x')
+
+    def test_job_filter(self):
+        """
+        Test that snapshots are filtered by a typed job ID without a query of
+        the jobs or documents and that an invalid ID is ignored.
+
+        The single query is the paginator's bounded count.
+
+        """
+        request = django.test.RequestFactory().get(
+            '/',
+            {'job': self._snapshots[0].documents_languages_id_id})
+        request.user = self._user
+        with self.assertNumQueries(1):
+            changelist = self._model_admin.get_changelist_instance(request)
+        self.assertEqual(changelist.get_queryset(request).count(), 3)
+
+        request = django.test.RequestFactory().get('/', {'job': '0'})
+        request.user = self._user
+        changelist = self._model_admin.get_changelist_instance(request)
+        self.assertEqual(changelist.get_queryset(request).count(), 0)
+
+        request = django.test.RequestFactory().get('/', {'job': 'x'})
+        request.user = self._user
+        changelist = self._model_admin.get_changelist_instance(request)
+        self.assertEqual(changelist.get_queryset(request).count(), 3)
+
+    def test_stored_hunks(self):
+        """
+        Test that the differences from the previous snapshot are built from
+        the stored hunks.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.diff.diff_lines') as diff_lines_mock:
+            rows = self._get_diff_rows()
+
+        self.assertFalse(diff_lines_mock.called)
+        self.assertIn(('replace', 2, 'New', 2, 'Newer'), rows)
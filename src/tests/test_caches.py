@@ -0,0 +1,55 @@
+"""
+Tests for the in-process LRU cache.
+
+"""
+
+import unittest.mock
+
+import django.test
+
+import django_docsnaps.caches
+
+
+class TestLRUCache(django.test.SimpleTestCase):
+
+    def test_cost_eviction(self):
+        """
+        Test that entries are evicted when their total cost is too high.
+
+        """
+        cache = django_docsnaps.caches.LRUCache(max_cost=10, get_cost=len)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        cache.set('c', 'cccc')
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 'bbbb')
+        self.assertEqual(cache.get('c'), 'cccc')
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently used entry is evicted first.
+
+        """
+        cache = django_docsnaps.caches.LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_timeout(self):
+        """
+        Test that entries expire.
+
+        """
+        cache = django_docsnaps.caches.LRUCache(timeout=10)
+        with unittest.mock.patch('time.monotonic', return_value=100):
+            cache.set('a', 1)
+            cache.set('b', 2, timeout=None)
+        with unittest.mock.patch('time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
@@ -3,12 +3,65 @@ Tests for the utility module in the management command package.
 
 """
 
+import asyncio
+import datetime
+
 import django.test
 
 import django_docsnaps.management.commands._utils as command_utils
 from . import utils as test_utils
 
 
+class TestFreshnessLifetime(django.test.SimpleTestCase):
+    """
+    Test the freshness lifetime declared by response headers.
+
+    """
+
+    _now = datetime.datetime(2017, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+    def _get_lifetime(self, headers):
+        return command_utils.get_freshness_lifetime(headers, now=self._now)
+
+    def test_expires(self):
+        """
+        Test that Expires is relative to Date and that an invalid Expires is
+        already stale.
+
+        """
+        headers = {
+            'Date': 'Sun, 01 Jan 2017 12:00:00 GMT',
+            'Expires': 'Sun, 01 Jan 2017 13:00:00 GMT'}
+
+        self.assertEqual(self._get_lifetime(headers), 3600)
+        self.assertEqual(self._get_lifetime({'Expires': '0'}), 0)
+
+    def test_max_age(self):
+        """
+        Test that s-maxage takes precedence over max-age, which takes
+        precedence over Expires, and that Age is subtracted.
+
+        """
+        headers = {
+            'Cache-Control': 'public, max-age=600, s-maxage=300',
+            'Expires': 'Sun, 01 Jan 2017 13:00:00 GMT'}
+        self.assertEqual(self._get_lifetime(headers), 300)
+
+        headers = {'Cache-Control': 'max-age="600"', 'Age': '100'}
+        self.assertEqual(self._get_lifetime(headers), 500)
+
+    def test_no_freshness(self):
+        """
+        Test that responses without explicit freshness or that must not be
+        reused are not fresh.
+
+        """
+        self.assertIsNone(self._get_lifetime({}))
+        self.assertEqual(
+            self._get_lifetime({'Cache-Control': 'no-cache, max-age=600'}),
+            0)
+
+
 class TestModelRelationFlattening(django.test.SimpleTestCase):
     """
     Test the model relationship graph flattener.
@@ -30,3 +83,51 @@ class TestModelRelationFlattening(django.test.SimpleTestCase):
 
         # List equality also compares order.
         self.assertEqual(flattened, expected)
+
+
+class TestRequestLimiter(django.test.SimpleTestCase):
+    """
+    Test the limiting of concurrent requests.
+
+    """
+
+    def _run_requests(self, request_limiter, urls):
+        """
+        Run a fake request for each URL and return the peak concurrency.
+
+        """
+        concurrency = {'current': 0, 'peak': 0}
+        async def _fake_request(url):
+            async with request_limiter.limit(url):
+                concurrency['current'] += 1
+                concurrency['peak'] = max(
+                    concurrency['peak'],
+                    concurrency['current'])
+                await asyncio.sleep(0.01)
+                concurrency['current'] -= 1
+
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            asyncio.gather(*[_fake_request(url) for url in urls]))
+
+        return concurrency['peak']
+
+    def test_global_limit(self):
+        """
+        Test that total concurrency never exceeds the global limit.
+
+        """
+        request_limiter = command_utils.RequestLimiter(max_requests=2)
+        urls = ['http://host{!s}.test/'.format(i) for i in range(6)]
+
+        self.assertEqual(self._run_requests(request_limiter, urls), 2)
+
+    def test_host_limit(self):
+        """
+        Test that concurrency to one host never exceeds the per-host limit.
+
+        """
+        request_limiter = command_utils.RequestLimiter(max_host_requests=1)
+        urls = ['http://host.test/page{!s}'.format(i) for i in range(4)]
+
+        self.assertEqual(self._run_requests(request_limiter, urls), 1)
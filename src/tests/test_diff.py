@@ -0,0 +1,80 @@
+"""
+Tests for the line-level snapshot differences.
+
+"""
+
+import django.test
+
+import django_docsnaps.diff
+
+
+class TestDiffLines(django.test.SimpleTestCase):
+
+    def test_minimal_hunks(self):
+        """
+        Test that a minimal set of hunks is found.
+
+        """
+        old_lines = ['a', 'b', 'c', 'd', 'e', 'f']
+        new_lines = ['a', 'x', 'c', 'd', 'f', 'g']
+
+        self.assertEqual(
+            django_docsnaps.diff.diff_lines(old_lines, new_lines),
+            [(1, 1, 1, 1), (4, 1, 4, 0), (6, 0, 5, 1)])
+
+    def test_time_limit(self):
+        """
+        Test that the whole changed region is one hunk when out of time.
+
+        """
+        old_lines = ['a', 'b', 'c', 'd']
+        new_lines = ['a', 'c', 'b', 'd']
+
+        self.assertEqual(
+            django_docsnaps.diff.diff_lines(
+                old_lines,
+                new_lines,
+                time_limit=-1),
+            [(1, 2, 1, 2)])
+
+
+class TestGetContextRows(django.test.SimpleTestCase):
+
+    def test_context(self):
+        """
+        Test that distant unchanged lines are skipped.
+
+        """
+        old_lines = ['a', 'b', 'c', 'd', 'e', 'f']
+        new_lines = ['a', 'b', 'c', 'd', 'x', 'f']
+        hunks = django_docsnaps.diff.diff_lines(old_lines, new_lines)
+        rows = django_docsnaps.diff.get_context_rows(
+            old_lines,
+            new_lines,
+            hunks,
+            context=1)
+
+        self.assertEqual(
+            [tuple(row) for row in rows],
+            [
+                ('skip', None, None, None, None),
+                ('equal', 4, 'd', 4, 'd'),
+                ('replace', 5, 'e', 5, 'x'),
+                ('equal', 6, 'f', 6, 'f')])
+
+
+class TestSummarize(django.test.SimpleTestCase):
+
+    def test_summary(self):
+        """
+        Test the counts and changed byte ratio.
+
+        """
+        summary = django_docsnaps.diff.summarize(
+            'Terms\nOld clause\nEnd\n',
+            'Terms\nNew clause\nAdded\nEnd\n')
+
+        self.assertEqual(summary.lines_added, 2)
+        self.assertEqual(summary.lines_removed, 1)
+        self.assertEqual(summary.hunks, [(1, 1, 1, 2)])
+        self.assertAlmostEqual(summary.changed_ratio, 28 / 48)
@@ -0,0 +1,58 @@
+"""
+Tests for the snapshot similarity fingerprints.
+
+"""
+
+import django.test
+
+import django_docsnaps.fingerprints as fingerprints
+
+
+class TestSimhash(django.test.SimpleTestCase):
+
+    def test_different_text(self):
+        """
+        Test that unrelated texts have distant fingerprints.
+
+        """
+        distance = fingerprints.hamming_distance(
+            fingerprints.simhash('The quick brown fox jumps over the dog.'),
+            fingerprints.simhash('Privacy policy effective as of last year.'))
+
+        self.assertGreater(distance, 10)
+
+    def test_chunked_text(self):
+        """
+        Test that a text fingerprinted in chunks, split within words, has the
+        same fingerprint as the whole text.
+
+        """
+        text = 'The quick brown fox jumps over the lazy dog.\n' * 3
+        for chunk_size in (1, 4, 7):
+            simhasher = fingerprints.SimHasher()
+            for start in range(0, len(text), chunk_size):
+                simhasher.update(text[start:start + chunk_size])
+            self.assertEqual(
+                simhasher.get_fingerprint(),
+                fingerprints.simhash(text))
+
+    def test_reflowed_text(self):
+        """
+        Test that whitespace and case do not change the fingerprint.
+
+        """
+        self.assertEqual(
+            fingerprints.simhash('The quick brown\nfox jumps  over the dog.'),
+            fingerprints.simhash('the quick brown fox jumps over the dog.'))
+
+    def test_signed_range(self):
+        """
+        Test that fingerprints fit in a signed 64-bit integer column.
+
+        """
+        for text in ('', 'a', 'Terms of use.', 'Privacy policy.'):
+            fingerprint = fingerprints.simhash(text)
+            self.assertGreaterEqual(fingerprint, -2 ** 63)
+            self.assertLess(fingerprint, 2 ** 63)
+        self.assertEqual(fingerprints.to_signed(2 ** 64 - 1), -1)
+        self.assertEqual(fingerprints.hamming_distance(-1, 0), 64)
@@ -0,0 +1,153 @@
+"""
+Tests for the built-in HTML content-extraction transform.
+
+"""
+
+import asyncio
+import unittest
+import unittest.mock
+
+import django.core.exceptions
+import django.test
+
+import django_docsnaps.transforms.html_content as html_content
+
+
+_DOCUMENT = '''<!DOCTYPE html>
+<html>
+<head><title>Ignored title</title><style>p { color: red; }</style></head>
+<body>
+    <nav><a href="/">Home</a></nav>
+    <div id="content">
+        <p>Fallback    content.</p>
+    </div>
+    <main class="terms">
+        <h1>Terms of
+            Service</h1>
+        <p>First <b>paragraph</b>.<br>Second line.</p>
+        <script>var ignored = "<p>script</p>";</script>
+        <img src="logo.png"><p>Last &amp; final paragraph.</p>
+    </main>
+    <footer>Copyright</footer>
+</body>
+</html>
+'''
+
+_EXPECTED = (
+    'Terms of Service\n'
+    'First paragraph.\n'
+    'Second line.\n'
+    'Last & final paragraph.')
+
+
+class TestHtmlContentTransform(django.test.SimpleTestCase):
+    """
+    Test content extraction with each parser backend.
+
+    """
+
+    parser = 'html.parser'
+
+    def setUp(self):
+        patcher = unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_PARSER',
+            self.parser)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _transform_stream(self, doc_text, chunk_size):
+        async def chunks():
+            for index in range(0, len(doc_text), chunk_size):
+                yield doc_text[index:index + chunk_size]
+
+        async def collect():
+            stream = html_content.transform_stream(chunks())
+            return [chunk async for chunk in stream]
+
+        return ''.join(
+            asyncio.get_event_loop().run_until_complete(collect()))
+
+    def test_fallback_selector(self):
+        """
+        Test that a less preferred selector is used if no other matches.
+
+        """
+        doc_text = _DOCUMENT.replace('<main class="terms">', '<div>')\
+            .replace('</main>', '</div>')
+        self.assertEqual(
+            html_content.transform(doc_text), 'Fallback content.')
+
+    def test_no_selector_matches(self):
+        """
+        Test that the whole document's text is returned if nothing matches.
+
+        """
+        doc_text = '<html><body><p>One</p><p>Two</p></body></html>'
+        self.assertEqual(html_content.transform(doc_text), 'One\nTwo')
+
+    def test_preferred_selector(self):
+        """
+        Test that the most preferred selector is used and that hidden text
+        and whitespace differences are removed.
+
+        """
+        self.assertEqual(html_content.transform(_DOCUMENT), _EXPECTED)
+
+    def test_stream_matches_transform(self):
+        """
+        Test that streamed output is independent of chunk boundaries.
+
+        """
+        for chunk_size in (1, 7, 4096):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    self._transform_stream(_DOCUMENT, chunk_size), _EXPECTED)
+
+
+@unittest.skipIf(html_content.lxml is None, 'lxml is not installed.')
+class TestLxmlHtmlContentTransform(TestHtmlContentTransform):
+    """
+    Run the content extraction tests using the lxml parser backend.
+
+    """
+
+    parser = 'lxml'
+
+
+class TestSelector(django.test.SimpleTestCase):
+    """
+    Test the parsing and matching of simple CSS selectors.
+
+    """
+
+    def test_matches(self):
+        """
+        Test matching of compound selectors.
+
+        """
+        selector = html_content.Selector('div#content.legal[role=main]')
+        self.assertTrue(selector.matches(
+            'div', {'id': 'content', 'class': 'page legal', 'role': 'main'}))
+        self.assertFalse(selector.matches(
+            'div', {'id': 'content', 'class': 'page', 'role': 'main'}))
+        self.assertFalse(selector.matches(
+            'section', {'id': 'content', 'class': 'legal', 'role': 'main'}))
+
+    def test_unsupported_selector(self):
+        """
+        Test that combinators raise an error.
+
+        """
+        with self.assertRaises(ValueError):
+            html_content.Selector('main > article')
+
+    def test_unknown_parser(self):
+        """
+        Test that an unknown parser backend is reported as misconfiguration.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_HTML_PARSER', 'unknown'):
+            with self.assertRaises(
+                django.core.exceptions.ImproperlyConfigured):
+                html_content.transform(_DOCUMENT)
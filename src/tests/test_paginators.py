@@ -0,0 +1,67 @@
+"""
+Tests for the estimated count paginator.
+
+"""
+
+import unittest.mock
+
+import django.test
+
+import django_docsnaps.models
+import django_docsnaps.paginators
+
+
+class TestEstimatedCountPaginator(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert three languages.
+
+        """
+        for code in ('de', 'en', 'fr'):
+            django_docsnaps.models.Language.objects.create(
+                name=code,
+                code_iso_639_1=code)
+
+    def _get_paginator(self, queryset):
+        paginator = django_docsnaps.paginators.EstimatedCountPaginator(
+            queryset.order_by('pk'),
+            1)
+        paginator.exact_count_threshold = 10
+        paginator.max_count = 2
+        return paginator
+
+    def test_estimate(self):
+        """
+        Test that a large unfiltered table is counted by its estimate.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.paginators.get_estimated_count',
+            return_value=1000):
+            paginator = self._get_paginator(
+                django_docsnaps.models.Language.objects.all())
+            self.assertEqual(paginator.count, 1000)
+
+    def test_filtered_count_limit(self):
+        """
+        Test that filtered querysets are counted up to the limit.
+
+        """
+        paginator = self._get_paginator(
+            django_docsnaps.models.Language.objects.exclude(name='xx'))
+
+        self.assertEqual(paginator.count, 2)
+
+    def test_small_table(self):
+        """
+        Test that a small table is counted exactly.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.paginators.get_estimated_count',
+            return_value=3):
+            paginator = self._get_paginator(
+                django_docsnaps.models.Language.objects.all())
+            self.assertEqual(paginator.count, 3)
@@ -0,0 +1,93 @@
+"""
+Tests the routing of the app's models to the primary and replica databases.
+
+"""
+
+import unittest.mock
+
+import django.contrib.auth.models
+import django.test
+
+import django_docsnaps.models
+import django_docsnaps.routers
+
+
+@unittest.mock.patch(
+    'django_docsnaps.settings.DJANGO_DOCSNAPS_REPLICAS',
+    ('replica',))
+@unittest.mock.patch(
+    'django_docsnaps.settings.DJANGO_DOCSNAPS_DATABASE',
+    None)
+class TestRouter(django.test.SimpleTestCase):
+
+    def setUp(self):
+        self._router = django_docsnaps.routers.Router()
+
+    def test_allow_migrate(self):
+        """
+        Test that the app's tables are only created on the primary, which
+        holds no other app's tables.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_DATABASE',
+            'docsnaps'):
+            self.assertTrue(
+                self._router.allow_migrate('docsnaps', 'django_docsnaps'))
+            self.assertFalse(
+                self._router.allow_migrate('replica', 'django_docsnaps'))
+            self.assertFalse(
+                self._router.allow_migrate('default', 'django_docsnaps'))
+            self.assertFalse(self._router.allow_migrate('docsnaps', 'auth'))
+            self.assertIsNone(self._router.allow_migrate('default', 'auth'))
+
+    def test_other_apps(self):
+        """
+        Test that other apps' models are not routed.
+
+        """
+        model = django.contrib.auth.models.Permission
+
+        self.assertIsNone(self._router.db_for_read(model))
+        self.assertIsNone(self._router.db_for_write(model))
+
+    def test_read(self):
+        """
+        Test that reads go to a replica except inside use_primary().
+
+        """
+        model = django_docsnaps.models.Snapshot
+
+        self.assertEqual(self._router.db_for_read(model), 'replica')
+        with django_docsnaps.routers.use_primary():
+            with django_docsnaps.routers.use_primary():
+                self.assertEqual(self._router.db_for_read(model), 'default')
+            self.assertEqual(self._router.db_for_read(model), 'default')
+        self.assertEqual(self._router.db_for_read(model), 'replica')
+
+    def test_read_without_replicas(self):
+        """
+        Test that reads go to the primary when no replicas are configured.
+
+        """
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_REPLICAS',
+            ()):
+            self.assertEqual(
+                self._router.db_for_read(django_docsnaps.models.Snapshot),
+                'default')
+
+    def test_write(self):
+        """
+        Test that writes go to the primary, even of an instance read from a
+        replica.
+
+        """
+        snapshot = django_docsnaps.models.Snapshot()
+        snapshot._state.db = 'replica'
+
+        self.assertEqual(
+            self._router.db_for_write(
+                django_docsnaps.models.Snapshot,
+                instance=snapshot),
+            'default')
@@ -0,0 +1,307 @@
+"""
+Tests the JSON API of latest snapshots, history, and change hints.
+
+"""
+
+import datetime
+import json
+import unittest.mock
+
+import django.http
+import django.test
+
+import django_docsnaps.models
+import django_docsnaps.views
+
+
+class TestLatestSnapshotViews(django.test.TestCase):
+
+    def setUp(self):
+        django_docsnaps.views.snapshot_cache.clear()
+        self._request_factory = django.test.RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a document in two languages, each with a snapshot.
+
+        """
+        document = django_docsnaps.models.Document.objects.create(
+            module='fake.module',
+            name='Terms of Use')
+        cls._jobs = []
+        for name, code in (('English', 'en'), ('German', 'de')):
+            language = django_docsnaps.models.Language.objects.create(
+                name=name,
+                code_iso_639_1=code)
+            job = django_docsnaps.models.DocumentsLanguages.objects.create(
+                document_id=document,
+                language_id=language,
+                url='https://example.com/' + code)
+            django_docsnaps.models.Snapshot.objects.create(
+                documents_languages_id=job,
+                text=name + ' text.',
+                digest=code * 32)
+            cls._jobs.append(job)
+
+    def _get_job_snapshot(self, job, **headers):
+        return django_docsnaps.views.job_latest_snapshot(
+            self._request_factory.get('/', **headers),
+            job.documents_languages_id)
+
+    def test_cache_invalidation(self):
+        """
+        Test that responses are cached until a new snapshot is saved.
+
+        """
+        self._get_job_snapshot(self._jobs[0])
+        with self.assertNumQueries(0):
+            self._get_job_snapshot(self._jobs[0])
+
+        snapshot = django_docsnaps.models.Snapshot.objects.create(
+            documents_languages_id=self._jobs[0],
+            text='New text.',
+            digest='f' * 64)
+        django_docsnaps.views.invalidate_latest_snapshot(self._jobs[0])
+        response = self._get_job_snapshot(self._jobs[0])
+
+        self.assertEqual(
+            json.loads(response.content.decode())['snapshot_id'],
+            snapshot.snapshot_id)
+
+    def test_document_latest_snapshots(self):
+        """
+        Test that the latest snapshot of each of the document's jobs is
+        returned.
+
+        """
+        response = django_docsnaps.views.document_latest_snapshots(
+            self._request_factory.get('/'),
+            self._jobs[0].document_id_id)
+
+        snapshots = json.loads(response.content.decode())['snapshots']
+        self.assertEqual(
+            [snapshot['language'] for snapshot in snapshots],
+            ['en', 'de'])
+
+    def test_not_found(self):
+        """
+        Test that a job without snapshots is not found.
+
+        """
+        with self.assertRaises(django.http.Http404):
+            django_docsnaps.views.job_latest_snapshot(
+                self._request_factory.get('/'),
+                0)
+
+    def test_not_modified(self):
+        """
+        Test that a matching ETag receives a 304 response.
+
+        """
+        response = self._get_job_snapshot(self._jobs[0])
+        self.assertEqual(response.status_code, 200)
+
+        response = self._get_job_snapshot(
+            self._jobs[0],
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_text(self):
+        """
+        Test that the text is included only when requested.
+
+        """
+        response = self._get_job_snapshot(self._jobs[0])
+        self.assertNotIn('text', json.loads(response.content.decode()))
+
+        text_response = django_docsnaps.views.job_latest_snapshot(
+            self._request_factory.get('/', {'text': ''}),
+            self._jobs[0].documents_languages_id)
+        self.assertEqual(
+            json.loads(text_response.content.decode())['text'],
+            'English text.')
+        self.assertNotEqual(text_response['ETag'], response['ETag'])
+
+
+class TestSnapshotHistoryView(django.test.TestCase):
+
+    def setUp(self):
+        self._request_factory = django.test.RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert a job with five snapshots, a day apart.
+
+        """
+        language = django_docsnaps.models.Language.objects.create(
+            name='English',
+            code_iso_639_1='en')
+        document = django_docsnaps.models.Document.objects.create(
+            module='fake.module',
+            name='Terms of Use')
+        cls._job = django_docsnaps.models.DocumentsLanguages.objects.create(
+            document_id=document,
+            language_id=language,
+            url='https://example.com/')
+        cls._snapshot_ids = []
+        for day in range(1, 6):
+            snapshot = django_docsnaps.models.Snapshot.objects.create(
+                documents_languages_id=cls._job,
+                text='Day {!s}.'.format(day))
+            django_docsnaps.models.Snapshot.objects\
+                .filter(pk=snapshot.pk)\
+                .update(datetime=datetime.datetime(2017, 1, day))
+            cls._snapshot_ids.append(snapshot.snapshot_id)
+
+    def _get_page(self, **params):
+        response = django_docsnaps.views.job_snapshot_history(
+            self._request_factory.get('/', params),
+            self._job.documents_languages_id)
+        return response.status_code, json.loads(response.content.decode())
+
+    def test_invalid_cursor(self):
+        """
+        Test that an invalid cursor is rejected.
+
+        """
+        status_code, page = self._get_page(cursor='invalid')
+
+        self.assertEqual(status_code, 400)
+
+    def test_pages(self):
+        """
+        Test that pages cover the history, newest first, without repetition.
+
+        """
+        snapshot_ids = []
+        params = {'size': 2}
+        while True:
+            status_code, page = self._get_page(**params)
+            self.assertEqual(status_code, 200)
+            self.assertNotIn('text', page['snapshots'][0])
+            snapshot_ids.extend(
+                snapshot['snapshot_id'] for snapshot in page['snapshots'])
+            if page['next'] is None:
+                break
+            params['cursor'] = page['next']
+
+        self.assertEqual(snapshot_ids, list(reversed(self._snapshot_ids)))
+
+    def test_text(self):
+        """
+        Test that texts are included when requested.
+
+        """
+        status_code, page = self._get_page(size=1, text='')
+
+        self.assertEqual(page['snapshots'][0]['text'], 'Day 5.')
+
+
+@unittest.mock.patch(
+    'django_docsnaps.settings.DJANGO_DOCSNAPS_HINT_TOKEN',
+    'secret')
+class TestHintView(django.test.TestCase):
+
+    def setUp(self):
+        self._request_factory = django.test.RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Insert an enabled and a disabled job of the same URL.
+
+        """
+        document = django_docsnaps.models.Document.objects.create(
+            module='fake.module',
+            name='Terms of Use')
+        cls._jobs = []
+        for name, code, is_enabled in (('English', 'en', True),
+                                       ('German', 'de', False)):
+            language = django_docsnaps.models.Language.objects.create(
+                name=name,
+                code_iso_639_1=code)
+            cls._jobs.append(
+                django_docsnaps.models.DocumentsLanguages.objects.create(
+                    document_id=document,
+                    language_id=language,
+                    is_enabled=is_enabled,
+                    url='https://example.com/terms'))
+
+    def _hint(self, body, token='secret'):
+        request = self._request_factory.post(
+            '/',
+            data=json.dumps(body),
+            content_type='application/json',
+            HTTP_AUTHORIZATION='Bearer ' + token)
+        response = django_docsnaps.views.hint(request)
+        return response.status_code, json.loads(response.content.decode())
+
+    def _get_requested_job_ids(self):
+        return set(
+            django_docsnaps.models.DocumentsLanguages.objects\
+                .filter(fetch_requested_datetime__isnull=False)\
+                .values_list('pk', flat=True))
+
+    def test_form_hint(self):
+        """
+        Test that form-encoded URLs are accepted.
+
+        """
+        request = self._request_factory.post(
+            '/',
+            data={'url': ['https://example.com/terms', 'https://unknown/']},
+            HTTP_AUTHORIZATION='Bearer secret')
+        response = django_docsnaps.views.hint(request)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content.decode())['jobs'], 1)
+
+    def test_hint(self):
+        """
+        Test that only the enabled job of a hinted URL is marked, in a single
+        query, and that the URL's fragment is ignored.
+
+        """
+        with self.assertNumQueries(1):
+            status_code, body = self._hint(
+                {'urls': ['https://example.com/terms#section-2']})
+
+        self.assertEqual(status_code, 202)
+        self.assertEqual(body['jobs'], 1)
+        self.assertEqual(
+            self._get_requested_job_ids(),
+            {self._jobs[0].documents_languages_id})
+
+    def test_invalid_body(self):
+        """
+        Test that a body without valid URLs is rejected.
+
+        """
+        for body in ({}, {'urls': 'https://example.com/terms'}, [], {'url': 1}):
+            with self.subTest(body=body):
+                status_code, response_body = self._hint(body)
+                self.assertEqual(status_code, 400)
+
+        self.assertEqual(self._get_requested_job_ids(), set())
+
+    def test_invalid_token(self):
+        """
+        Test that hints are rejected without the token or when no token is
+        configured.
+
+        """
+        status_code, body = self._hint(
+            {'url': 'https://example.com/terms'},
+            token='wrong')
+        self.assertEqual(status_code, 403)
+
+        with unittest.mock.patch(
+            'django_docsnaps.settings.DJANGO_DOCSNAPS_HINT_TOKEN',
+            None):
+            status_code, body = self._hint(
+                {'url': 'https://example.com/terms'},
+                token='None')
+        self.assertEqual(status_code, 403)
+        self.assertEqual(self._get_requested_job_ids(), set())